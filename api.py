@@ -1,25 +1,42 @@
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Request, Response
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Request, Response, Query
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 from fastapi.responses import HTMLResponse, FileResponse, StreamingResponse, RedirectResponse, JSONResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, func
-from database import get_db
-from models import Product, Category, ProductImage, Level2Description, Order, OrderItem, PromoCode
-from price_storage import get_price, get_all_prices, set_price, update_prices
+from database import get_db, SessionLocal, ensure_variant_columns, ensure_indexes
+from models import Product, Category, ProductImage, Level2Description, Order, OrderItem, PromoCode, ModelCard
+from price_storage import get_price, get_prices, get_prices_snapshot, set_price, update_prices
+from model_cards import get_product_images, load_product_image_lists, load_level2_descriptions, get_model_prices, ensure_model_cards, card_images
+from pagination import InvalidCursor, apply_cursor, next_cursor, slice_after
+from search_index import search_index
+from suggest import suggester
+from facets import facet_index
+from category_counts import category_counts
+from price_sync_scheduler import scheduler as price_sync_scheduler
+from response_cache import ResponseCacheMiddleware
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
+from contextlib import asynccontextmanager
 from a2wsgi import ASGIMiddleware
 import json
 import io
+import logging
+import itertools
 import pandas as pd
 import openpyxl
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from excel_handler import ExcelHandler
+import excel_import
+import excel_export
+import import_jobs
 from manual_price_manager import manual_price_manager
 from config import Config
 import os
 
+logger = logging.getLogger(__name__)
+
 def normalize_model_key(model_key: str) -> str:
     """Нормализовать ключ модели для поиска в файловой системе"""
     # Приводим к нижнему регистру
@@ -34,54 +51,6 @@ def normalize_color_name(color: str) -> str:
     # Просто приводим к нижнему регистру и заменяем пробелы на дефисы
     return color.lower().replace(' ', '-')
 
-def get_product_images(product, db: Session):
-    """Получить массив изображений товара из таблицы ProductImage"""
-    images = []
-    
-    # Сначала попробуем получить изображения из specifications
-    try:
-        specs = json.loads(product.specifications) if product.specifications else {}
-        images_data = specs.get('images', [])
-        
-        for img_data in images_data:
-            if isinstance(img_data, dict):
-                # Новый формат: {"url": "...", "alt": "..."}
-                images.append(img_data["url"])
-            elif isinstance(img_data, str):
-                # Новый формат: массив строк
-                images.append(img_data)
-                
-    except json.JSONDecodeError:
-        pass
-    
-    # Если не нашли в specifications, ищем в таблице ProductImage по (level_2, color)
-    if not images and product.level_2 and product.color:
-        try:
-            product_image = db.query(ProductImage).filter(
-                ProductImage.level_2 == product.level_2,
-                ProductImage.color == product.color
-            ).first()
-            
-            if product_image and product_image.img_list:
-                images_data = json.loads(product_image.img_list)
-                
-                # Обработка double-encoded JSON (если после парсинга получили строку)
-                if isinstance(images_data, str):
-                    images_data = json.loads(images_data)
-                
-                # Теперь обрабатываем массив
-                if isinstance(images_data, list):
-                    for img_data in images_data:
-                        if isinstance(img_data, dict):
-                            images.append(img_data["url"])
-                        elif isinstance(img_data, str):
-                            images.append(img_data)
-        except (json.JSONDecodeError, TypeError):
-            pass
-    
-    # Если изображений нет, вернем пустой список
-    return images
-
 def parse_images_from_string(images_str: str) -> List[str]:
     """Парсить строку изображений разделенных запятыми в JSON массив"""
     if not images_str or not images_str.strip():
@@ -93,7 +62,25 @@ def parse_images_from_string(images_str: str) -> List[str]:
     # Конвертируем в JSON массив строк
     return json.dumps(image_urls)
 
-app = FastAPI(title="Yo Store API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Синхронизация цен с сервисом в процессе API (PRICE_SYNC_IN_PROCESS=true)
+    if Config.PRICE_SYNC_IN_PROCESS:
+        price_sync_scheduler.start()
+    yield
+    await price_sync_scheduler.stop()
+
+app = FastAPI(title="Yo Store API", version="1.0.0", lifespan=lifespan)
+
+# Кэш ответов каталога с ETag (сбрасывается по поколению каталога)
+app.add_middleware(ResponseCacheMiddleware)
+
+# Колонки атрибутов вариантов и индексы каталога (для баз, созданных до их появления)
+try:
+    ensure_variant_columns()
+    ensure_indexes()
+except Exception as e:
+    print(f"⚠️ Не удалось обновить схему базы: {e}")
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -199,6 +186,73 @@ def ensure_category_exists(db: Session, level0: Optional[str], level1: Optional[
         # Не прерываем основной процесс импорта из-за проблем с категориями
         pass
 
+def build_model_card(product, price_obj: dict, level2_desc, images: List[str]) -> ProductResponse:
+    """Собрать карточку модели для /products и /search из заранее загруженных данных"""
+    specifications = dict(product.specs)
+    
+    # Описание из level2_descriptions
+    desc = ""
+    if level2_desc:
+        desc = level2_desc.description or ""
+    
+    # Получаем название категории из level полей
+    category_name = product.level_0 or "Без категории"
+    if product.level_1:
+        category_name += f" / {product.level_1}"
+    if product.level_2:
+        category_name += f" / {product.level_2}"
+    
+    return ProductResponse(
+        id=product.id,
+        sku=product.sku,
+        name=product.name,
+        description=desc,
+        brand=product.brand,
+        model=product.level_2 or "",
+        category_name=category_name,
+        level_2=product.level_2,
+        image_url=images[0] if images else '',
+        images=images,
+        specifications=specifications,
+        price=price_obj.get('price', 0.0),
+        old_price=price_obj.get('old_price', 0.0),
+        discount_percentage=price_obj.get('discount_percentage', 0.0),
+        currency=price_obj.get('currency', 'RUB'),
+    )
+
+def model_card_response(card: ModelCard) -> ProductResponse:
+    """Карточка модели для /products из материализованной строки model_cards"""
+    try:
+        specifications = json.loads(card.specifications) if card.specifications else {}
+    except json.JSONDecodeError:
+        specifications = {}
+    images = card_images(card)
+    
+    # Получаем название категории из level полей
+    category_name = card.level_0 or "Без категории"
+    if card.level_1:
+        category_name += f" / {card.level_1}"
+    if card.level_2:
+        category_name += f" / {card.level_2}"
+    
+    return ProductResponse(
+        id=card.product_id,
+        sku=card.sku,
+        name=card.name,
+        description=card.description or "",
+        brand=card.brand,
+        model=card.level_2 or "",
+        category_name=category_name,
+        level_2=card.level_2,
+        image_url=images[0] if images else '',
+        images=images,
+        specifications=specifications,
+        price=card.price,
+        old_price=card.old_price,
+        discount_percentage=card.discount_percentage,
+        currency=card.currency,
+    )
+
 # API Routes
 @app.get("/")
 async def root():
@@ -214,256 +268,204 @@ async def test_products(db: Session = Depends(get_db)):
 @app.get("/categories")
 async def get_categories(db: Session = Depends(get_db)):
     """Get all categories grouped by level_0"""
-    # Получить уникальные категории из таблицы Category с GROUP BY
-    from sqlalchemy import func
-    categories = db.query(
-        Category.level_0,
-        func.max(Category.description).label('description'),
-        func.max(Category.icon).label('icon')
-    ).filter(
-        Category.level_0.isnot(None)
-    ).group_by(Category.level_0).all()
-    
-    result = []
-    for level_0, description, icon in categories:
-        # Подсчитать товары в этой категории
-        product_count = db.query(Product).filter(Product.level_0 == level_0).count()
-        
-        result.append({
-            "id": abs(hash(level_0)) % 1000000,  # Генерируем положительный ID из хэша
-            "name": level_0,
-            "description": description or f"Категория {level_0}",
-            "icon": icon or "📦",
-            "product_count": product_count,
-            "level_0": level_0
-        })
+    # Один сгруппированный запрос; результат хранится до изменения каталога (см. category_counts)
+    return category_counts.categories(db)
+
+def set_next_cursor(response: Response, cursor: Optional[str]) -> None:
+    """Передать курсор следующей страницы в заголовке X-Next-Cursor"""
+    if cursor:
+        response.headers["X-Next-Cursor"] = cursor
+
+# Порядок витрины /products: level_2 DESC, затем представитель модели
+MODEL_CARD_ORDER = [(ModelCard.level_2, True), (ModelCard.product_id, False)]
+
+# Порядок /search - тот же, по представителям моделей из products
+SEARCH_ORDER = [(Product.level_2, True), (Product.id, False)]
+
+# Порядок /all-products; sku уникален, поэтому ключ курсора однозначен
+ALL_PRODUCTS_ORDER = [
+    (Product.level_0, False),
+    (Product.level_1, False),
+    (Product.level_2, True),
+    (Product.sku, False),
+]
+
+# Размер пачки при потоковой выдаче /all-products
+ALL_PRODUCTS_STREAM_BATCH = 500
+
+def all_products_page(db: Session, limit: int, cursor: Optional[str] = None) -> tuple:
+    """
+    Страница /all-products: товары после курсора с ценами и изображениями
+    Возвращает (товары, курсор следующей страницы или None)
+    """
+    results = apply_cursor(db.query(Product), ALL_PRODUCTS_ORDER, cursor).limit(limit).all()
     
-    # Сортируем по количеству товаров в убывающем порядке
-    result.sort(key=lambda x: x["product_count"], reverse=True)
+    # Цены и изображения страницы - пачкой
+    prices = get_prices(product.sku for product in results)
+    image_lists = load_product_image_lists(db, results)
     
-    return result
+    products = []
+    for product in results:
+        # Получаем данные о цене с безопасными значениями по умолчанию
+        price_data = prices.get(product.sku)
+        if price_data is None:
+            product_price = 0.0
+            product_old_price = 0.0
+            product_discount = 0.0
+            product_currency = "RUB"
+            product_is_parse = True
+        else:
+            product_price = price_data.get('price', 0.0)
+            product_old_price = price_data.get('old_price', 0.0)
+            product_discount = price_data.get('discount_percentage', 0.0)
+            product_currency = price_data.get('currency', 'RUB')
+            product_is_parse = price_data.get('is_parse', True)
+        
+        # Получаем изображения
+        images = get_product_images(product, db, image_lists)
+        image_url = images[0] if images else "/static/images/placeholder.jpg"
+        
+        # Получаем спецификации
+        specifications = dict(product.specs)
+        
+        products.append(ProductResponse(
+            id=product.id,
+            sku=product.sku,
+            name=product.name,
+            description="",  # Поле description у товаров удалено
+            brand=product.brand,
+            model=product.level_2 or "",
+            category_name=f"{product.level_0} / {product.level_1} / {product.level_2}" if product.level_1 and product.level_2 else product.level_0,
+            level_2=product.level_2,
+            image_url=image_url,
+            images=images,
+            specifications=specifications,
+            price=product_price,
+            old_price=product_old_price,
+            discount_percentage=product_discount,
+            currency=product_currency,
+            is_available=True,
+            is_parse=product_is_parse
+        ))
+    
+    cursor = next_cursor(results, limit, lambda product: [product.level_0, product.level_1, product.level_2, product.sku])
+    return products, cursor
+
+def stream_all_products():
+    """
+    Весь каталог JSON массивом, пачками по ALL_PRODUCTS_STREAM_BATCH товаров
+    Своя сессия: поток читается уже после выхода из обработчика запроса
+    Ошибка посреди потока не закрывает массив: соединение обрывается, и клиент
+    видит неполный ответ, а не укороченный, но корректный JSON
+    """
+    db = SessionLocal()
+    yield "["
+    cursor = None
+    first = True
+    try:
+        while True:
+            page, cursor = all_products_page(db, ALL_PRODUCTS_STREAM_BATCH, cursor)
+            for product in page:
+                yield ("" if first else ",") + product.json()
+                first = False
+            if cursor is None:
+                break
+    except Exception:
+        logger.exception("❌ Ошибка в get_all_products")
+        raise
+    finally:
+        db.close()
+    yield "]"
 
 @app.get("/all-products", response_model=List[ProductResponse])
-async def get_all_products(db: Session = Depends(get_db)):
-    """Endpoint для получения всех товаров без группировки"""
+async def get_all_products(
+    response: Response,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Endpoint для получения всех товаров без группировки
+    С limit - страница после cursor, курсор следующей страницы в заголовке X-Next-Cursor;
+    без limit - весь каталог потоком, без сборки ответа целиком в памяти
+    """
+    if limit is None:
+        return StreamingResponse(stream_all_products(), media_type="application/json")
+    
     try:
-        # Простой запрос всех товаров
-        results = db.query(Product).order_by(Product.level_0, Product.level_1, Product.level_2.desc(), Product.sku).all()
-        
-        print(f"📊 Найдено {len(results)} результатов в БД")
-        
-        products = []
-        for idx, product in enumerate(results):
-            print(f"🔄 Обрабатываем товар {idx + 1}/{len(results)}: ID {product.id}")
-            
-            # Получаем цену из JSON файла
-            price_data = get_price(product.sku)
-            
-            # Получаем данные о цене с безопасными значениями по умолчанию
-            if price_data is None:
-                product_price = 0.0
-                product_old_price = 0.0
-                product_discount = 0.0
-                product_currency = "RUB"
-                product_is_parse = True
-            else:
-                product_price = price_data.get('price', 0.0)
-                product_old_price = price_data.get('old_price', 0.0)
-                product_discount = price_data.get('discount_percentage', 0.0)
-                product_currency = price_data.get('currency', 'RUB')
-                product_is_parse = price_data.get('is_parse', True)
-            
-            # Получаем изображения
-            images = get_product_images(product, db)
-            image_url = images[0] if images else "/static/images/placeholder.jpg"
-            
-            # Получаем спецификации
-            try:
-                specifications = json.loads(product.specifications) if product.specifications else {}
-            except json.JSONDecodeError:
-                specifications = {}
-            
-            # Проверяем description
-            desc = ""
-            if True:  # description всегда None, так как поле удалено
-                print(f"⚠️  Товар ID {product.id} имеет description=None, заменяем на пустую строку")
-            
-            products.append(ProductResponse(
-                id=product.id,
-                sku=product.sku,
-                name=product.name,
-                description=desc,
-                brand=product.brand,
-                model=product.level_2 or "",
-                category_name=f"{product.level_0} / {product.level_1} / {product.level_2}" if product.level_1 and product.level_2 else product.level_0,
-                level_2=product.level_2,
-                image_url=image_url,
-                images=images,
-                specifications=specifications,
-                price=product_price,
-                old_price=product_old_price,
-                discount_percentage=product_discount,
-                currency=product_currency,
-                is_available=True,
-                is_parse=product_is_parse
-            ))
-        
-        return products
+        products, following = all_products_page(db, limit, cursor)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     except Exception as e:
         print(f"❌ Ошибка в get_all_products: {e}")
         return []
+    
+    set_next_cursor(response, following)
+    return products
 
 @app.get("/products", response_model=List[ProductResponse])
 async def get_products(
+    response: Response,
     brand: Optional[str] = None,
     level0: Optional[str] = None,
     level1: Optional[str] = None,
     level2: Optional[str] = None,
+    color: Optional[str] = None,
+    disk: Optional[str] = None,
+    ram: Optional[str] = None,
+    sim_config: Optional[str] = None,
     limit: int = 20,
     offset: int = 0,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """Get unique product models (grouped by level2) with optional hierarchical filters"""
-    # Простая логика: получаем все товары, затем группируем в Python
-    query = db.query(Product)
+    """
+    Get unique product models (grouped by level2) with optional hierarchical filters
+    Фильтры по категориям (level0, level1) и атрибутам варианта (color, disk, ram, sim_config) оставляют модели,
+    у которых есть хотя бы один такой вариант
+    Пагинация: offset/limit или cursor из заголовка X-Next-Cursor предыдущей страницы
+    """
+    # Карточки моделей материализованы в model_cards - одна строка на (level_2, brand)
+    ensure_model_cards(db)
+    query = db.query(ModelCard)
     
     # Применяем фильтры
-    filters = []
-    
     if brand:
-        filters.append(Product.brand == brand)
-    if level0:
-        filters.append(Product.level_0 == level0)
-    if level1:
-        filters.append(Product.level_1 == level1)
+        query = query.filter(ModelCard.brand == brand)
     if level2:
-        filters.append(Product.level_2 == level2)
-        
-    
-    # Применяем фильтры
-    if filters:
-        query = query.filter(and_(*filters))
-    
-    # Используем подкеру для получения одного представительного товара из каждой модели
-    subquery = db.query(
-        func.min(Product.id).label('id')
-    ).filter(*filters).group_by(Product.level_2, Product.brand).subquery()
-    
-    # Теперь получаем только те товары, которые являются представителями групп
-    final_query = db.query(Product).outerjoin(subquery, Product.id == subquery.c.id).filter(
-        subquery.c.id.isnot(None)
-    ).order_by(Product.level_2.desc(), Product.id)
-    
-    # Применяем лимит и отступ
-    results = final_query.offset(offset).limit(limit).all()
+        query = query.filter(ModelCard.level_2 == level2)
+    
+    # Категории и фасеты по вариантам - подзапрос по индексированным колонкам products:
+    # модель попадает в категорию, если в ней есть хотя бы один вариант модели
+    # (level_0/level_1 карточки - только категория представителя)
+    variant_filters = [
+        column == value
+        for column, value in (
+            (Product.level_0, level0), (Product.level_1, level1),
+            (Product.color, color), (Product.disk, disk), (Product.ram, ram), (Product.sim_config, sim_config)
+        )
+        if value
+    ]
+    if variant_filters:
+        query = query.filter(
+            db.query(Product.id).filter(
+                Product.level_2 == ModelCard.level_2,
+                Product.brand == ModelCard.brand,
+                *variant_filters
+            ).exists()
+        )
     
-    products = []
-    for product in results:
-        # Для карточки модели нужно найти минимальную цену среди всех вариантов этой модели
-        # Получаем все товары этой модели
-        all_model_products = db.query(Product).filter(
-            Product.level_2 == product.level_2,
-            Product.brand == product.brand
-        ).all()
-        
-        # Находим минимальную цену среди всех вариантов
-        min_price = None
-        min_old_price = None
-        currency = "RUB"
-        best_variant_price = None  # Сохраняем весь объект цены для варианта с минимальной ценой
-        
-        for model_product in all_model_products:
-            variant_price = get_price(model_product.sku)
-            if variant_price:
-                variant_price_value = variant_price.get('price', 0.0)
-                if min_price is None or variant_price_value < min_price:
-                    min_price = variant_price_value
-                    best_variant_price = variant_price  # Сохраняем весь объект
-                    currency = variant_price.get('currency', 'RUB')
-        
-        # Если не нашли цену, используем цену представительного товара
-        if min_price is None:
-            price_data = get_price(product.sku)
-            if price_data:
-                price_obj = price_data
-            else:
-                price_obj = {
-                    'price': 0.0,
-                    'old_price': 0.0,
-                    'discount_percentage': 0.0,
-                    'currency': 'RUB'
-                }
-        else:
-            # Используем old_price от варианта с минимальной ценой
-            if best_variant_price:
-                min_old_price = best_variant_price.get('old_price')
-                # Если old_price не указан, используем price
-                if not min_old_price:
-                    min_old_price = min_price
-            else:
-                min_old_price = min_price
-            
-            # Формируем объект с минимальной ценой
-            price_obj = {
-                'price': min_price,
-                'old_price': min_old_price,
-                'currency': currency
-            }
-            # Вычисляем discount_percentage
-            if min_old_price and min_old_price > min_price:
-                price_obj['discount_percentage'] = ((min_old_price - min_price) / min_old_price) * 100
-            else:
-                price_obj['discount_percentage'] = 0.0
-        
-        try:
-            specifications = json.loads(product.specifications) if product.specifications else {}
-        except json.JSONDecodeError:
-            specifications = {}
-        
-        # Получаем описание из level2_descriptions
-        desc = ""
-        level2_specs = {}
-        if product.level_2:
-            level2_desc = db.query(Level2Description).filter(Level2Description.level_2 == product.level_2).first()
-            if level2_desc:
-                desc = level2_desc.description or ""
-                if level2_desc.details:
-                    try:
-                        level2_specs = json.loads(level2_desc.details) if isinstance(level2_desc.details, str) else level2_desc.details
-                    except json.JSONDecodeError:
-                        level2_specs = {}
-        
-        # Объединяем характеристики из level2_descriptions с существующими specifications
-        all_specifications = {**level2_specs, **specifications}
-        
-        images = get_product_images(product, db)
-        
-        # Получаем название категории из level полей
-        category_name = product.level_0 or "Без категории"
-        if product.level_1:
-            category_name += f" / {product.level_1}"
-        if product.level_2:
-            category_name += f" / {product.level_2}"
-        
-        products.append(ProductResponse(
-            id=product.id,
-            sku=product.sku,
-            name=product.name,
-            description=desc,
-            brand=product.brand,
-            model=product.level_2 or "",
-            category_name=category_name,
-            level_2=product.level_2,
-            image_url=images[0] if images else '',
-            images=images,
-            specifications=specifications,
-            price=price_obj.get('price', 0.0),
-            old_price=price_obj.get('old_price', 0.0),
-            discount_percentage=price_obj.get('discount_percentage', 0.0),
-            currency=price_obj.get('currency', 'RUB'),
-        ))
+    # Курсор продолжает выдачу после последней карточки, offset нужен только без него
+    try:
+        query = apply_cursor(query, MODEL_CARD_ORDER, cursor)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not cursor:
+        query = query.offset(offset)
+    cards = query.limit(limit).all()
     
-    return products
+    set_next_cursor(response, next_cursor(cards, limit, lambda card: [card.level_2, card.product_id]))
+    return [model_card_response(card) for card in cards]
 
 @app.get("/products/{model}/variants")
 async def get_model_variants(model: str, db: Session = Depends(get_db)):
@@ -472,20 +474,17 @@ async def get_model_variants(model: str, db: Session = Depends(get_db)):
     # Декодируем URL параметр
     model = urllib.parse.unquote(model)
     
+    # Все товары модели одним запросом, упорядоченные по колонкам атрибутов варианта
+    variant_products = db.query(Product).filter(Product.level_2 == model).order_by(
+        Product.color, Product.disk, Product.sim_config, Product.ram, Product.id
+    ).all()
+    
     # Сначала попробуем найти основной продукт с полными спецификациями
-    main_product = db.query(Product).filter(
-        Product.level_2 == model,
-        Product.specifications.like('%variants%')
-    ).first()
+    main_product = next((product for product in variant_products if 'variants' in product.specs), None)
     
     if main_product:
         # Найден основной продукт с вложенными вариантами
-        specifications = {}
-        try:
-            if main_product.specifications:
-                specifications = json.loads(main_product.specifications)
-        except json.JSONDecodeError:
-            pass
+        specifications = main_product.specs
         
         variants = []
         
@@ -494,9 +493,12 @@ async def get_model_variants(model: str, db: Session = Depends(get_db)):
             # Сортируем варианты по цвету (в алфавитном порядке)
             sorted_variants = sorted(specifications['variants'], key=lambda x: x.get('specifications', {}).get('color', ''))
             
+            # Цены всех вариантов из одного снимка
+            prices = get_prices(variant_info['sku'] for variant_info in sorted_variants)
+            
             for variant_info in sorted_variants:
                 # Находим цену для этого варианта по SKU из JSON файла
-                price_data = get_price(variant_info['sku'])
+                price_data = prices.get(variant_info['sku'])
                 
                 variant_specs = variant_info.get('specifications', {})
                 
@@ -546,30 +548,27 @@ async def get_model_variants(model: str, db: Session = Depends(get_db)):
             "total_variants": len(variants)
         }
     
-    # Fallback: Если основного продукта нет, найдем все варианты для данной модели
-    variants_query = db.query(Product).filter(Product.level_2 == model).order_by(Product.specifications)  # Сортируем по specifications
+    # Fallback: Если основного продукта нет, вариантами считаются все товары модели
+    # Цены и изображения всех вариантов - одним снимком и одним запросом
+    prices = get_prices(product.sku for product in variant_products)
+    image_lists = load_product_image_lists(db, variant_products)
     
     variants = []
-    for product in variants_query.all():
+    for product in variant_products:
         # Получаем цену из JSON файла
-        price_data = get_price(product.sku)
+        price_data = prices.get(product.sku)
         
-        # Получаем спецификации варианта
-        specifications = {}
-        try:
-            if product.specifications:
-                specifications = json.loads(product.specifications)
-        except json.JSONDecodeError:
-            pass
+        # Спецификации варианта (разбираются один раз на экземпляр)
+        specifications = product.specs
         
         # Получаем изображения
-        images = get_product_images(product, db)
+        images = get_product_images(product, db, image_lists)
         
         # Используем поля из модели Product напрямую, fallback на specifications
-        color = product.color if product.color else specifications.get('color', '')
-        memory = product.disk if product.disk else specifications.get('disk', specifications.get('memory', ''))
-        sim_type = product.sim_config if product.sim_config else specifications.get('sim_config', specifications.get('sim_type', ''))
-        ram = specifications.get('ram', '')  # RAM для ноутбуков
+        color = product.color
+        memory = product.disk or specifications.get('memory', '')
+        sim_type = product.sim_config or specifications.get('sim_type', '')
+        ram = product.ram  # RAM для ноутбуков
         
         variant_data = {
             "sku": product.sku,
@@ -594,9 +593,6 @@ async def get_model_variants(model: str, db: Session = Depends(get_db)):
         
         variants.append(variant_data)
     
-    # Сортируем варианты по цвету для fallback случая
-    variants.sort(key=lambda x: x.get('color', ''))
-    
     return {
         "model": model,
         "variants": variants,
@@ -617,10 +613,7 @@ async def get_product(product_id: int, db: Session = Depends(get_db)):
     if not price_data:
         raise HTTPException(status_code=404, detail="Price not found for this product")
     
-    try:
-        specifications = json.loads(product.specifications) if product.specifications else {}
-    except json.JSONDecodeError:
-        specifications = {}
+    specifications = dict(product.specs)
     
     # Получаем описание из level2_descriptions
     desc = ""
@@ -659,13 +652,8 @@ async def get_product(product_id: int, db: Session = Depends(get_db)):
         created_at=product.created_at.isoformat()
     )
 
-@app.get("/search")
-async def search_products(
-    q: str,
-    limit: int = 20,
-    db: Session = Depends(get_db)
-):
-    """Search products by name, brand, or level_2 - returns unique models only"""
+def search_representatives_like(db: Session, q: str, limit: int, cursor: Optional[str]) -> List[Product]:
+    """Поиск по подстроке (ILIKE) в name, brand и level_2 - если поисковый индекс недоступен"""
     search_term = f"%{q}%"
     
     # Создаем фильтры для поиска
@@ -686,118 +674,67 @@ async def search_products(
     # Теперь получаем только те товары, которые являются представителями групп
     final_query = db.query(Product).filter(
         Product.id == subquery.c.id
-    ).order_by(Product.level_2.desc(), Product.id)
+    )
+    final_query = apply_cursor(final_query, SEARCH_ORDER, cursor)
     
     # Применяем лимит
-    results = final_query.limit(limit).all()
-    
-    products = []
-    for product in results:
-        # Для карточки модели нужно найти минимальную цену среди всех вариантов этой модели
-        # Получаем все товары этой модели
-        all_model_products = db.query(Product).filter(
-            Product.level_2 == product.level_2,
-            Product.brand == product.brand
-        ).all()
-        
-        # Находим минимальную цену среди всех вариантов
-        min_price = None
-        min_old_price = None
-        currency = "RUB"
-        best_variant_price = None  # Сохраняем весь объект цены для варианта с минимальной ценой
-        
-        for model_product in all_model_products:
-            variant_price = get_price(model_product.sku)
-            if variant_price:
-                variant_price_value = variant_price.get('price', 0.0)
-                if min_price is None or variant_price_value < min_price:
-                    min_price = variant_price_value
-                    best_variant_price = variant_price  # Сохраняем весь объект
-                    currency = variant_price.get('currency', 'RUB')
-        
-        # Если не нашли цену, используем цену представительного товара
-        if min_price is None:
-            price_data = get_price(product.sku)
-            if price_data:
-                price_obj = price_data
-            else:
-                price_obj = {
-                    'price': 0.0,
-                    'old_price': 0.0,
-                    'discount_percentage': 0.0,
-                    'currency': 'RUB'
-                }
+    return final_query.limit(limit).all()
+
+@app.get("/search")
+async def search_products(
+    response: Response,
+    q: str,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Search products by name, brand, model, specs and descriptions - returns unique models only
+    Модели ранжируются по релевантности (BM25), см. search_index
+    Следующая страница - cursor из заголовка X-Next-Cursor
+    """
+    # Ранжированная выдача из полнотекстового индекса; без индекса - поиск по подстроке
+    ranked = search_index.search(q) if search_index.ensure(db) else None
+    try:
+        if ranked is None:
+            results = search_representatives_like(db, q, limit, cursor)
+            following = next_cursor(results, limit, lambda product: [product.level_2, product.id])
         else:
-            # Используем old_price от варианта с минимальной ценой
-            if best_variant_price:
-                min_old_price = best_variant_price.get('old_price')
-                # Если old_price не указан, используем price
-                if not min_old_price:
-                    min_old_price = min_price
-            else:
-                min_old_price = min_price
-            
-            # Формируем объект с минимальной ценой
-            price_obj = {
-                'price': min_price,
-                'old_price': min_old_price,
-                'currency': currency
-            }
-            # Вычисляем discount_percentage
-            if min_old_price and min_old_price > min_price:
-                price_obj['discount_percentage'] = ((min_old_price - min_price) / min_old_price) * 100
-            else:
-                price_obj['discount_percentage'] = 0.0
-        
-        try:
-            specifications = json.loads(product.specifications) if product.specifications else {}
-        except json.JSONDecodeError:
-            specifications = {}
-        
-        # Получаем описание из level2_descriptions
-        desc = ""
-        level2_specs = {}
-        if product.level_2:
-            level2_desc = db.query(Level2Description).filter(Level2Description.level_2 == product.level_2).first()
-            if level2_desc:
-                desc = level2_desc.description or ""
-                if level2_desc.details:
-                    try:
-                        level2_specs = json.loads(level2_desc.details) if isinstance(level2_desc.details, str) else level2_desc.details
-                    except json.JSONDecodeError:
-                        level2_specs = {}
-        
-        # Объединяем характеристики из level2_descriptions с существующими specifications
-        all_specifications = {**level2_specs, **specifications}
-        
-        images = get_product_images(product, db)
-        
-        # Получаем название категории из level полей
-        category_name = product.level_0 or "Без категории"
-        if product.level_1:
-            category_name += f" / {product.level_1}"
-        if product.level_2:
-            category_name += f" / {product.level_2}"
-        
-        products.append(ProductResponse(
-            id=product.id,
-            sku=product.sku,
-            name=product.name,
-            description=desc,
-            brand=product.brand,
-            model=product.level_2 or "",
-            category_name=category_name,
-            level_2=product.level_2,
-            image_url=images[0] if images else '',
-            images=images,
-            specifications=specifications,
-            price=price_obj.get('price', 0.0),
-            old_price=price_obj.get('old_price', 0.0),
-            discount_percentage=price_obj.get('discount_percentage', 0.0),
-            currency=price_obj.get('currency', 'RUB'),
-        ))
-    
-    return products
+            page = slice_after(ranked, limit, cursor)
+            page_ids = [product_id for _, product_id in page]
+            by_id = {product.id: product for product in db.query(Product).filter(Product.id.in_(page_ids))}
+            results = [by_id[product_id] for product_id in page_ids if product_id in by_id]
+            following = next_cursor(page, limit, list)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    set_next_cursor(response, following)
+    if results and not cursor:
+        suggester.record_query(q)
+    
+    # Цена карточки - минимальная среди всех вариантов модели
+    model_prices = get_model_prices(db, results)
+    
+    # Описания и изображения всей страницы - по одному запросу
+    descriptions = load_level2_descriptions(db, results)
+    image_lists = load_product_image_lists(db, results)
+    
+    return [
+        build_model_card(
+            product,
+            model_prices[(product.level_2, product.brand)],
+            descriptions.get(product.level_2),
+            get_product_images(product, db, image_lists)
+        )
+        for product in results
+    ]
+
+@app.get("/search/suggest")
+async def search_suggest(q: str = "", limit: int = 8, db: Session = Depends(get_db)):
+    """
+    Подсказки по мере ввода: модели, бренды и популярные запросы по префиксу
+    Отвечает из префиксного дерева в памяти, без полного поиска (см. suggest)
+    """
+    return suggester.suggest(db, q, limit)
 
 @app.get("/webapp")
 async def webapp():
@@ -881,481 +818,223 @@ async def download_products_template():
     return StreamingResponse(
         io.BytesIO(template_data),
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": "attachment; filename=products_template.xlsx"}
-    )
-
-@app.get("/api/excel/template/prices")
-async def download_prices_template():
-    """Скачать шаблон Excel файла для обновления цен"""
-    excel_handler = ExcelHandler()
-    template_data = excel_handler.create_prices_template()
-    
-    return StreamingResponse(
-        io.BytesIO(template_data),
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": "attachment; filename=prices_template.xlsx"}
-    )
-
-@app.post("/api/excel/import/products")
-async def import_products_from_excel(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    """Импортировать товары из Excel файла"""
-    if not file.filename.endswith(('.xlsx', '.xls')):
-        raise HTTPException(status_code=400, detail="Файл должен быть в формате Excel (.xlsx или .xls)")
-    
-    try:
-        # Читаем содержимое файла
-        file_content = await file.read()
-        
-        # Парсим Excel файл
-        excel_handler = ExcelHandler()
-        products_data = excel_handler.parse_products_excel(file_content)
-        
-        # Также парсим изображения если есть лист "Изображения"
-        images_data = []
-        try:
-            images_data = excel_handler.parse_images_excel(file_content)
-        except Exception as e:
-            print(f"Предупреждение: Не удалось загрузить изображения: {e}")
-        
-        # Добавляем товары в базу данных
-        added_count = 0
-        errors = []
-        
-        for i, product_data in enumerate(products_data):
-            try:
-                # Проверяем, что указаны обязательные поля level0
-                if not product_data.get('level0'):
-                    errors.append(f"Товар {i+1}: Не указана основная категория (level0)")
-                    continue
-                
-                # Проверяем обязательные поля для генерации SKU
-                if not product_data.get('brand') or not product_data.get('level2'):
-                    errors.append(f"Товар {i+1}: Не указан бренд или модель, необходимые для генерации SKU")
-                    continue
-                
-                # Генерируем временный уникальный SKU если не указан
-                if product_data.get('sku'):
-                    # Проверяем уникальность SKU
-                    existing = db.query(Product).filter(Product.sku == product_data['sku']).first()
-                    if existing:
-                        errors.append(f"Товар {i+1}: SKU '{product_data['sku']}' уже существует")
-                        continue
-                    sku = product_data['sku']
-                else:
-                    # Генерируем уникальный SKU на основе данных и timestamp
-                    import time
-                    timestamp = int(time.time() * 1000) % 100000  # последние 5 цифр timestamp
-                    sku = f"{product_data['brand'][:3].upper()}{product_data['level2'][:5].upper()}{timestamp}"
-                
-                # Создать товар
-                parsed_images = parse_images_from_string(product_data['image_url'])
-                
-                # Сформировать specifications из данных
-                specs = dict(product_data.get('specifications') or {})
-                if product_data.get('color'):
-                    specs['color'] = product_data['color']
-                if product_data.get('ram'):
-                    specs['ram'] = product_data['ram']
-                if product_data.get('disk'):
-                    specs['disk'] = product_data['disk']
-                if product_data.get('sim_config'):
-                    specs['sim_config'] = product_data['sim_config']
-
-                db_product = Product(
-                    sku=sku,
-                    name=product_data['name'],
-                    level_0=product_data['level0'],
-                    level_1=product_data.get('level1'),
-                    level_2=product_data.get('level2'),
-                    brand=product_data['brand'],
-                    specifications=json.dumps(specs),
-                    stock=product_data['stock'],
-                    is_available=True
-                )
-                
-                db.add(db_product)
-                db.flush()  # Получить ID
-
-                # Ensure categories exist
-                ensure_category_exists(db, product_data.get('level0'), product_data.get('level1'), product_data.get('level2'))
-                
-                # Создать начальную цену в JSON файле
-                set_price(
-                    sku=sku,
-                    price=product_data['price'],
-                    old_price=product_data['price'],
-                    currency=product_data.get('currency', 'RUB'),
-                    is_parse=product_data.get('is_parse', True)
-                )
-                
-                # Создать запись изображений в ProductImage если есть изображения
-                if parsed_images and product_data.get('level2') and product_data.get('color'):
-                    product_image = ProductImage(
-                        level_2=product_data['level2'],
-                        color=product_data['color'],
-                        img_list=json.dumps(parsed_images)
-                    )
-                    db.add(product_image)
-                
-                added_count += 1
-                
-            except Exception as e:
-                errors.append(f"Товар {i+1}: {str(e)}")
-        
-        db.commit()
-        
-        # Обрабатываем изображения если они есть
-        images_added = 0
-        images_updated = 0
-        images_errors = []
-        
-        for image_data in images_data:
-            try:
-                # Ищем существующую запись
-                existing_image = db.query(ProductImage).filter(
-                    ProductImage.level_2 == image_data['level_2'],
-                    ProductImage.color == image_data['color']
-                ).first()
-                
-                # Конвертируем список изображений в JSON
-                img_list_json = json.dumps(image_data['img_list'])
-                
-                if existing_image:
-                    # Обновляем существующую запись
-                    existing_image.img_list = img_list_json
-                    images_updated += 1
-                else:
-                    # Создаем новую запись
-                    new_image = ProductImage(
-                        level_2=image_data['level_2'],
-                        color=image_data['color'],
-                        img_list=img_list_json
-                    )
-                    db.add(new_image)
-                    images_added += 1
-                    
-            except Exception as e:
-                images_errors.append(f"Ошибка при обработке изображений {image_data['level_2']} - {image_data['color']}: {str(e)}")
-        
-        # Сохраняем изменения изображений
-        if images_data:
-            db.commit()
-        
-        return {
-            "message": "Импорт завершен",
-            "added": added_count,
-            "errors": errors,
-            "total_processed": len(products_data),
-            "images_added": images_added,
-            "images_updated": images_updated,
-            "images_errors": images_errors
-        }
-        
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Ошибка при импорте: {str(e)}")
-
-@app.post("/api/excel/import/prices")
-async def import_prices_from_excel(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    """Обновить цены из Excel файла"""
-    if not file.filename.endswith(('.xlsx', '.xls')):
-        raise HTTPException(status_code=400, detail="Файл должен быть в формате Excel (.xlsx или .xls)")
-    
-    try:
-        # Читаем содержимое файла
-        file_content = await file.read()
-        
-        # Парсим Excel файл
-        excel_handler = ExcelHandler()
-        prices_data = excel_handler.parse_prices_excel(file_content)
-        
-        # Обновляем цены в базе данных через ручной менеджер
-        updated_count = 0
-        errors = []
-        
-        for i, price_data in enumerate(prices_data):
-            try:
-                success = manual_price_manager.update_price_from_excel_data(price_data, db)
-                if success:
-                    updated_count += 1
-                else:
-                    errors.append(f"Строка {i+1}: Не удалось обновить цену")
-            except Exception as e:
-                errors.append(f"Строка {i+1}: {str(e)}")
-        
-        db.commit()
-        
-        return {
-            "message": "Обновление цен завершено",
-            "updated": updated_count,
-            "errors": errors,
-            "total_processed": len(prices_data)
-        }
-        
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Ошибка при обновлении цен: {str(e)}")
-
-@app.post("/api/excel/update-or-create/products")
-async def update_or_create_products_from_excel(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    """Массовое обновление существующих товаров (по SKU) или добавление новых"""
-    if not file.filename.endswith(('.xlsx', '.xls')):
-        raise HTTPException(status_code=400, detail="Файл должен быть в формате Excel (.xlsx или .xls)")
-    
-    try:
-        # Читаем содержимое файла
-        file_content = await file.read()
-        
-        # Парсим Excel файл
-        excel_handler = ExcelHandler()
-        products_data = excel_handler.parse_products_excel(file_content)
-        
-        # Также парсим изображения если есть лист "Изображения"
-        images_data = []
-        try:
-            images_data = excel_handler.parse_images_excel(file_content)
-        except Exception as e:
-            print(f"Предупреждение: Не удалось загрузить изображения: {e}")
-        
-        added_count = 0
-        updated_count = 0
-        errors = []
-        
-        for i, product_data in enumerate(products_data):
-            try:
-                # Генерируем SKU если не указан
-                if not product_data.get('sku'):
-                    import time
-                    timestamp = int(time.time() * 1000) % 100000
-                    brand_part = product_data.get('brand', 'UNK')[:3].upper()
-                    model_part = product_data.get('level_2', 'UNK')[:5].upper()
-                    product_data['sku'] = f"{brand_part}{model_part}{timestamp}"
-                
-                # Проверяем, существует ли товар с таким SKU
-                existing_product = db.query(Product).filter(Product.sku == product_data['sku']).first()
-                
-                if existing_product:
-                    # Обновляем существующий товар
-                    existing_product.name = product_data['name']
-                    # existing_product.description = product_data.get('description', '')  # поле удалено
-                    existing_product.level_0 = product_data['level0']
-                    existing_product.level_1 = product_data.get('level1', '')
-                    existing_product.level_2 = product_data.get('level2', '')
-                    existing_product.brand = product_data.get('brand', '')
-                    existing_product.stock = product_data.get('stock', 0)
-                    # Ensure categories exist for updated levels
-                    ensure_category_exists(db, product_data.get('level0'), product_data.get('level1'), product_data.get('level2'))
-                    
-                    # Обновляем характеристики в specifications JSON
-                    try:
-                        existing_specs = json.loads(existing_product.specifications) if existing_product.specifications else {}
-                    except json.JSONDecodeError:
-                        existing_specs = {}
-                    for key in ['color', 'disk', 'ram', 'sim_config']:
-                        if product_data.get(key):
-                            existing_specs[key] = product_data[key]
-                    existing_product.specifications = json.dumps(existing_specs)
-                    
-                    # Обновляем изображения если указаны (в таблице ProductImage)
-                    if product_data.get('image_url') and existing_product.level_2 and existing_product.color:
-                        parsed_images = parse_images_from_string(product_data['image_url'])
-                        img_list_json = json.dumps(parsed_images) if parsed_images else '[]'
-                        
-                        # Ищем или создаем запись в ProductImage
-                        product_image = db.query(ProductImage).filter(
-                            ProductImage.level_2 == existing_product.level_2,
-                            ProductImage.color == existing_product.color
-                        ).first()
-                        
-                        if product_image:
-                            product_image.img_list = img_list_json
-                        else:
-                            product_image = ProductImage(
-                                level_2=existing_product.level_2,
-                                color=existing_product.color,
-                                img_list=img_list_json
-                            )
-                            db.add(product_image)
-                    
-                    # Обновляем цену в JSON файле
-                    existing_price = get_price(product_data['sku'])
-                    is_parse = existing_price.get('is_parse', True) if existing_price else True
-                    set_price(
-                        sku=product_data['sku'],
-                        price=product_data['price'],
-                        old_price=product_data.get('old_price', product_data['price']),
-                        currency=product_data.get('currency', 'RUB'),
-                        is_parse=is_parse
-                    )
-                    
-                    updated_count += 1
-                else:
-                    # Создаем новый товар
-                    parsed_images = parse_images_from_string(product_data.get('image_url', ''))
-                    
-                    specs = dict(product_data.get('specifications') or {})
-                    if product_data.get('color'):
-                        specs['color'] = product_data['color']
-                    if product_data.get('ram'):
-                        specs['ram'] = product_data['ram']
-                    if product_data.get('disk'):
-                        specs['disk'] = product_data['disk']
-                    if product_data.get('sim_config'):
-                        specs['sim_config'] = product_data['sim_config']
-
-                    db_product = Product(
-                        sku=product_data['sku'],
-                        name=product_data['name'],
-                        level_0=product_data['level0'],
-                        level_1=product_data.get('level1', ''),
-                        level_2=product_data.get('level2', ''),
-                        brand=product_data.get('brand', ''),
-                        stock=product_data.get('stock', 0),
-                        specifications=json.dumps(specs),
-                        is_available=True
-                    )
-                    db.add(db_product)
-                    # Ensure categories exist
-                    ensure_category_exists(db, product_data.get('level0'), product_data.get('level1'), product_data.get('level2'))
-                    
-                    # Добавляем цену в JSON файле
-                    set_price(
-                        sku=product_data['sku'],
-                        price=product_data['price'],
-                        old_price=product_data.get('old_price', product_data['price']),
-                        currency=product_data.get('currency', 'RUB'),
-                        is_parse=product_data.get('is_parse', True)
-                    )
-                    
-                    # Создать запись изображений в ProductImage если есть изображения
-                    if parsed_images and product_data.get('level_2') and product_data.get('color'):
-                        product_image = ProductImage(
-                            level_2=product_data['level_2'],
-                            color=product_data['color'],
-                            img_list=json.dumps(parsed_images)
-                        )
-                        db.add(product_image)
-                    
-                    added_count += 1
-                    
-            except Exception as e:
-                errors.append(f"Строка {i+2}: {str(e)}")
-        
-        db.commit()
-        
-        # Обрабатываем изображения если они есть
-        images_added = 0
-        images_updated = 0
-        images_errors = []
-        
-        for image_data in images_data:
-            try:
-                # Ищем существующую запись
-                existing_image = db.query(ProductImage).filter(
-                    ProductImage.level_2 == image_data['level_2'],
-                    ProductImage.color == image_data['color']
-                ).first()
-                
-                # Конвертируем список изображений в JSON
-                img_list_json = json.dumps(image_data['img_list'])
-                
-                if existing_image:
-                    # Обновляем существующую запись
-                    existing_image.img_list = img_list_json
-                    images_updated += 1
-                else:
-                    # Создаем новую запись
-                    new_image = ProductImage(
-                        level_2=image_data['level_2'],
-                        color=image_data['color'],
-                        img_list=img_list_json
-                    )
-                    db.add(new_image)
-                    images_added += 1
-                    
-            except Exception as e:
-                images_errors.append(f"Ошибка при обработке изображений {image_data['level_2']} - {image_data['color']}: {str(e)}")
-        
-        # Сохраняем изменения изображений
-        if images_data:
-            db.commit()
-        
-        return {
-            "success": True,
-            "message": f"Обработка завершена: добавлено {added_count}, обновлено {updated_count}",
-            "added": added_count,
-            "updated": updated_count,
-            "errors": errors,
-            "total_processed": len(products_data),
-            "images_added": images_added,
-            "images_updated": images_updated,
-            "images_errors": images_errors
-        }
-        
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=400, detail=f"Ошибка при обработке файла: {str(e)}")
+        headers={"Content-Disposition": "attachment; filename=products_template.xlsx"}
+    )
 
-@app.post("/api/excel/import/images")
-async def import_images_from_excel(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    """Импортировать изображения из Excel файла"""
+@app.get("/api/excel/template/prices")
+async def download_prices_template():
+    """Скачать шаблон Excel файла для обновления цен"""
+    excel_handler = ExcelHandler()
+    template_data = excel_handler.create_prices_template()
+    
+    return StreamingResponse(
+        io.BytesIO(template_data),
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={"Content-Disposition": "attachment; filename=prices_template.xlsx"}
+    )
+
+# Импорт Excel выполняется фоновыми задачами (import_jobs): endpoint сохраняет файл
+# и возвращает id задачи, исполнители ниже работают в пуле потоков
+
+async def submit_import_job(kind: str, file: UploadFile) -> dict:
+    """Поставить загруженный файл в очередь импорта"""
     if not file.filename.endswith(('.xlsx', '.xls')):
         raise HTTPException(status_code=400, detail="Файл должен быть в формате Excel (.xlsx или .xls)")
     
+    file_content = await file.read()
     try:
-        # Читаем содержимое файла
-        file_content = await file.read()
-        
-        # Парсим Excel файл
-        excel_handler = ExcelHandler()
-        images_data = excel_handler.parse_images_excel(file_content)
-        
-        # Добавляем изображения в базу данных
-        added_count = 0
-        updated_count = 0
-        errors = []
-        
-        for image_data in images_data:
-            try:
-                # Ищем существующую запись
-                existing_image = db.query(ProductImage).filter(
-                    ProductImage.level_2 == image_data['level_2'],
-                    ProductImage.color == image_data['color']
-                ).first()
-                
-                # Конвертируем список изображений в JSON
-                img_list_json = json.dumps(image_data['img_list'])
-                
-                if existing_image:
-                    # Обновляем существующую запись
-                    existing_image.img_list = img_list_json
-                    updated_count += 1
-                else:
-                    # Создаем новую запись
-                    new_image = ProductImage(
-                        level_2=image_data['level_2'],
-                        color=image_data['color'],
-                        img_list=img_list_json
-                    )
-                    db.add(new_image)
-                    added_count += 1
-                    
-            except Exception as e:
-                errors.append(f"Ошибка при обработке {image_data['level_2']} - {image_data['color']}: {str(e)}")
-        
-        # Сохраняем изменения
-        db.commit()
-        
-        return {
-            "success": True,
-            "message": f"Обработка изображений завершена: добавлено {added_count}, обновлено {updated_count}",
-            "added": added_count,
-            "updated": updated_count,
-            "errors": errors,
-            "total_processed": len(images_data)
-        }
-        
+        job_id = await run_in_threadpool(import_jobs.submit_job, kind, file.filename, file_content)
     except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=400, detail=f"Ошибка при обработке файла: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Не удалось поставить импорт в очередь: {str(e)}")
+    
+    return {
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": f"/api/jobs/{job_id}",
+        "message": "Импорт поставлен в очередь"
+    }
+
+def _run_products_import(db: Session, file_content: bytes, progress) -> dict:
+    """Импортировать товары из Excel файла"""
+    # Товары и лист "Изображения" читаются потоково и записываются пачками (см. excel_import)
+    result = excel_import.import_products(db, file_content, progress=progress)
+    
+    return {
+        "message": "Импорт завершен",
+        **result
+    }
+
+def _run_prices_import(db: Session, file_content: bytes, progress, dry_run: bool = False) -> dict:
+    """Обновить цены из Excel файла"""
+    # Лист читается потоково; в price_storage пишутся только изменившиеся цены (см. excel_import.import_prices)
+    result = excel_import.import_prices(db, file_content, progress=progress, dry_run=dry_run)
+    
+    return {
+        "message": f"{'Проверка' if dry_run else 'Обновление'} цен завершено: "
+                   f"{'будет обновлено' if dry_run else 'обновлено'} {result['updated']}, без изменений {result['unchanged']}",
+        **result
+    }
+
+def _run_prices_preview(db: Session, file_content: bytes, progress) -> dict:
+    """Сравнить цены файла с текущими без записи (dry run)"""
+    return _run_prices_import(db, file_content, progress, dry_run=True)
+
+def _run_update_or_create_import(db: Session, file_content: bytes, progress, dry_run: bool = False) -> dict:
+    """Массовое обновление существующих товаров (по SKU) или добавление новых"""
+    # Товары, цены, изображения и категории пачки загружаются несколькими IN запросами,
+    # в базу уходят только изменения (см. excel_import.upsert_products)
+    result = excel_import.upsert_products(db, file_content, progress=progress, dry_run=dry_run)
+    
+    action = "будет добавлено" if dry_run else "добавлено"
+    return {
+        "success": True,
+        "message": f"{'Проверка' if dry_run else 'Обработка'} завершена: {action} {result['added']}, "
+                   f"{'будет обновлено' if dry_run else 'обновлено'} {result['updated']}, без изменений {result['unchanged']}",
+        **result
+    }
+
+def _run_update_or_create_preview(db: Session, file_content: bytes, progress) -> dict:
+    """Сравнить файл с каталогом без записи (dry run)"""
+    return _run_update_or_create_import(db, file_content, progress, dry_run=True)
+
+def _run_images_import(db: Session, file_content: bytes, progress) -> dict:
+    """Импортировать изображения из Excel файла"""
+    # Лист читается потоково и записывается пачками (см. excel_import)
+    result = excel_import.import_images(db, file_content, progress=progress)
+    
+    return {
+        "success": True,
+        "message": f"Обработка изображений завершена: добавлено {result['added']}, обновлено {result['updated']}",
+        **result
+    }
+
+def _run_prices_simple_import(db: Session, file_content: bytes, progress) -> dict:
+    """Простое обновление цен из Excel: SKU - новая цена - старая цена"""
+    # Парсим как DataFrame
+    df = pd.read_excel(io.BytesIO(file_content))
+    
+    # Проверяем наличие нужных колонок
+    if len(df.columns) < 3:
+        raise ValueError("Файл должен содержать минимум 3 колонки: SKU, Новая цена, Старая цена")
+    
+    # Используем первые 3 колонки
+    sku_col = df.columns[0]
+    new_price_col = df.columns[1] 
+    old_price_col = df.columns[2]
+    
+    updated_count = 0
+    errors = []
+    not_found = []
+    
+    for index, row in df.iterrows():
+        progress(index, errors)
+        try:
+            # Пропускаем пустые строки
+            if pd.isna(row[sku_col]) or pd.isna(row[new_price_col]):
+                continue
+            
+            sku = str(row[sku_col]).strip()
+            try:
+                new_price = float(row[new_price_col])
+            except:
+                errors.append(f"Строка {index + 2}: Неверный формат новой цены")
+                continue
+            
+            try:
+                old_price = float(row[old_price_col]) if not pd.isna(row[old_price_col]) else new_price
+            except:
+                old_price = new_price
+            
+            # Найти товар по SKU
+            product = db.query(Product).filter(Product.sku == sku).first()
+            
+            if not product:
+                not_found.append(f"Строка {index + 2}: Товар с SKU '{sku}' не найден")
+                continue
+            
+            # Обновить или создать цену в JSON файле
+            existing_price = get_price(product.sku)
+            is_parse = existing_price.get('is_parse', True) if existing_price else True
+            set_price(
+                sku=product.sku,
+                price=new_price,
+                old_price=old_price,
+                currency='RUB',
+                is_parse=is_parse
+            )
+            
+            updated_count += 1
+            
+        except Exception as e:
+            errors.append(f"Строка {index + 2}: {str(e)}")
+    
+    db.commit()
+    
+    return {
+        "message": "Обновление цен завершено",
+        "updated": updated_count,
+        "errors": errors,
+        "not_found": not_found,
+        "total_processed": len(df)
+    }
+
+import_jobs.register_runner("products", _run_products_import)
+import_jobs.register_runner("prices", _run_prices_import)
+import_jobs.register_runner("prices_preview", _run_prices_preview)
+import_jobs.register_runner("update_or_create", _run_update_or_create_import)
+import_jobs.register_runner("update_or_create_preview", _run_update_or_create_preview)
+import_jobs.register_runner("images", _run_images_import)
+import_jobs.register_runner("prices_simple", _run_prices_simple_import)
+
+# Задачи, оставшиеся в очереди после перезапуска
+try:
+    import_jobs.recover_jobs()
+except Exception as e:
+    print(f"⚠️ Не удалось восстановить очередь импорта: {e}")
+
+@app.post("/api/excel/import/products", status_code=202)
+async def import_products_from_excel(file: UploadFile = File(...)):
+    """Импортировать товары из Excel файла (фоновая задача, ход выполнения - /api/jobs/{id})"""
+    return await submit_import_job("products", file)
+
+@app.post("/api/excel/import/prices", status_code=202)
+async def import_prices_from_excel(file: UploadFile = File(...), dry_run: bool = False):
+    """
+    Обновить цены из Excel файла (фоновая задача, ход выполнения - /api/jobs/{id})
+    dry_run=true - только отчет об изменившихся ценах, без записи
+    """
+    return await submit_import_job("prices_preview" if dry_run else "prices", file)
+
+@app.post("/api/excel/update-or-create/products", status_code=202)
+async def update_or_create_products_from_excel(file: UploadFile = File(...), dry_run: bool = False):
+    """
+    Массовое обновление существующих товаров (по SKU) или добавление новых (фоновая задача, ход выполнения - /api/jobs/{id})
+    dry_run=true - только отчет об изменениях по строкам, без записи
+    """
+    return await submit_import_job("update_or_create_preview" if dry_run else "update_or_create", file)
+
+@app.post("/api/excel/import/images", status_code=202)
+async def import_images_from_excel(file: UploadFile = File(...)):
+    """Импортировать изображения из Excel файла (фоновая задача, ход выполнения - /api/jobs/{id})"""
+    return await submit_import_job("images", file)
+
+@app.post("/import-prices", status_code=202)
+async def import_prices_simple(file: UploadFile = File(...)):
+    """Простое обновление цен из Excel: SKU - новая цена - старая цена (фоновая задача, ход выполнения - /api/jobs/{id})"""
+    return await submit_import_job("prices_simple", file)
+
+@app.get("/api/admin/price-sync")
+async def get_price_sync_status(_: bool = Depends(require_admin)):
+    """Итоги последней синхронизации цен с сервисом: длительность, изменённые SKU, ошибки"""
+    return await run_in_threadpool(price_sync_scheduler.status)
+
+@app.get("/api/jobs/{job_id}")
+async def get_import_job(job_id: str):
+    """Ход выполнения и итог фоновой задачи импорта"""
+    job = await run_in_threadpool(import_jobs.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return job
 
 @app.get("/download-price-template")
 async def download_price_template(db: Session = Depends(get_db)):
@@ -1369,8 +1048,9 @@ async def download_price_template(db: Session = Depends(get_db)):
         # Создаем DataFrame с примерами
         data = []
         if products:
+            prices = get_prices(product.sku for product in products)
             for product in products:
-                price_data = get_price(product.sku)
+                price_data = prices.get(product.sku)
                 data.append({
                     'SKU': product.sku,
                     'Новая цена': price_data.get('price', 0.0) if price_data else 0.0,
@@ -1392,7 +1072,6 @@ async def download_price_template(db: Session = Depends(get_db)):
             df.to_excel(writer, index=False, sheet_name='Цены')
             
             # Стилизация
-            workbook = writer.book
             worksheet = writer.sheets['Цены']
             
             # Стили для заголовков
@@ -1415,217 +1094,48 @@ async def download_price_template(db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Ошибка создания шаблона: {str(e)}")
 
-@app.post("/import-prices")
-async def import_prices_simple(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    """Простое обновление цен из Excel: SKU - новая цена - старая цена"""
-    if not file.filename.endswith(('.xlsx', '.xls')):
-        raise HTTPException(status_code=400, detail="Файл должен быть в формате Excel (.xlsx или .xls)")
+async def _export_response(build_sheets, export_format: str, filename: str, error_detail: str) -> StreamingResponse:
+    """
+    Ответ экспорта частями по мере чтения товаров: XLSX (write-only openpyxl прямо в zip-архив),
+    CSV или NDJSON (см. excel_export)
+    """
+    media_type = excel_export.EXPORT_FORMATS.get(export_format)
+    if media_type is None:
+        raise HTTPException(status_code=400, detail=f"Неизвестный формат: {export_format} (xlsx, csv, ndjson)")
     
-    try:
-        # Читаем содержимое файла
-        file_content = await file.read()
-        
-        # Парсим как DataFrame
-        df = pd.read_excel(io.BytesIO(file_content))
-        
-        # Проверяем наличие нужных колонок
-        if len(df.columns) < 3:
-            raise HTTPException(status_code=400, detail="Файл должен содержать минимум 3 колонки: SKU, Новая цена, Старая цена")
-        
-        # Используем первые 3 колонки
-        sku_col = df.columns[0]
-        new_price_col = df.columns[1] 
-        old_price_col = df.columns[2]
-        
-        updated_count = 0
-        errors = []
-        not_found = []
-        
-        for index, row in df.iterrows():
-            try:
-                # Пропускаем пустые строки
-                if pd.isna(row[sku_col]) or pd.isna(row[new_price_col]):
-                    continue
-                
-                sku = str(row[sku_col]).strip()
-                try:
-                    new_price = float(row[new_price_col])
-                except:
-                    errors.append(f"Строка {index + 2}: Неверный формат новой цены")
-                    continue
-                
-                try:
-                    old_price = float(row[old_price_col]) if not pd.isna(row[old_price_col]) else new_price
-                except:
-                    old_price = new_price
-                
-                # Найти товар по SKU
-                product = db.query(Product).filter(Product.sku == sku).first()
-                
-                if not product:
-                    not_found.append(f"Строка {index + 2}: Товар с SKU '{sku}' не найден")
-                    continue
-                
-                # Обновить или создать цену в JSON файле
-                existing_price = get_price(product.sku)
-                is_parse = existing_price.get('is_parse', True) if existing_price else True
-                set_price(
-                    sku=product.sku,
-                    price=new_price,
-                    old_price=old_price,
-                    currency='RUB',
-                    is_parse=is_parse
-                )
-                
-                updated_count += 1
-                
-            except Exception as e:
-                errors.append(f"Строка {index + 2}: {str(e)}")
-        
-        db.commit()
-        
-        return {
-            "message": "Обновление цен завершено",
-            "updated": updated_count,
-            "errors": errors,
-            "not_found": not_found,
-            "total_processed": len(df)
-        }
-        
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Ошибка при обновлении цен: {str(e)}")
+    if export_format == 'xlsx':
+        body = excel_export.iter_xlsx(build_sheets)
+        try:
+            # Ошибка до первой части (например, запроса к базе) - обычный ответ 500
+            first_chunk = await run_in_threadpool(next, body, b'')
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"{error_detail}: {str(e)}")
+        body = itertools.chain([first_chunk], body)
+    else:
+        body = excel_export.iter_text(build_sheets, export_format)
+    
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}.{export_format}"}
+    )
 
 @app.get("/api/excel/export/products")
-async def export_products_to_excel(db: Session = Depends(get_db)):
-    """Экспортировать все товары в формате для редактирования и повторного импорта"""
-    try:
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, PatternFill, Alignment
-        
-        # Получить все товары с ценами
-        results = db.query(Product).all()
-        
-        # Создаем Excel файл
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Товары"
-        
-        # Заголовки (те же что в шаблоне для импорта, но без изображений)
-        headers = [
-            'SKU товара', 'Название товара*', 'Описание', 
-            'Основная категория (level0)*', 'Подкатегория (level1)*', 'Детальная категория (level2)*',
-            'Бренд', 'Цена*', 'Валюта', 'Количество на складе',
-            'Характеристики (JSON)'
-        ]
-        
-        # Добавляем заголовки со стилем
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-        
-        # Добавляем данные товаров
-        for row_idx, product in enumerate(results, 2):
-            # Получаем цену из JSON файла
-            price_data = get_price(product.sku)
-            
-            # Получаем характеристики
-            try:
-                specifications = json.loads(product.specifications) if product.specifications else {}
-                specs_str = json.dumps(specifications, ensure_ascii=False) if specifications else ''
-            except:
-                specs_str = ''
-            
-            # Заполняем строку данными (без столбца изображений)
-            ws.cell(row=row_idx, column=1, value=product.sku or '')
-            ws.cell(row=row_idx, column=2, value=product.name or '')
-            ws.cell(row=row_idx, column=3, value='')  # description поле удалено
-            ws.cell(row=row_idx, column=4, value=product.level_0 or '')
-            ws.cell(row=row_idx, column=5, value=product.level_1 or '')
-            ws.cell(row=row_idx, column=6, value=product.level_2 or '')
-            ws.cell(row=row_idx, column=7, value=product.brand or '')
-            ws.cell(row=row_idx, column=8, value=price_data.get('price', 0.0) if price_data else 0.0)
-            ws.cell(row=row_idx, column=9, value=price_data.get('currency', 'RUB') if price_data else 'RUB')
-            ws.cell(row=row_idx, column=10, value=product.stock or 0)
-            ws.cell(row=row_idx, column=11, value=specs_str)
-        
-        # Автоподбор ширины колонок
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        # Добавляем лист с изображениями
-        images_ws = wb.create_sheet("Изображения")
-        images_headers = [
-            'Модель (level_2)*', 'Цвет*', 'URL изображений (через запятую)*'
+async def export_products_to_excel(export_format: str = Query("xlsx", alias="format")):
+    """
+    Экспортировать все товары в формате для редактирования и повторного импорта
+    format: xlsx (листы "Товары" и "Изображения"), csv или ndjson (только товары)
+    """
+    def build_sheets(db: Session):
+        # Цены всех товаров из одного снимка
+        prices = get_prices_snapshot()
+        return [
+            excel_export.ExportSheet("Товары", excel_export.PRODUCT_HEADERS, excel_export.product_rows(db, prices)),
+            excel_export.ExportSheet("Изображения", excel_export.IMAGE_HEADERS, excel_export.image_rows(db),
+                                     header_color="27ae60", max_width=80),
         ]
-        
-        # Добавляем заголовки для изображений
-        for col, header in enumerate(images_headers, 1):
-            cell = images_ws.cell(row=1, column=col, value=header)
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="27ae60", end_color="27ae60", fill_type="solid")
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-        
-        # Получаем все изображения из таблицы ProductImage
-        product_images = db.query(ProductImage).all()
-        
-        # Добавляем данные изображений
-        for row_idx, product_image in enumerate(product_images, 2):
-            try:
-                # Парсим JSON с изображениями
-                images_data = json.loads(product_image.img_list) if product_image.img_list else []
-                
-                # Проверяем, что images_data это список строк, а не список словарей
-                if images_data and isinstance(images_data[0], dict):
-                    # Если это список словарей, извлекаем URL
-                    image_urls = ', '.join([img.get('url', '') for img in images_data if img.get('url')])
-                else:
-                    # Если это список строк
-                    image_urls = ', '.join(images_data) if images_data else ''
-                
-                images_ws.cell(row=row_idx, column=1, value=product_image.level_2 or '')
-                images_ws.cell(row=row_idx, column=2, value=product_image.color or '')
-                images_ws.cell(row=row_idx, column=3, value=image_urls)
-            except Exception as e:
-                print(f"Ошибка при обработке изображений для {product_image.level_2} - {product_image.color}: {e}")
-                continue
-        
-        # Автоподбор ширины колонок для изображений
-        for column in images_ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 80)
-            images_ws.column_dimensions[column_letter].width = adjusted_width
-        
-        # Сохраняем в BytesIO
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        return StreamingResponse(
-            output,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": "attachment; filename=current_products.xlsx"}
-        )
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Ошибка при экспорте: {str(e)}")
+    
+    return await _export_response(build_sheets, export_format, "current_products", "Ошибка при экспорте")
 
 # Additional Price Management API
 @app.get("/api/prices/current")
@@ -1919,6 +1429,41 @@ async def get_variant_schemes(model_key: str, db: Session = Depends(get_db)):
     except json.JSONDecodeError:
         raise HTTPException(status_code=500, detail="Ошибка парсинга схемы вариантов")
 
+@app.get("/facets")
+async def get_facets(
+    level0: Optional[str] = None,
+    level1: Optional[str] = None,
+    level2: Optional[str] = None,
+    brand: Optional[str] = None,
+    color: Optional[str] = None,
+    disk: Optional[str] = None,
+    ram: Optional[str] = None,
+    sim_config: Optional[str] = None,
+    price_min: Optional[float] = None,
+    price_max: Optional[float] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Значения всех фасетов с числом товаров для текущего состояния фильтров
+    Заменяет последовательные запросы /hierarchy/brands и /hierarchy/levels.
+    Число у значения атрибута считается без фильтра по самому атрибуту.
+    """
+    facet_index.ensure(db)
+    return facet_index.facets(
+        {
+            'level_0': level0,
+            'level_1': level1,
+            'level_2': level2,
+            'brand': brand,
+            'color': color,
+            'disk': disk,
+            'ram': ram,
+            'sim_config': sim_config,
+        },
+        price_min=price_min,
+        price_max=price_max,
+    )
+
 # Новые endpoints для иерархической фильтрации
 
 @app.get("/hierarchy/brands")
@@ -1932,7 +1477,7 @@ async def get_brands(level0: Optional[str] = None, db: Session = Depends(get_db)
     if level0:
         filters.append(Product.level_0 == level0)
     
-    brands = db.query(Product.brand.distinct()).filter(*filters).all()
+    brands = db.query(Product.brand).filter(*filters).distinct().all()
     return [brand[0] for brand in brands]
 
 @app.get("/hierarchy/levels")
@@ -1965,40 +1510,40 @@ async def get_hierarchy_levels(
     
     if level == 0:
         # Получаем все level_0
-        results = query.with_entities(Product.level_0.distinct()).filter(
+        results = query.with_entities(Product.level_0).filter(
             Product.level_0.isnot(None)
-        ).all()
+        ).distinct().all()
         return [item[0] for item in results if item[0]]
         
     elif level == 1:
         # Получаем все level_1
-        results = query.with_entities(Product.level_1.distinct()).filter(
+        results = query.with_entities(Product.level_1).filter(
             Product.level_1.isnot(None)
-        ).all()
+        ).distinct().all()
         return [item[0] for item in results if item[0]]
         
     elif level == 2:
         # Получаем все level_2
-        results = query.with_entities(Product.level_2.distinct()).filter(
+        results = query.with_entities(Product.level_2).filter(
             Product.level_2.isnot(None)
-        ).all()
+        ).distinct().all()
         return [item[0] for item in results if item[0]]
     
     else:
         # Возвращаем всю иерархию
         return {
-            "level0": db.query(Product.level_0.distinct()).filter(
+            "level0": db.query(Product.level_0).filter(
                 Product.level_0.isnot(None),
                 Product.is_available == True
-            ).all(),
-            "level1": db.query(Product.level_1.distinct()).filter(
+            ).distinct().all(),
+            "level1": db.query(Product.level_1).filter(
                 Product.level_1.isnot(None),
                 Product.is_available == True
-            ).all(),
-            "level2": db.query(Product.level_2.distinct()).filter(
+            ).distinct().all(),
+            "level2": db.query(Product.level_2).filter(
                 Product.level_2.isnot(None),
                 Product.is_available == True
-            ).all()
+            ).distinct().all()
         }
 
 @app.get("/hierarchy/models")
@@ -2016,15 +1561,15 @@ async def get_models(
     if brand:
         filters.append(Product.brand == brand)
     if level0:
-        filters.append(Product.level0 == level0)
+        filters.append(Product.level_0 == level0)
     if level1:
-        filters.append(Product.level1 == level1)
+        filters.append(Product.level_1 == level1)
     if level2:
-        filters.append(Product.level2 == level2)
+        filters.append(Product.level_2 == level2)
     
-    models = db.query(Product.level_2.distinct()).filter(
+    models = db.query(Product.level_2).filter(
         and_(*filters)
-    ).all()
+    ).distinct().all()
     
     return [model[0] for model in models if model[0]]
 
@@ -2055,9 +1600,11 @@ async def get_skus_with_info(
     # Получаем SKU с ценами
     results = db.query(Product).filter(and_(*filters)).all()
     
+    prices = get_prices(product.sku for product in results)
+    
     skus_info = []
     for product in results:
-        price_data = get_price(product.sku)
+        price_data = prices.get(product.sku)
         sku_data = {
             "sku": product.sku,
             "name": product.name,
@@ -2080,8 +1627,7 @@ async def debug_db_status(db: Session = Depends(get_db)):
     try:
         product_count = db.query(Product).count()
         category_count = db.query(Category).count()
-        all_prices = get_all_prices()
-        price_count = len(all_prices)
+        price_count = len(get_prices_snapshot())
         
         # Get sample products
         sample_products = db.query(Product).limit(5).all()
@@ -2199,145 +1745,28 @@ async def import_single_product(product_data: dict, db: Session = Depends(get_db
         raise HTTPException(status_code=400, detail=f"Ошибка добавления товара: {str(e)}")
 
 @app.get("/export-products")
-async def export_all_products(db: Session = Depends(get_db)):
-    """Скачать полный ассортимент в Excel с всеми столбцами"""
-    try:
-        # Получить все товары с ценами
-        results = db.query(Product).all()
-        
-        products_data = []
-        for product in results:
-            # Получаем цену из JSON файла
-            price_data = get_price(product.sku)
-            
-            try:
-                specifications = json.loads(product.specifications) if product.specifications else {}
-            except json.JSONDecodeError:
-                specifications = {}
-            
-            # Получить массив изображений
-            images = get_product_images(product, db)
-            
-            products_data.append({
-                'ID': product.id,
-                'SKU': product.sku,
-                'Название': product.name,
-                'Описание': '',  # поле description удалено
-                'Бренд': product.brand,
-                'Категория': product.level_0 or '',
-                'Уровень 0': product.level_0 or '',
-                'Уровень 1': product.level_1 or '',
-                'Уровень 2': product.level_2 or '',
-                'Цвет': product.color or '',
-                'Память': product.disk or '',
-                'SIM': product.sim_config or '',
-                'Цена': price_data.get('price', 0.0) if price_data else 0.0,
-                'Старая цена': price_data.get('old_price', 0.0) if price_data else 0.0,
-                'Валюта': price_data.get('currency', 'RUB') if price_data else 'RUB',
-                'Скидка %': price_data.get('discount_percentage', 0.0) if price_data else 0.0,
-                'Склад': product.stock,
-                'В наличии': 'Да' if product.is_available else 'Нет',
-                'Изображения': ' | '.join(images) if images else '',
-                'Кол-во изображений': len(images),
-                'Создано': product.created_at.strftime('%Y-%m-%d %H:%M:%S') if product.created_at else '',
-                'Обновлено': product.updated_at.strftime('%Y-%m-%d %H:%M:%S') if product.updated_at else ''
-            })
-        
-        # Создать DataFrame и Excel файл
-        from io import BytesIO
-        
-        df = pd.DataFrame(products_data)
-        
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='Ассортимент')
-            
-            # Стилизация
-            workbook = writer.book
-            worksheet = writer.sheets['Ассортимент']
-            
-            # Стили для заголовков
-            header_font = openpyxl.styles.Font(bold=True, color="FFFFFF")
-            header_fill = openpyxl.styles.PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-            
-            for cell in worksheet[1]:
-                cell.font = header_font
-                cell.fill = header_fill
-                cell.alignment = openpyxl.styles.Alignment(horizontal="center", vertical="center")
-        
-        output.seek(0)
-        
-        return StreamingResponse(
-            BytesIO(output.read()),
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": "attachment; filename=assortment_full.xlsx"}
-        )
-        
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Ошибка экспорта: {str(e)}")
+async def export_all_products(export_format: str = Query("xlsx", alias="format")):
+    """Скачать полный ассортимент со всеми столбцами (format: xlsx, csv или ndjson)"""
+    def build_sheets(db: Session):
+        # Цены всех товаров из одного снимка
+        prices = get_prices_snapshot()
+        return [excel_export.ExportSheet("Ассортимент", excel_export.ASSORTMENT_HEADERS,
+                                         excel_export.assortment_rows(db, prices), max_width=80)]
+    
+    return await _export_response(build_sheets, export_format, "assortment_full", "Ошибка экспорта")
 
 @app.get("/export-prices")
-async def export_all_prices(db: Session = Depends(get_db)):
-    """Скачать все цены в Excel"""
-    try:
-        # Получить все товары с ценами
-        results = db.query(Product).filter(Product.is_available == True).all()
-        
-        prices_data = []
-        for product in results:
-            # Получаем цену из JSON файла
-            price_data = get_price(product.sku)
-            
-            if price_data:  # Только товары с ценами
-                prices_data.append({
-                    'SKU': product.sku,
-                    'Название товара': product.name,
-                    'Бренд': product.brand,
-                    'Текущая цена': price_data.get('price', 0.0),
-                    'Старая цена': price_data.get('old_price', 0.0),
-                    'Валюта': price_data.get('currency', 'RUB'),
-                    'Скидка %': f"{price_data.get('discount_percentage', 0.0):.1f}%",
-                    'Разница': f"{price_data.get('old_price', 0.0) - price_data.get('price', 0.0):.0f}" if price_data.get('old_price', 0.0) > price_data.get('price', 0.0) else "0",
-                    'Категория': product.level_0 or 'Без категории',
-                    'В наличии': product.stock,
-                    'Обновлено': 'Неизвестно'  # updated_at больше не хранится
-                })
-        
-        if not prices_data:
-            raise HTTPException(status_code=400, detail="Цены не найдены")
-        
-        # Создать DataFrame и Excel файл
-        from io import BytesIO
-        
-        df = pd.DataFrame(prices_data)
-        
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='Цены')
-            
-            # Стилизация
-            workbook = writer.book
-            worksheet = writer.sheets['Цены']
-            
-            # Стили для заголовков
-            header_font = openpyxl.styles.Font(bold=True, color="FFFFFF")
-            header_fill = openpyxl.styles.PatternFill(start_color="27ae60", end_color="27ae60", fill_type="solid")
-            
-            for cell in worksheet[1]:
-                cell.font = header_font
-                cell.fill = header_fill
-                cell.alignment = openpyxl.styles.Alignment(horizontal="center", vertical="center")
-        
-        output.seek(0)
-        
-        return StreamingResponse(
-            BytesIO(output.read()),
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": "attachment; filename=prices_full.xlsx"}
-        )
-        
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Ошибка экспорта цен: {str(e)}")
+async def export_all_prices(export_format: str = Query("xlsx", alias="format")):
+    """Скачать все цены (format: xlsx, csv или ndjson)"""
+    prices = get_prices_snapshot()
+    if not prices:
+        raise HTTPException(status_code=400, detail="Цены не найдены")
+    
+    def build_sheets(db: Session):
+        return [excel_export.ExportSheet("Цены", excel_export.PRICE_HEADERS, excel_export.price_rows(db, prices),
+                                         header_color="27ae60")]
+    
+    return await _export_response(build_sheets, export_format, "prices_full", "Ошибка экспорта цен")
 
 @app.get("/admin/schemes")
 async def get_all_schemes(db: Session = Depends(get_db)):
@@ -2799,7 +2228,7 @@ async def check_promo_code(request: PromoCodeCheckRequest, db: Session = Depends
                     # Адаптера нет в корзине - не даем скидку
                     return PromoCodeCheckResponse(
                         valid=False,
-                        message=f"Промокод действует только если адаптер уже добавлен в корзину"
+                        message="Промокод действует только если адаптер уже добавлен в корзину"
                     )
                 
                 # Адаптер есть в корзине - даем скидку равную его цене
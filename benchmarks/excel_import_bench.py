@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк импорта Excel: pandas (read_excel + iterrows) против потокового openpyxl
+
+Создает файл фида с листами "Товары" и "Изображения" и сравнивает:
+  - прежний разбор: pd.read_excel для каждого листа (книга читается дважды) и df.iterrows();
+  - потоковый разбор ExcelHandler.iter_products / iter_images (одна книга read-only);
+  - полный потоковый импорт excel_import.import_products во временную базу.
+Для каждого этапа печатается время, с --memory - пик памяти Python (tracemalloc,
+время при этом в несколько раз больше). Пик потокового разбора и импорта не должен
+заметно зависеть от числа строк - сравните запуски с --rows 10000 и --rows 100000.
+Растут только общие таблицы строк xlsx (sharedStrings) и индекс цен price_storage,
+который хранит все цены независимо от импорта.
+
+Запуск:
+    python benchmarks/excel_import_bench.py --rows 100000
+    python benchmarks/excel_import_bench.py --rows 100000 --memory
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Добавляем путь к проекту для импорта модулей
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+WORK_DIR = tempfile.mkdtemp(prefix="yo_store_excel_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(WORK_DIR, 'catalog.db')}"
+os.environ["PRICES_FILE"] = os.path.join(WORK_DIR, "prices.json")
+os.environ["SEARCH_INDEX_FILE"] = os.path.join(WORK_DIR, "search.db")
+os.environ["CATALOG_GENERATION_FILE"] = os.path.join(WORK_DIR, "generation")
+
+import pandas as pd
+from openpyxl import Workbook
+
+from database import SessionLocal, create_tables
+from excel_handler import ExcelHandler, PRODUCT_REQUIRED_COLUMNS, IMAGE_REQUIRED_COLUMNS
+import excel_import
+
+PRODUCT_HEADERS = [
+    'SKU товара', 'Название товара*', 'Описание', 'Основная категория (level0)*', 'Подкатегория (level1)*',
+    'Детальная категория (level2)*', 'Бренд', 'Цена*', 'Валюта', 'Количество на складе',
+    'URL изображения (через запятую)', 'Характеристики (JSON)'
+]
+COLORS = ["Black", "White", "Blue", "Red", "Green", "Silver", "Gold"]
+DISKS = ["128GB", "256GB", "512GB", "1TB"]
+
+
+def build_feed(rows: int) -> bytes:
+    """Файл фида из rows товаров (write-only книга, чтобы не держать ее в памяти)"""
+    wb = Workbook(write_only=True)
+    products = wb.create_sheet("Товары")
+    products.append(PRODUCT_HEADERS)
+    images = wb.create_sheet("Изображения")
+    images.append(IMAGE_REQUIRED_COLUMNS)
+    for i in range(rows):
+        series, model = i % 10, i % 250
+        color, disk = COLORS[i % len(COLORS)], DISKS[i % len(DISKS)]
+        level_2 = f"Phone {series}.{model}"
+        specs = json.dumps({"color": color, "disk": disk, "sim_config": "Dual SIM"})
+        products.append([
+            f"SKU-{i:07d}", f"{level_2} {disk} {color}", "", "Смартфоны", f"{series} Series", level_2,
+            "Brand", 10000 + i % 90000, "RUB", 5, "", specs
+        ])
+        if i % 40 == 0:
+            images.append([level_2, color, f"/static/{model}/{color}/1.jpg, /static/{model}/{color}/2.jpg"])
+    output = io.BytesIO()
+    wb.save(output)
+    return output.getvalue()
+
+
+def legacy_parse(file_content: bytes) -> int:
+    """Прежний разбор: read_excel на каждый лист и iterrows"""
+    count = 0
+    for sheet, required in (("Товары", PRODUCT_REQUIRED_COLUMNS), ("Изображения", IMAGE_REQUIRED_COLUMNS)):
+        df = pd.read_excel(io.BytesIO(file_content), sheet_name=sheet)
+        for _, row in df.iterrows():
+            if not any(pd.isna(row[col]) for col in required[:3]):
+                count += 1
+    return count
+
+
+def streaming_parse(file_content: bytes) -> int:
+    handler = ExcelHandler()
+    wb = handler.open_workbook(file_content)
+    try:
+        errors = []
+        count = sum(1 for _ in handler.iter_products(wb, errors))
+        count += sum(1 for _ in handler.iter_images(wb, errors))
+    finally:
+        wb.close()
+    return count
+
+
+def streaming_import(file_content: bytes, chunk_size: int) -> dict:
+    db = SessionLocal()
+    try:
+        return excel_import.import_products(db, file_content, chunk_size)
+    finally:
+        db.close()
+
+
+def measure(label: str, trace_memory: bool, func, *args):
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    line = f"{label:50s} {elapsed:8.2f} с"
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        line += f"   пик памяти {peak / 1024 / 1024:8.1f} МБ"
+    print(line)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--skip-legacy", action="store_true", help="не запускать разбор через pandas")
+    parser.add_argument("--memory", action="store_true", help="измерять пик памяти (tracemalloc)")
+    args = parser.parse_args()
+
+    create_tables()
+    start = time.perf_counter()
+    feed = build_feed(args.rows)
+    print(f"Фид из {args.rows} строк: {len(feed) / 1024 / 1024:.1f} МБ, создан за {time.perf_counter() - start:.1f} с")
+
+    if not args.skip_legacy:
+        measure("pandas: read_excel x2 + iterrows", args.memory, legacy_parse, feed)
+    parsed = measure("openpyxl read-only: iter_products + iter_images", args.memory, streaming_parse, feed)
+    result = measure(f"потоковый импорт в базу (пачки по {args.chunk_size})", args.memory,
+                     streaming_import, feed, args.chunk_size)
+    print(f"Строк разобрано: {parsed}, товаров добавлено: {result['added']}, "
+          f"изображений: {result['images_added']}, ошибок: {len(result['errors'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк экспорта ассортимента (/export-products): прежний Workbook в памяти
+против потокового excel_export (XLSX write-only, CSV, NDJSON)
+
+Во временную базу добавляются --rows товаров с ценами и изображениями.
+Для каждого способа печатается время до первого байта ответа (TTFB) и общее
+время, с --memory - пик памяти Python (tracemalloc, время при этом в несколько
+раз больше). Пик потокового экспорта не должен заметно зависеть от числа
+товаров - сравните запуски с --rows 10000 и --rows 50000.
+
+Запуск:
+    python benchmarks/export_bench.py --rows 50000
+    python benchmarks/export_bench.py --rows 50000 --memory
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Добавляем путь к проекту для импорта модулей
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+WORK_DIR = tempfile.mkdtemp(prefix="yo_store_export_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(WORK_DIR, 'catalog.db')}"
+os.environ["PRICES_FILE"] = os.path.join(WORK_DIR, "prices.json")
+os.environ["SEARCH_INDEX_FILE"] = os.path.join(WORK_DIR, "search.db")
+os.environ["CATALOG_GENERATION_FILE"] = os.path.join(WORK_DIR, "generation")
+
+from openpyxl import Workbook
+
+from database import SessionLocal, create_tables
+from models import Product, ProductImage
+from model_cards import get_product_images
+import excel_export
+import price_storage
+
+COLORS = ["Black", "White", "Blue", "Red", "Green", "Silver", "Gold"]
+
+
+def seed(count: int) -> None:
+    """Товары, их цены и изображения моделей"""
+    db = SessionLocal()
+    try:
+        for start in range(0, count, 1000):
+            for i in range(start, min(start + 1000, count)):
+                model, color = i % 250, COLORS[i % len(COLORS)]
+                db.add(Product(
+                    sku=f"SKU-{i:07d}", name=f"Phone {model} {color}", brand="Brand", level_0="Смартфоны",
+                    level_1=f"{i % 10} Series", level_2=f"Phone {model}", stock=5, is_available=True,
+                    specifications=json.dumps({"color": color, "disk": "256GB"})
+                ))
+            db.commit()
+        for model in range(250):
+            for color in COLORS:
+                db.add(ProductImage(level_2=f"Phone {model}", color=color,
+                                    img_list=json.dumps([f"/static/{model}/{color}/{n}.jpg" for n in range(3)])))
+        db.commit()
+    finally:
+        db.close()
+    price_storage.update_prices({
+        f"SKU-{i:07d}": {'price': float(10000 + i), 'old_price': float(12000 + i), 'currency': 'RUB', 'is_parse': True}
+        for i in range(count)
+    })
+
+
+def legacy_export() -> bytes:
+    """Прежний способ: все товары и ячейки в Workbook в памяти, затем проход по колонкам для ширины"""
+    db = SessionLocal()
+    try:
+        results = db.query(Product).all()
+        prices = price_storage.get_prices(product.sku for product in results)
+        wb = Workbook()
+        ws = wb.active
+        ws.append(excel_export.ASSORTMENT_HEADERS)
+        for product in results:
+            price_data = prices.get(product.sku) or {}
+            images = get_product_images(product, db)
+            ws.append([product.id, product.sku, product.name, '', product.brand, product.level_0, product.level_0,
+                       product.level_1, product.level_2, product.color, product.disk, product.sim_config,
+                       price_data.get('price'), price_data.get('old_price'), price_data.get('currency'),
+                       price_data.get('discount_percentage'), product.stock, 'Да', ' | '.join(images),
+                       len(images), '', ''])
+        for column in ws.columns:
+            width = max(len(str(cell.value)) for cell in column)
+            ws.column_dimensions[column[0].column_letter].width = min(width + 2, 80)
+        output = io.BytesIO()
+        wb.save(output)
+        return output.getvalue()
+    finally:
+        db.close()
+
+
+def build_sheets(db):
+    prices = price_storage.get_prices_snapshot()
+    return [excel_export.ExportSheet("Ассортимент", excel_export.ASSORTMENT_HEADERS,
+                                     excel_export.assortment_rows(db, prices), max_width=80)]
+
+
+def legacy_chunks():
+    yield legacy_export()
+
+
+def xlsx_chunks():
+    return excel_export.iter_xlsx(build_sheets)
+
+
+def text_chunks(export_format: str):
+    return excel_export.iter_text(build_sheets, export_format)
+
+
+def measure(label: str, trace_memory: bool, chunks_factory) -> None:
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    first_byte = None
+    size = 0
+    for chunk in chunks_factory():
+        if first_byte is None:
+            first_byte = time.perf_counter() - start
+        size += len(chunk)
+    elapsed = time.perf_counter() - start
+    line = f"{label:36s} TTFB {first_byte:7.2f} с   всего {elapsed:7.2f} с   {size / 1024 / 1024:6.1f} МБ"
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        line += f"   пик памяти {peak / 1024 / 1024:7.1f} МБ"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--skip-legacy", action="store_true", help="не запускать прежний экспорт")
+    parser.add_argument("--memory", action="store_true", help="измерять пик памяти (tracemalloc)")
+    args = parser.parse_args()
+
+    create_tables()
+    start = time.perf_counter()
+    seed(args.rows)
+    print(f"Товаров: {args.rows}, база создана за {time.perf_counter() - start:.1f} с")
+
+    if not args.skip_legacy:
+        measure("прежний: Workbook в памяти", args.memory, legacy_chunks)
+    measure("xlsx: write-only потоком", args.memory, xlsx_chunks)
+    measure("csv: потоком", args.memory, lambda: text_chunks('csv'))
+    measure("ndjson: потоком", args.memory, lambda: text_chunks('ndjson'))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк фасетов: битовые карты facet_index против DISTINCT запросов /hierarchy
+
+Заполняет временную базу синтетическим каталогом, строит индекс фасетов и
+сравнивает одно состояние фильтров в /facets с цепочкой запросов, которую
+раньше делал webapp (бренды, level_1, level_2, цвета - без счетчиков).
+
+Запуск:
+    python benchmarks/facets_bench.py --products 50000
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Добавляем путь к проекту для импорта модулей
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+WORK_DIR = tempfile.mkdtemp(prefix="yo_store_facets_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(WORK_DIR, 'catalog.db')}"
+os.environ["PRICES_FILE"] = os.path.join(WORK_DIR, "prices.json")
+os.environ["CATALOG_GENERATION_FILE"] = os.path.join(WORK_DIR, "generation")
+
+from database import engine, SessionLocal, create_tables
+from models import Product, parse_specifications, variant_values
+from facets import facet_index
+import price_storage
+
+CATEGORIES = {
+    "Смартфоны": ["Apple", "Samsung", "Xiaomi", "Google"],
+    "Ноутбуки": ["Apple", "Lenovo", "ASUS"],
+    "Планшеты": ["Apple", "Samsung"],
+    "Умные колонки": ["Yandex"],
+}
+COLORS = ["Black", "White", "Blue", "Red", "Green", "Silver", "Gold"]
+DISKS = ["128GB", "256GB", "512GB", "1TB"]
+RAMS = ["8GB", "16GB", "32GB"]
+SIMS = ["SIM + eSIM", "Dual eSIM", "Dual SIM"]
+
+
+def seed(products: int):
+    """Синтетический каталог: вставка через Core, колонки вариантов заполняются явно"""
+    create_tables()
+    rng = random.Random(42)
+    rows, prices = [], {}
+    for i in range(products):
+        level_0 = rng.choice(list(CATEGORIES))
+        brand = rng.choice(CATEGORIES[level_0])
+        series = rng.randrange(10)
+        specs = {"color": rng.choice(COLORS), "disk": rng.choice(DISKS), "sim_config": rng.choice(SIMS)}
+        if level_0 == "Ноутбуки":
+            specs["ram"] = rng.choice(RAMS)
+        sku = f"SKU-{i:06d}"
+        specifications = json.dumps(specs)
+        rows.append({
+            "sku": sku, "name": f"{brand} {series} {i}", "brand": brand,
+            "level_0": level_0, "level_1": f"{brand} {series} Series",
+            "level_2": f"{brand} Model {series}.{i % 25}",
+            "specifications": specifications, "stock": 1, "is_available": True,
+            **variant_values(parse_specifications(specifications)),
+        })
+        prices[sku] = {"price": float(rng.randrange(5000, 200000)), "old_price": 0.0, "currency": "RUB"}
+    with engine.begin() as conn:
+        conn.execute(Product.__table__.insert(), rows)
+    price_storage.update_prices(prices)
+
+
+def timed(label: str, func, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:46s} {best * 1000:8.2f} мс")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    seed(args.products)
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        facet_index.rebuild(db)
+        print(f"Индекс фасетов по {args.products} товарам построен за {time.perf_counter() - start:.2f} с")
+
+        available = Product.is_available == True
+
+        def hierarchy_round_trips():
+            level_0 = "Смартфоны"
+            db.query(Product.brand).filter(available, Product.level_0 == level_0).distinct().all()
+            db.query(Product.level_1).filter(available, Product.level_0 == level_0, Product.brand == "Apple").distinct().all()
+            db.query(Product.level_2).filter(available, Product.level_0 == level_0, Product.brand == "Apple").distinct().all()
+            db.query(Product.color).filter(available, Product.level_0 == level_0, Product.brand == "Apple").distinct().all()
+
+        filters = {"level_0": "Смартфоны", "brand": "Apple", "color": "Black"}
+        timed("DISTINCT запросы /hierarchy (без счетчиков)", hierarchy_round_trips, args.repeat)
+        result = timed("facet_index.facets(): все фасеты со счетчиками", lambda: facet_index.facets(filters), args.repeat)
+        timed("facet_index.facets() + диапазон цен",
+              lambda: facet_index.facets(filters, price_min=20000, price_max=90000), args.repeat)
+        print(f"Товаров по фильтру: {result['total']}, значений фасетов: "
+              f"{sum(len(values) for values in result['facets'].values())}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
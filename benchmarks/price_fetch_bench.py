@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк получения цен из сервиса: размер пачки и число одновременных запросов
+
+Запускает заглушку сервиса (price_service_stub.py) в этом процессе и вызывает
+update_prices_from_service.get_prices_from_service для --skus SKU с разными
+размерами пачки и параллельностью. Время ответа заглушки растет с числом SKU
+в запросе, поэтому один запрос со всеми SKU (пачка "все") при --timeout 3
+не укладывается в таймаут - как прежний запрос при большом каталоге.
+Для каждого варианта печатается время, число полученных цен и запросов
+(с повторами после ответов 503).
+
+Запуск:
+    python benchmarks/price_fetch_bench.py --skus 20000 --fail-rate 0.05
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+# Добавляем путь к проекту для импорта модулей
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+WORK_DIR = tempfile.mkdtemp(prefix="yo_store_prices_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(WORK_DIR, 'catalog.db')}"
+os.environ["PRICES_FILE"] = os.path.join(WORK_DIR, "prices.json")
+os.environ["CATALOG_GENERATION_FILE"] = os.path.join(WORK_DIR, "generation")
+# price_updater.log создается в текущем каталоге
+os.chdir(WORK_DIR)
+
+from price_service_stub import start_stub
+import update_prices_from_service as updater
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--skus", type=int, default=20000)
+    parser.add_argument("--chunk-sizes", default="0,2000,500,100", help="размеры пачек через запятую, 0 - все SKU")
+    parser.add_argument("--concurrency", default="1,4,8", help="параллельность через запятую")
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--per-sku-ms", type=float, default=0.2)
+    parser.add_argument("--fail-rate", type=float, default=0.05)
+    parser.add_argument("--timeout", type=float, default=3, help="таймаут одного запроса, с")
+    args = parser.parse_args()
+
+    stub = start_stub(latency=args.latency_ms / 1000, per_sku=args.per_sku_ms / 1000, fail_rate=args.fail_rate)
+    updater.PRICE_SERVICE_URL = stub.url
+    updater.PRICE_SERVICE_TIMEOUT = args.timeout
+    updater.PRICE_SERVICE_BACKOFF = 0.1
+    updater.PRICE_SERVICE_BACKOFF_MAX = 1
+    updater.logger.setLevel(logging.ERROR)
+
+    skus = [f"SKU-{i:07d}" for i in range(args.skus)]
+    print(f"SKU: {args.skus}, ответ заглушки {args.latency_ms:.0f} мс + {args.per_sku_ms} мс/SKU, "
+          f"503: {args.fail_rate:.0%}, таймаут {args.timeout} с")
+    print(f"{'пачка':>6s} {'параллельно':>12s} {'время, с':>10s} {'цен':>8s} {'запросов':>9s}")
+    for chunk_size in (int(value) for value in args.chunk_sizes.split(',')):
+        for concurrency in (int(value) for value in args.concurrency.split(',')):
+            if chunk_size == 0 and concurrency > 1:
+                continue
+            stub.reset()
+            start = time.perf_counter()
+            prices = updater.get_prices_from_service(skus, chunk_size=chunk_size or len(skus),
+                                                     concurrency=concurrency)
+            elapsed = time.perf_counter() - start
+            label = str(chunk_size) if chunk_size else "все"
+            print(f"{label:>6s} {concurrency:12d} {elapsed:10.2f} {len(prices or {}):8d} {stub.requests:9d}")
+    stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
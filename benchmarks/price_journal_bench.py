@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк и проверка надежности записи цен
+
+1. Пропускная способность: N последовательных set_price в режимах
+   json (перезапись файла) и journal (журнал + компактизация).
+2. Проверка на сбой: дочерний процесс пишет цены и убивается SIGKILL
+   в случайный момент; после этого файл цен должен читаться целиком,
+   а каждая подтвержденная запись - присутствовать.
+
+Запуск:
+    python benchmarks/price_journal_bench.py --skus 5000 --writes 500
+"""
+
+import argparse
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+import price_storage
+
+
+def seed_prices(file_path: str, count: int) -> None:
+    """Создать файл цен из count SKU"""
+    prices = {
+        f"SKU{i:06d}": {"price": 1000.0 + i, "old_price": 1000.0 + i, "currency": "RUB", "is_parse": True}
+        for i in range(count)
+    }
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump(prices, f, ensure_ascii=False, indent=2)
+
+
+def configure(file_path: str, mode: str) -> None:
+    """Переключить price_storage на файл и режим записи"""
+    price_storage.PRICES_FILE = file_path
+    price_storage.PRICES_STORAGE_MODE = mode
+    price_storage._index.invalidate()
+
+
+def throughput(tmp_dir: str, mode: str, skus: int, writes: int) -> float:
+    """Количество set_price в секунду"""
+    file_path = os.path.join(tmp_dir, f'throughput_{mode}.json')
+    seed_prices(file_path, skus)
+    configure(file_path, mode)
+
+    start = time.perf_counter()
+    for i in range(writes):
+        price_storage.set_price(f"SKU{i % skus:06d}", 2000.0 + i)
+    price_storage.compact_prices()
+    elapsed = time.perf_counter() - start
+
+    price_storage._index.invalidate()
+    assert price_storage.get_price(f"SKU{(writes - 1) % skus:06d}")['price'] == 2000.0 + writes - 1
+    return writes / elapsed
+
+
+CHILD_SCRIPT = """
+import sys
+sys.path.insert(0, {project_dir!r})
+import price_storage
+price_storage.PRICES_FILE = {file_path!r}
+price_storage.PRICES_STORAGE_MODE = {mode!r}
+price_storage.PRICES_JOURNAL_COMPACT_EVERY = 50
+i = 0
+while True:
+    price_storage.set_price("SKU%06d" % (i % {skus}), 5000.0 + i)
+    # Подтверждаем запись только после возврата из set_price
+    sys.stdout.write("%d\\n" % i)
+    sys.stdout.flush()
+    i += 1
+"""
+
+
+def crash_check(tmp_dir: str, mode: str, skus: int, rounds: int) -> None:
+    """Убить пишущий процесс в случайный момент и проверить целостность данных"""
+    for round_number in range(rounds):
+        file_path = os.path.join(tmp_dir, f'crash_{mode}_{round_number}.json')
+        seed_prices(file_path, skus)
+
+        script = CHILD_SCRIPT.format(project_dir=PROJECT_DIR, file_path=file_path, mode=mode, skus=skus)
+        child = subprocess.Popen([sys.executable, '-c', script], stdout=subprocess.PIPE, text=True)
+        time.sleep(random.uniform(0.2, 1.0))
+        child.send_signal(signal.SIGKILL)
+        output, _ = child.communicate()
+        acknowledged = [int(line) for line in output.split()]
+
+        configure(file_path, mode)
+        prices = price_storage.get_all_prices()
+        assert len(prices) == skus, f"{mode}: потеряны SKU ({len(prices)} из {skus})"
+
+        # Для каждого SKU последняя подтвержденная запись должна быть видна
+        # (допустима и более поздняя, если процесс убит сразу после записи)
+        latest = {}
+        for i in acknowledged:
+            latest[f"SKU{i % skus:06d}"] = 5000.0 + i
+        for sku, price in latest.items():
+            assert prices[sku]['price'] >= price, f"{mode}: потеряна запись {sku}={price}"
+
+    print(f"  {mode:8s}: {rounds} аварийных остановок, данные целы")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--skus', type=int, default=5000, help='количество SKU в файле цен')
+    parser.add_argument('--writes', type=int, default=500, help='количество последовательных set_price')
+    parser.add_argument('--crash-rounds', type=int, default=5, help='количество аварийных остановок на режим')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        print(f"Пропускная способность set_price ({args.skus} SKU, {args.writes} записей):")
+        for mode in ('json', 'journal'):
+            rate = throughput(tmp_dir, mode, args.skus, args.writes)
+            print(f"  {mode:8s}: {rate:10.0f} записей/с")
+
+        print("Проверка на сбой (SIGKILL во время записи):")
+        for mode in ('json', 'journal'):
+            crash_check(tmp_dir, mode, min(args.skus, 200), args.crash_rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Локальная заглушка сервиса цен для update_prices_from_service.py
+
+POST /api/prices {"skus": [...]} -> {"prices": {sku: {"price": ..., "name": sku}}}
+POST /api/prices/changes {"since": cursor, "limit": N}
+    -> {"prices": {...}, "cursor": "...", "has_more": bool}
+Время ответа - latency + per_sku * число SKU, часть запросов (fail_rate)
+отвечает 503 - так проверяются пачки, повторы и частичные сбои.
+Цена SKU детерминирована (crc32), поэтому повторные запуски не меняют цены.
+
+Изменения цен (change_prices) попадают в журнал с номерами версий; курсор -
+номер последней отданной версии. since=null отдает текущий курсор без цен,
+курсор старше хранимого журнала (retain записей) - ответ 410.
+
+Запуск (адрес по умолчанию совпадает с PRICE_SERVICE_URL):
+    python benchmarks/price_service_stub.py --port 8005 --latency-ms 50 --per-sku-ms 0.2 --fail-rate 0.05
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class PriceServiceStub(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency: float = 0.05, per_sku: float = 0.0002, fail_rate: float = 0.0,
+                 retain: int = 100000):
+        super().__init__(address, _Handler)
+        self.latency = latency
+        self.per_sku = per_sku
+        self.fail_rate = fail_rate
+        self.retain = retain
+        self.requests = 0
+        self.failures = 0
+        self.skus_sent = 0
+        self._lock = threading.Lock()
+        # Журнал изменений: (версия, sku); цены измененных SKU
+        self.version = 0
+        self._log = []
+        self._overrides = {}
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/api/prices"
+
+    def count(self, failed: bool, skus: int = 0) -> None:
+        with self._lock:
+            self.requests += 1
+            self.failures += failed
+            self.skus_sent += skus
+
+    def reset(self) -> None:
+        with self._lock:
+            self.requests = self.failures = self.skus_sent = 0
+
+    def price(self, sku: str) -> dict:
+        price = self._overrides.get(sku)
+        if price is None:
+            price = float(1000 + zlib.crc32(sku.encode('utf-8')) % 200000)
+        return {"price": price, "name": sku}
+
+    def change_prices(self, skus) -> None:
+        """Изменить цены SKU (каждое изменение - новая версия журнала)"""
+        with self._lock:
+            for sku in skus:
+                self.version += 1
+                self._overrides[sku] = self.price(sku)["price"] + 100
+                self._log.append((self.version, sku))
+            del self._log[:-self.retain]
+
+    def changes(self, since, limit: int):
+        """(цены, курсор, has_more) после версии since; None - курсор старше журнала"""
+        with self._lock:
+            if since is None:
+                return {}, self.version, False
+            oldest = self._log[0][0] if self._log else self.version + 1
+            if since < oldest - 1:
+                return None
+            entries = [entry for entry in self._log if entry[0] > since][:limit]
+            cursor = entries[-1][0] if entries else since
+            return {sku: self.price(sku) for _, sku in entries}, cursor, cursor < self.version
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path.rstrip('/') == '/api/prices/changes':
+            self._changes(body)
+            return
+        try:
+            skus = json.loads(body)["skus"]
+        except (ValueError, KeyError):
+            self._reply(400, {"error": "ожидается {\"skus\": [...]}"})
+            return
+
+        server = self.server
+        time.sleep(server.latency + server.per_sku * len(skus))
+        failed = random.random() < server.fail_rate
+        server.count(failed, 0 if failed else len(skus))
+        if failed:
+            self._reply(503, {"error": "сервис перегружен"})
+            return
+        self._reply(200, {"prices": {sku: server.price(sku) for sku in skus}})
+
+    def _changes(self, body: bytes) -> None:
+        try:
+            request = json.loads(body)
+            since = request.get("since")
+            since = None if since is None else int(since)
+            limit = max(1, int(request.get("limit") or 1000))
+        except (ValueError, TypeError, AttributeError):
+            self._reply(400, {"error": "ожидается {\"since\": курсор, \"limit\": N}"})
+            return
+
+        server = self.server
+        time.sleep(server.latency)
+        result = server.changes(since, limit)
+        if result is None:
+            server.count(False)
+            self._reply(410, {"error": "курсор устарел, нужна полная синхронизация"})
+            return
+        prices, cursor, has_more = result
+        server.count(False, len(prices))
+        self._reply(200, {"prices": prices, "cursor": str(cursor), "has_more": has_more})
+
+    def _reply(self, status: int, data: dict) -> None:
+        payload = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        try:
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            # Клиент не дождался ответа (таймаут)
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub(port: int = 0, **options) -> PriceServiceStub:
+    """Запустить заглушку в фоновом потоке (port=0 - свободный порт)"""
+    server = PriceServiceStub(("127.0.0.1", port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8005)
+    parser.add_argument("--latency-ms", type=float, default=50, help="время ответа на запрос")
+    parser.add_argument("--per-sku-ms", type=float, default=0.2, help="дополнительное время на каждый SKU")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="доля ответов 503")
+    parser.add_argument("--retain", type=int, default=100000, help="сколько изменений хранит журнал")
+    args = parser.parse_args()
+
+    server = PriceServiceStub(("0.0.0.0", args.port), latency=args.latency_ms / 1000,
+                              per_sku=args.per_sku_ms / 1000, fail_rate=args.fail_rate, retain=args.retain)
+    print(f"✅ Заглушка сервиса цен: http://0.0.0.0:{args.port}/api/prices")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
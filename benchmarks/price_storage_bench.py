@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Микро-бенчмарк price_storage: стоимость одного get_price
+
+Сравнивает старый путь (json.load всего файла на каждый вызов)
+с индексом в памяти, который перечитывает файл только при изменении.
+
+Запуск:
+    python benchmarks/price_storage_bench.py --skus 2000 --lookups 500
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+# Добавляем путь к проекту для импорта модулей
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import price_storage
+
+
+def make_prices(count: int) -> dict:
+    """Сгенерировать синтетический файл цен"""
+    return {
+        f"SKU{i:06d}": {
+            "price": 10000.0 + i,
+            "old_price": 12000.0 + i,
+            "currency": "RUB",
+            "is_parse": i % 3 != 0
+        }
+        for i in range(count)
+    }
+
+
+def legacy_get_price(sku: str):
+    """Старая реализация get_price: блокировка + разбор всего файла на каждый вызов"""
+    with price_storage._lock:
+        prices = price_storage._load_prices()
+        price_data = prices.get(sku)
+        if price_data:
+            price_data['discount_percentage'] = price_storage._calculate_discount_percentage(
+                price_data.get('old_price', 0.0), price_data.get('price', 0.0)
+            )
+        return price_data
+
+
+def measure(func, skus) -> float:
+    """Среднее время одного вызова в микросекундах"""
+    start = time.perf_counter()
+    for sku in skus:
+        func(sku)
+    return (time.perf_counter() - start) / len(skus) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--skus', type=int, default=2000, help='количество SKU в файле цен')
+    parser.add_argument('--lookups', type=int, default=500, help='количество вызовов get_price')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        price_storage.PRICES_FILE = os.path.join(tmp_dir, 'current_prices.json')
+        with open(price_storage.PRICES_FILE, 'w', encoding='utf-8') as f:
+            json.dump(make_prices(args.skus), f, ensure_ascii=False, indent=2)
+
+        skus = [f"SKU{i * 7 % args.skus:06d}" for i in range(args.lookups)]
+
+        legacy_us = measure(legacy_get_price, skus)
+        price_storage.get_price(skus[0])  # прогрев индекса
+        indexed_us = measure(price_storage.get_price, skus)
+
+    print(f"Файл цен: {args.skus} SKU, вызовов get_price: {args.lookups}")
+    print(f"  до   (json.load на каждый вызов): {legacy_us:10.1f} мкс/вызов")
+    print(f"  после (индекс в памяти):          {indexed_us:10.1f} мкс/вызов")
+    print(f"  ускорение: x{legacy_us / indexed_us:.0f}")
+
+
+if __name__ == "__main__":
+    main()
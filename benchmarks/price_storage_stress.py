@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Проверка записи цен из нескольких процессов (воркеры API + update_prices_from_service.py)
+
+--processes дочерних процессов одновременно вызывают set_price, каждый для своих
+--writes SKU, в режимах json и journal. После завершения в файле цен должны быть
+все записанные SKU (ни одно изменение не потеряно), а версия в файле блокировки -
+равна числу записей.
+
+С --without-file-lock дочерние процессы отключают flock (остается только
+threading.Lock, как раньше) - так видно, сколько изменений терялось при
+нескольких воркерах.
+
+Запуск:
+    python benchmarks/price_storage_stress.py --processes 8 --writes 200
+    python benchmarks/price_storage_stress.py --processes 8 --writes 200 --without-file-lock
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+import price_storage
+
+
+def seed_prices(file_path: str, count: int) -> None:
+    """Создать файл цен из count SKU"""
+    prices = {
+        f"SKU{i:06d}": {"price": 1000.0 + i, "old_price": 1000.0 + i, "currency": "RUB", "is_parse": True}
+        for i in range(count)
+    }
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump(prices, f, ensure_ascii=False, indent=2)
+
+
+CHILD_SCRIPT = """
+import sys, time
+sys.path.insert(0, {project_dir!r})
+import price_storage
+price_storage.PRICES_FILE = {file_path!r}
+price_storage.PRICES_STORAGE_MODE = {mode!r}
+price_storage.PRICES_JOURNAL_COMPACT_EVERY = 50
+if {without_file_lock!r}:
+    price_storage.fcntl = None
+# Все процессы начинают писать одновременно
+time.sleep(max(0.0, {start_at!r} - time.time()))
+for i in range({writes}):
+    assert price_storage.set_price("P{number:02d}-%05d" % i, 100.0 + i)
+"""
+
+
+def stress(tmp_dir: str, mode: str, processes: int, writes: int, skus: int, without_file_lock: bool) -> bool:
+    """Запустить пишущие процессы и проверить, что все записи на месте"""
+    file_path = os.path.join(tmp_dir, f'stress_{mode}.json')
+    seed_prices(file_path, skus)
+
+    start_at = time.time() + 1.0
+    children = [
+        subprocess.Popen([sys.executable, '-c', CHILD_SCRIPT.format(
+            project_dir=PROJECT_DIR, file_path=file_path, mode=mode, writes=writes, number=number,
+            start_at=start_at, without_file_lock=without_file_lock
+        )])
+        for number in range(processes)
+    ]
+    failed = sum(child.wait() != 0 for child in children)
+    elapsed = time.time() - start_at
+
+    price_storage.PRICES_FILE = file_path
+    price_storage.PRICES_STORAGE_MODE = mode
+    price_storage._index.invalidate()
+    prices = price_storage.get_all_prices()
+    expected = {f"P{number:02d}-{i:05d}" for number in range(processes) for i in range(writes)}
+    lost = len(expected - prices.keys())
+    with open(price_storage._get_lock_file_path(), 'r') as f:
+        version = int(f.read() or 0)
+
+    total = processes * writes
+    print(f"  {mode:8s}: {total} записей за {elapsed:6.2f} с ({total / elapsed:7.0f}/с), "
+          f"потеряно {lost}, версия {version}, ошибок процессов {failed}")
+    return lost == 0 and failed == 0 and (without_file_lock or version == total)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=8, help='количество пишущих процессов')
+    parser.add_argument('--writes', type=int, default=200, help='set_price в каждом процессе')
+    parser.add_argument('--skus', type=int, default=2000, help='количество SKU в файле цен до начала')
+    parser.add_argument('--without-file-lock', action='store_true', help='отключить flock в пишущих процессах')
+    args = parser.parse_args()
+
+    label = "без flock" if args.without_file_lock else "с flock"
+    print(f"{args.processes} процессов x {args.writes} set_price, {label}:")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ok = all([stress(tmp_dir, mode, args.processes, args.writes, args.skus, args.without_file_lock)
+                  for mode in ('json', 'journal')])
+    if not args.without_file_lock:
+        print("✅ Изменения не потеряны" if ok else "❌ Изменения потеряны")
+    sys.exit(0 if ok or args.without_file_lock else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк синхронизации цен: полная синхронизация против изменений после курсора
+
+Запускает заглушку сервиса (price_service_stub.py) в этом процессе, заполняет
+хранилище цен --skus SKU с is_parse=True и выполняет
+update_prices_from_service.sync_prices: первая синхронизация - полная,
+затем после изменения --changed цен в сервисе - инкрементальная. Для каждого
+запуска печатается время, число запросов и SKU, переданных сервисом, и число
+обновленных цен.
+
+Запуск:
+    python benchmarks/price_sync_bench.py --skus 20000 --changed 20
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+# Добавляем путь к проекту для импорта модулей
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+WORK_DIR = tempfile.mkdtemp(prefix="yo_store_sync_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(WORK_DIR, 'catalog.db')}"
+os.environ["PRICES_FILE"] = os.path.join(WORK_DIR, "prices.json")
+os.environ["CATALOG_GENERATION_FILE"] = os.path.join(WORK_DIR, "generation")
+os.environ["PRICE_SYNC_STATE_FILE"] = os.path.join(WORK_DIR, "price_sync_state.json")
+# price_updater.log создается в текущем каталоге
+os.chdir(WORK_DIR)
+
+from price_service_stub import start_stub
+from database import create_tables
+import price_storage
+import update_prices_from_service as updater
+
+
+def measure(label: str, stub, full: bool = False) -> None:
+    stub.reset()
+    start = time.perf_counter()
+    stats = updater.sync_prices(full=full) or {}
+    elapsed = time.perf_counter() - start
+    print(f"{label:28s} {elapsed:8.2f} {stub.requests:9d} {stub.skus_sent:8d} {stats.get('updated', 0):10d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--skus", type=int, default=20000)
+    parser.add_argument("--changed", type=int, default=20, help="сколько цен изменить между синхронизациями")
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--per-sku-ms", type=float, default=0.2)
+    args = parser.parse_args()
+
+    stub = start_stub(latency=args.latency_ms / 1000, per_sku=args.per_sku_ms / 1000)
+    updater.PRICE_SERVICE_URL = stub.url
+    updater.PRICE_SERVICE_CHANGES_URL = stub.url + "/changes"
+    updater.logger.setLevel(logging.ERROR)
+
+    create_tables()
+    skus = [f"SKU-{i:07d}" for i in range(args.skus)]
+    price_storage.update_prices({sku: {'price': 0.0, 'currency': 'RUB', 'is_parse': True} for sku in skus})
+
+    print(f"SKU: {args.skus}, изменено цен: {args.changed}")
+    print(f"{'синхронизация':28s} {'время, с':>8s} {'запросов':>9s} {'SKU':>8s} {'обновлено':>10s}")
+    measure("полная (нет курсора)", stub)
+    step = max(1, args.skus // max(1, args.changed))
+    stub.change_prices(skus[::step][:args.changed])
+    measure("инкрементальная", stub)
+    measure("инкрементальная, без изм.", stub)
+    measure("полная (--full)", stub, full=True)
+    stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
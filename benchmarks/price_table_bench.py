@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк массового чтения цен: get_all_prices() против колоночной PriceTable
+
+Для --skus SKU сравнивает:
+- память результата (tracemalloc): словарь словарей get_all_prices() и PriceTable;
+- время получения: get_all_prices() на каждый вызов, первая сборка таблицы
+  после изменения цен и повторный get_price_table() из кэша;
+- обход всех цен со скидкой: по словарям, PriceTable.rows() и numpy по колонкам;
+- список SKU с is_parse=True (как в update_prices_from_service.py).
+
+Запуск:
+    python benchmarks/price_table_bench.py --skus 100000
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Добавляем путь к проекту для импорта модулей
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import price_storage
+
+
+def make_prices(count: int) -> dict:
+    """Синтетический файл цен: у части SKU есть скидка, у части is_parse=False"""
+    return {
+        f"SKU{i:07d}": {
+            "price": 10000.0 + i,
+            "old_price": 12000.0 + i if i % 2 else 10000.0 + i,
+            "currency": "RUB",
+            "is_parse": i % 3 != 0
+        }
+        for i in range(count)
+    }
+
+
+def timed(func, repeat: int = 5) -> float:
+    """Лучшее время вызова в миллисекундах"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def allocated(func) -> float:
+    """Память, занятая результатом func, в МБ"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = func()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del result
+    return size / 1024 / 1024
+
+
+def fresh_table():
+    """Сборка таблицы, как после изменения цен"""
+    price_storage._index._table = None
+    return price_storage.get_price_table()
+
+
+def discount_total_dicts() -> float:
+    return sum(data['discount_percentage'] for data in price_storage.get_all_prices().values())
+
+
+def discount_total_rows() -> float:
+    return sum(row[5] for row in price_storage.get_price_table().rows())
+
+
+def discount_total_numpy() -> float:
+    return float(price_storage.get_price_table().discount.sum())
+
+
+def legacy_parse_flag() -> list:
+    """Прежний get_prices_by_parse_flag: проход по словарю снимка"""
+    prices = price_storage._index.snapshot()
+    return [sku for sku, data in prices.items() if data.get('is_parse', True)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--skus', type=int, default=100000, help='количество SKU в файле цен')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        price_storage.PRICES_FILE = os.path.join(tmp_dir, 'current_prices.json')
+        with open(price_storage.PRICES_FILE, 'w', encoding='utf-8') as f:
+            json.dump(make_prices(args.skus), f, ensure_ascii=False)
+        price_storage._index.invalidate()
+        price_storage.get_prices_snapshot()  # загрузка файла в индекс
+
+        # Результаты должны совпадать
+        assert abs(discount_total_dicts() - discount_total_numpy()) < 1e-6 * args.skus
+        assert abs(discount_total_rows() - discount_total_numpy()) < 1e-6 * args.skus
+        assert legacy_parse_flag() == price_storage.get_prices_by_parse_flag(True)
+
+        print(f"Файл цен: {args.skus} SKU")
+        print("Память результата:")
+        print(f"  get_all_prices() (словарь словарей)   {allocated(price_storage.get_all_prices):8.1f} МБ")
+        print(f"  PriceTable (колонки + индекс SKU)     {allocated(fresh_table):8.1f} МБ")
+        print("Получение всех цен:")
+        print(f"  get_all_prices()                       {timed(price_storage.get_all_prices):8.1f} мс")
+        print(f"  PriceTable: сборка после изменения     {timed(fresh_table):8.1f} мс")
+        print(f"  get_price_table() из кэша              {timed(price_storage.get_price_table) * 1000:8.1f} мкс")
+        print("Сумма скидок по всем SKU:")
+        print(f"  get_all_prices() + словари             {timed(discount_total_dicts):8.1f} мс")
+        print(f"  PriceTable.rows()                      {timed(discount_total_rows):8.1f} мс")
+        print(f"  PriceTable.discount (numpy)            {timed(discount_total_numpy) * 1000:8.1f} мкс")
+        print("SKU с is_parse=True:")
+        print(f"  проход по словарю снимка               {timed(legacy_parse_flag):8.1f} мс")
+        print(f"  PriceTable.skus_with_parse_flag()      "
+              f"{timed(price_storage.get_prices_by_parse_flag):8.1f} мс")
+
+
+if __name__ == "__main__":
+    main()
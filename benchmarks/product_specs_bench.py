@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк разбора specifications у Product на модели с большим числом вариантов
+
+Создает во временной базе одну модель с N вариантами и сравнивает:
+- прежний способ: json.loads(specifications) на каждое обращение к полю;
+- кэш Product.specs: один разбор на экземпляр;
+- время /products/{model}/variants целиком.
+
+Запуск:
+    python benchmarks/product_specs_bench.py --variants 1000
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+# Добавляем путь к проекту для импорта модулей
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+WORK_DIR = tempfile.mkdtemp(prefix="yo_store_specs_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(WORK_DIR, 'catalog.db')}"
+os.environ["PRICES_FILE"] = os.path.join(WORK_DIR, "prices.json")
+os.environ["SEARCH_INDEX_FILE"] = os.path.join(WORK_DIR, "search.db")
+os.environ["CATALOG_GENERATION_FILE"] = os.path.join(WORK_DIR, "generation")
+
+from database import SessionLocal, create_tables
+from models import Product
+import price_storage
+
+MODEL = "Bench Phone"
+COLORS = ["Black", "White", "Blue", "Red", "Green"]
+DISKS = ["128GB", "256GB", "512GB", "1TB"]
+SIMS = ["SIM + eSIM", "eSIM", "2 SIM"]
+
+# Поля варианта, которые читает /products/{model}/variants на один товар
+VARIANT_FIELDS = ("color", "disk", "sim_config", "ram", "images")
+
+
+def seed(variants: int):
+    create_tables()
+    db = SessionLocal()
+    prices = {}
+    try:
+        for i in range(variants):
+            sku = f"BENCH-{i:05d}"
+            specs = {
+                "color": COLORS[i % len(COLORS)],
+                "disk": DISKS[i // len(COLORS) % len(DISKS)],
+                "sim_config": SIMS[i % len(SIMS)],
+                "ram": "8GB",
+                "screen": "6.1", "cpu": "A18", "weight": "170 g",
+            }
+            db.add(Product(sku=sku, name=f"{MODEL} {i}", brand="Bench", level_0="Смартфоны",
+                           level_1="Bench", level_2=MODEL, specifications=json.dumps(specs)))
+            prices[sku] = {"price": 1000.0 + i, "old_price": 1100.0 + i, "currency": "RUB"}
+        db.commit()
+    finally:
+        db.close()
+    price_storage.update_prices(prices)
+
+
+def legacy_field(product: Product, field: str):
+    """Прежнее поведение свойства: разбор JSON на каждое обращение"""
+    try:
+        return json.loads(product.specifications).get(field, '')
+    except (json.JSONDecodeError, TypeError):
+        return ''
+
+
+def timed(label: str, func, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:42s} {best * 1000:8.2f} мс")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--variants", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    seed(args.variants)
+    db = SessionLocal()
+    try:
+        products = db.query(Product).filter(Product.level_2 == MODEL).all()
+        print(f"Модель {MODEL!r}: {len(products)} вариантов")
+
+        def legacy():
+            for product in products:
+                for field in VARIANT_FIELDS:
+                    legacy_field(product, field)
+                # get_model_variants разбирал specifications еще раз
+                json.loads(product.specifications)
+
+        def cached():
+            for product in products:
+                product.color, product.disk, product.sim_config, product.ram, product.spec_images
+                product.specs
+
+        def cold_cached():
+            for product in products:
+                product.__dict__.pop('_specs_cache', None)
+            cached()
+
+        legacy_time = timed("json.loads на каждое поле", legacy, args.repeat)
+        cold_time = timed("Product.specs, первый разбор", cold_cached, args.repeat)
+        warm_time = timed("Product.specs, из кэша экземпляра", cached, args.repeat)
+        print(f"Ускорение: x{legacy_time / cold_time:.1f} (первый разбор), x{legacy_time / warm_time:.1f} (кэш)")
+    finally:
+        db.close()
+
+    from fastapi.testclient import TestClient
+    import api
+
+    client = TestClient(api.app)
+    url = f"/products/{MODEL}/variants"
+    response = client.get(url)
+    assert response.status_code == 200 and response.json()["total_variants"] == args.variants
+
+    # Новое поколение каталога сбрасывает кэш ответов, чтобы мерить сам endpoint
+    import catalog_generation
+    timed(f"GET {url}", lambda: (catalog_generation.bump(), client.get(url)), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк поиска: полнотекстовый индекс (FTS5) против ILIKE '%q%'
+
+Заполняет временную базу синтетическим каталогом (по умолчанию 50 000 SKU),
+строит поисковый индекс и сравнивает задержку поиска моделей по набору запросов,
+включая русские написания и опечатки.
+
+Запуск:
+    python benchmarks/search_bench.py --skus 50000 --repeat 20
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# Добавляем путь к проекту для импорта модулей
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+WORK_DIR = tempfile.mkdtemp(prefix="yo_store_search_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(WORK_DIR, 'catalog.db')}"
+os.environ["SEARCH_INDEX_FILE"] = os.path.join(WORK_DIR, "search.db")
+os.environ["CATALOG_GENERATION_FILE"] = os.path.join(WORK_DIR, "generation")
+
+from sqlalchemy import func
+
+from database import engine, SessionLocal, create_tables
+from models import Product, Level2Description
+from search_index import search_index
+
+BRANDS = {
+    "Apple": ["iPhone {n}", "iPhone {n} Pro", "iPhone {n} Pro Max", "MacBook Air {n}", "iPad Pro {n}", "Watch Series {n}"],
+    "Samsung": ["Galaxy S{n}", "Galaxy S{n} Ultra", "Galaxy Z Fold {n}", "Galaxy Tab S{n}"],
+    "Xiaomi": ["Redmi Note {n}", "Xiaomi {n} Pro", "Poco X{n}"],
+    "Sony": ["PlayStation {n}", "WH-1000XM{n}"],
+    "Yandex": ["Станция Мини {n}", "Станция Макс {n}"],
+    "Dyson": ["Airwrap {n}", "V{n} Absolute"],
+}
+COLORS = ["Black", "White", "Blue", "Titanium Desert", "Natural", "Pink", "Green"]
+DISKS = ["64GB", "128GB", "256GB", "512GB", "1TB"]
+SIMS = ["eSIM", "nano-SIM + eSIM", "Dual SIM"]
+
+QUERIES = [
+    "iphone 15 pro",
+    "айфон 15 про",
+    "iphone15pro",
+    "iphnoe 15",
+    "galaxy ultra",
+    "самсунг",
+    "256gb black",
+    "станция",
+    "macbook air",
+    "dyson airwrap",
+    "pro",
+]
+
+
+def seed_catalog(skus: int) -> None:
+    """Создать синтетический каталог из skus товаров и описаний моделей"""
+    create_tables()
+    models = [(brand, template) for brand, templates in BRANDS.items() for template in templates]
+    products = []
+    levels = {}
+    for i in range(skus):
+        brand, template = models[i % len(models)]
+        generation = 10 + (i // len(models)) % 60
+        level_2 = template.format(n=generation)
+        color = COLORS[i % len(COLORS)]
+        disk = DISKS[(i // 7) % len(DISKS)]
+        products.append({
+            "sku": f"SKU{i:06d}",
+            "name": f"{level_2} {disk} {color}",
+            "brand": brand,
+            "level_0": "Смартфоны" if "Phone" in template or "Galaxy S" in template else "Электроника",
+            "level_1": template.split(" ")[0],
+            "level_2": level_2,
+            "specifications": json.dumps({"color": color, "disk": disk, "sim_config": SIMS[i % len(SIMS)]}),
+            "stock": 1,
+            "is_available": True,
+        })
+        levels[level_2] = {
+            "level_2": level_2,
+            "description": f"{level_2} - флагманский процессор, отличный экран и камера",
+            "details": json.dumps({"Экран": "6.1", "Процессор": "A17 Pro", "Память": disk}, ensure_ascii=False),
+        }
+    with engine.begin() as conn:
+        conn.execute(Product.__table__.insert(), products)
+        conn.execute(Level2Description.__table__.insert(), list(levels.values()))
+
+
+def like_search(db, q: str):
+    """Прежний поиск: ILIKE по name/brand/level_2 и представители моделей"""
+    term = f"%{q}%"
+    subquery = db.query(func.min(Product.id).label("id")).filter(
+        Product.is_available == True,
+        Product.name.ilike(term) | Product.brand.ilike(term) | Product.level_2.ilike(term)
+    ).group_by(Product.level_2, Product.brand).subquery()
+    return db.query(Product.id).filter(Product.id == subquery.c.id).order_by(
+        Product.level_2.desc(), Product.id
+    ).limit(20).all()
+
+
+def measure(func_, repeat: int):
+    """Медиана и p95 времени вызова, мс"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func_()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1], result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--skus", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    seed_catalog(args.skus)
+    print(f"Каталог: {args.skus} SKU за {time.perf_counter() - start:.1f} с")
+
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        search_index.ensure(db)
+        print(f"Индекс построен за {time.perf_counter() - start:.1f} с\n")
+
+        print(f"{'запрос':20s} {'FTS p50':>9s} {'FTS p95':>9s} {'моделей':>8s}   {'ILIKE p50':>9s} {'моделей':>8s}")
+        for q in QUERIES:
+            fts_p50, fts_p95, ranked = measure(lambda: search_index.search(q), args.repeat)
+            like_p50, _, rows = measure(lambda: like_search(db, q), max(3, args.repeat // 4))
+            print(f"{q:20s} {fts_p50:7.2f}ms {fts_p95:7.2f}ms {len(ranked or []):8d}   {like_p50:7.2f}ms {len(rows):8d}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк подсказок поиска: построение префиксного дерева и время ответа
+
+Строит SuggestTrie из синтетических моделей, брендов и популярных запросов
+и измеряет время complete() для префиксов разной длины.
+
+Запуск:
+    python benchmarks/suggest_bench.py --models 20000 --lookups 20000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+# Добавляем путь к проекту для импорта модулей
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from suggest import SuggestTrie
+
+BRANDS = {
+    "Apple": ["iPhone {n}", "iPhone {n} Pro", "iPhone {n} Pro Max", "MacBook Air {n}", "iPad Pro {n}"],
+    "Samsung": ["Galaxy S{n}", "Galaxy S{n} Ultra", "Galaxy Z Fold {n}"],
+    "Xiaomi": ["Redmi Note {n}", "Xiaomi {n} Pro"],
+    "Yandex": ["Яндекс Станция {n}", "Яндекс Станция Мини {n}"],
+}
+
+PREFIXES = ["i", "ip", "iphone 1", "iphone 15 p", "айфон 15", "gal", "galaxy s2", "яндекс ст", "pro m", "xyz"]
+
+
+def make_entries(models: int):
+    """Синтетические подсказки: модели, бренды и популярные запросы"""
+    templates = [(brand, template) for brand, items in BRANDS.items() for template in items]
+    entries = []
+    for i in range(models):
+        brand, template = templates[i % len(templates)]
+        name = template.format(n=i // len(templates))
+        entries.append({"type": "model", "text": name, "model": name, "brand": brand,
+                        "price": 1000.0 + i, "image": f"/static/{i}.jpg", "weight": 0})
+    for brand in BRANDS:
+        entries.append({"type": "brand", "text": brand, "brand": brand, "weight": 0})
+    for i in range(40):
+        entries.append({"type": "query", "text": f"iphone {i} pro", "weight": 3 + i})
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", type=int, default=20000)
+    parser.add_argument("--lookups", type=int, default=20000)
+    args = parser.parse_args()
+
+    entries = make_entries(args.models)
+    start = time.perf_counter()
+    trie = SuggestTrie(entries)
+    print(f"Дерево из {len(entries)} подсказок построено за {time.perf_counter() - start:.2f} с")
+
+    prefixes = [random.choice(PREFIXES) for _ in range(args.lookups)]
+    start = time.perf_counter()
+    for prefix in prefixes:
+        trie.complete(prefix, 8)
+    elapsed = time.perf_counter() - start
+    print(f"complete(): {elapsed / args.lookups * 1e6:.1f} мкс на запрос ({args.lookups} запросов)")
+
+    for prefix in PREFIXES[:5]:
+        print(f"  {prefix!r:14s} -> {[item['text'] for item in trie.complete(prefix, 4)]}")
+
+
+if __name__ == "__main__":
+    main()
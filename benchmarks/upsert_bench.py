@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк update-or-create импорта (excel_import.upsert_products)
+
+Во временную базу добавляются --seed товаров, затем строится фид из --rows строк:
+половина - существующие SKU с новой ценой и остатком, половина - новые товары.
+Измеряются:
+  - dry-run (предпросмотр без записи);
+  - применение фида;
+  - повторный запуск того же фида (все строки без изменений).
+Для каждого этапа печатается скорость (строк/с) и число SQL запросов на пачку.
+
+Запуск:
+    python benchmarks/upsert_bench.py --rows 10000
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+# Добавляем путь к проекту для импорта модулей
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+WORK_DIR = tempfile.mkdtemp(prefix="yo_store_upsert_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(WORK_DIR, 'catalog.db')}"
+os.environ["PRICES_FILE"] = os.path.join(WORK_DIR, "prices.json")
+os.environ["SEARCH_INDEX_FILE"] = os.path.join(WORK_DIR, "search.db")
+os.environ["CATALOG_GENERATION_FILE"] = os.path.join(WORK_DIR, "generation")
+
+from openpyxl import Workbook
+from sqlalchemy import event
+
+from database import SessionLocal, create_tables, engine
+from models import Product
+import excel_import
+import price_storage
+
+PRODUCT_HEADERS = [
+    'SKU товара', 'Название товара*', 'Описание', 'Основная категория (level0)*', 'Подкатегория (level1)*',
+    'Детальная категория (level2)*', 'Бренд', 'Цена*', 'Валюта', 'Количество на складе',
+    'URL изображения (через запятую)', 'Характеристики (JSON)'
+]
+COLORS = ["Black", "White", "Blue", "Red", "Green", "Silver", "Gold"]
+
+
+def _row(i: int, price: int, stock: int) -> list:
+    series, model = i % 10, i % 250
+    color = COLORS[i % len(COLORS)]
+    level_2 = f"Phone {series}.{model}"
+    return [
+        f"SKU-{i:07d}", f"{level_2} {color}", "", "Смартфоны", f"{series} Series", level_2,
+        "Brand", price, "RUB", stock, "", json.dumps({"color": color})
+    ]
+
+
+def seed(count: int) -> None:
+    """Существующие товары и их цены"""
+    db = SessionLocal()
+    try:
+        for start in range(0, count, 1000):
+            for i in range(start, min(start + 1000, count)):
+                sku, name, _, level_0, level_1, level_2, brand, price, _, stock, _, specs = _row(i, 10000 + i, 5)
+                db.add(Product(sku=sku, name=name, level_0=level_0, level_1=level_1, level_2=level_2,
+                               brand=brand, stock=stock, specifications=specs, is_available=True))
+            db.commit()
+    finally:
+        db.close()
+    price_storage.update_prices({
+        f"SKU-{i:07d}": {'price': float(10000 + i), 'old_price': float(10000 + i), 'currency': 'RUB', 'is_parse': True}
+        for i in range(count)
+    })
+
+
+def build_feed(rows: int, seeded: int) -> bytes:
+    """Половина строк - изменения существующих товаров, половина - новые товары"""
+    wb = Workbook(write_only=True)
+    sheet = wb.create_sheet("Товары")
+    sheet.append(PRODUCT_HEADERS)
+    updates = min(rows // 2, seeded)
+    for i in range(updates):
+        sheet.append(_row(i, 20000 + i, 7))
+    for i in range(seeded, seeded + rows - updates):
+        sheet.append(_row(i, 20000 + i, 3))
+    output = io.BytesIO()
+    wb.save(output)
+    return output.getvalue()
+
+
+class StatementCounter:
+    """Число SQL запросов к базе каталога"""
+
+    def __init__(self):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+def run(label: str, feed: bytes, rows: int, chunk_size: int, dry_run: bool, counter: StatementCounter) -> dict:
+    db = SessionLocal()
+    try:
+        counter.count = 0
+        start = time.perf_counter()
+        result = excel_import.upsert_products(db, feed, chunk_size, dry_run=dry_run)
+        elapsed = time.perf_counter() - start
+    finally:
+        db.close()
+    chunks = max(1, -(-rows // chunk_size))
+    print(f"{label:32s} {elapsed:7.2f} с  {rows / elapsed:9.0f} строк/с  "
+          f"SQL запросов на пачку: {counter.count / chunks:6.1f}   "
+          f"добавлено {result['added']}, обновлено {result['updated']}, "
+          f"без изменений {result['unchanged']}, ошибок {len(result['errors'])}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=10000, help="товаров в базе до импорта")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    create_tables()
+    seed(args.seed)
+    feed = build_feed(args.rows, args.seed)
+    counter = StatementCounter()
+
+    run("dry-run", feed, args.rows, args.chunk_size, True, counter)
+    run("применение", feed, args.rows, args.chunk_size, False, counter)
+    run("повтор (без изменений)", feed, args.rows, args.chunk_size, False, counter)
+
+
+if __name__ == "__main__":
+    main()
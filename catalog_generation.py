@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Поколение каталога - счетчик изменений каталога и цен, общий для всех процессов
+
+Счетчик хранится в файле CATALOG_GENERATION_FILE и увеличивается после каждого
+commit, затронувшего таблицы каталога, и после каждого изменения цен через
+price_storage (API, импорт Excel, update_prices_from_service.py).
+Кэш ответов API сравнивает поколение и считает записи прежних поколений устаревшими.
+
+Обработчики регистрируются при импорте модуля (его импортирует database.py).
+"""
+
+import os
+import threading
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from config import Config
+from change_tracking import flushed_objects
+from models import Product, ProductImage, Level2Description, Category, SkuVariant, ModelCard, Price
+import price_storage
+
+try:
+    import fcntl
+except ImportError:  # Windows: только блокировка внутри процесса
+    fcntl = None
+
+# Таблицы, изменение которых меняет ответы каталога
+CATALOG_MODELS = (Product, ProductImage, Level2Description, Category, SkuVariant, ModelCard, Price)
+
+_lock = threading.Lock()
+
+# Подписчики на увеличение поколения в этом процессе: callback(generation)
+_bump_listeners = []
+
+
+def _get_generation_file_path() -> str:
+    """Получить полный путь к файлу поколения каталога"""
+    if os.path.isabs(Config.CATALOG_GENERATION_FILE):
+        return Config.CATALOG_GENERATION_FILE
+    # Относительный путь от директории проекта
+    project_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(project_dir, Config.CATALOG_GENERATION_FILE)
+
+
+def current() -> Optional[int]:
+    """Текущее поколение каталога; None - если файл недоступен (кэшировать нельзя)"""
+    try:
+        fd = os.open(_get_generation_file_path(), os.O_RDONLY)
+    except FileNotFoundError:
+        return 0
+    except OSError:
+        return None
+    try:
+        if fcntl:
+            fcntl.flock(fd, fcntl.LOCK_SH)
+        data = os.read(fd, 32)
+        return int(data) if data else 0
+    except (OSError, ValueError):
+        return None
+    finally:
+        os.close(fd)
+
+
+def add_bump_listener(callback) -> None:
+    """
+    Подписаться на увеличение поколения этим процессом
+    Подписчики вызываются по порядку поколений; если между двумя вызовами
+    номер вырос больше чем на 1, каталог менял другой процесс
+    """
+    _bump_listeners.append(callback)
+
+
+def bump() -> Optional[int]:
+    """Увеличить поколение каталога; возвращает новое значение"""
+    with _lock:
+        value = _write_next_generation()
+        if value is not None:
+            for callback in _bump_listeners:
+                try:
+                    callback(value)
+                except Exception as e:
+                    print(f"⚠️ Ошибка подписчика поколения каталога: {e}")
+        return value
+
+
+def _write_next_generation() -> Optional[int]:
+    """Прочитать, увеличить и записать счетчик под блокировкой файла"""
+    try:
+        fd = os.open(_get_generation_file_path(), os.O_RDWR | os.O_CREAT, 0o644)
+    except OSError as e:
+        print(f"⚠️ Не удалось обновить поколение каталога: {e}")
+        return None
+    try:
+        if fcntl:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        data = os.read(fd, 32)
+        try:
+            value = int(data) + 1 if data else 1
+        except ValueError:
+            value = 1
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.ftruncate(fd, 0)
+        os.write(fd, str(value).encode('ascii'))
+        return value
+    except OSError as e:
+        print(f"⚠️ Не удалось обновить поколение каталога: {e}")
+        return None
+    finally:
+        # Закрытие дескриптора снимает flock
+        os.close(fd)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_catalog_write(session, flush_context):
+    """Запомнить, что транзакция изменила таблицы каталога"""
+    # Присваивание прежних значений (например, пересборка карточек без изменений)
+    # поколение не увеличивает - иначе процессы пересобирали бы карточки друг за другом
+    for obj in flushed_objects(session, flush_context):
+        if isinstance(obj, CATALOG_MODELS) and (obj not in session.dirty or session.is_modified(obj)):
+            session.info['catalog_changed'] = True
+            return
+
+
+def mark_changed(session: Session) -> None:
+    """Таблицы каталога изменены в обход ORM (core INSERT) - поколение увеличится после commit"""
+    session.info['catalog_changed'] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_after_commit(session):
+    if session.info.pop('catalog_changed', False):
+        bump()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_catalog_write(session):
+    session.info.pop('catalog_changed', None)
+
+
+def _on_prices_changed(skus) -> None:
+    """Подписчик price_storage: цены входят в ответы каталога"""
+    bump()
+
+
+price_storage.add_change_listener(_on_prices_changed)
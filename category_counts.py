@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Категории каталога с числом товаров (/categories)
+
+Список строится одним запросом: категории, сгруппированные по level_0,
+с LEFT JOIN на число товаров каждой категории. ID категории - минимальный
+categories.id группы, поэтому он одинаков во всех процессах.
+
+Результат хранится в памяти процесса вместе с поколением каталога
+(catalog_generation). Изменения товаров в этом процессе меняют число товаров
+на месте (+1/-1 по level_0), изменения таблицы categories и изменения
+из других процессов приводят к повторному запросу.
+"""
+
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
+
+from models import Product, Category
+import catalog_generation
+from change_tracking import before_generation_bump, flushed_objects, history_values, track_previous_values
+
+
+def load_categories(db: Session) -> List[Dict]:
+    """Категории level_0 с описанием, иконкой и числом товаров - один запрос"""
+    product_counts = db.query(
+        Product.level_0.label('level_0'),
+        func.count(Product.id).label('product_count')
+    ).group_by(Product.level_0).subquery()
+
+    rows = db.query(
+        Category.level_0,
+        func.min(Category.id),
+        func.max(Category.description),
+        func.max(Category.icon),
+        func.coalesce(func.max(product_counts.c.product_count), 0)
+    ).outerjoin(
+        product_counts, product_counts.c.level_0 == Category.level_0
+    ).filter(
+        Category.level_0.isnot(None)
+    ).group_by(Category.level_0).order_by(Category.level_0).all()
+
+    return [
+        {
+            "id": category_id,
+            "name": level_0,
+            "description": description or f"Категория {level_0}",
+            "icon": icon or "📦",
+            "product_count": product_count,
+            "level_0": level_0,
+        }
+        for level_0, category_id, description, icon, product_count in rows
+    ]
+
+
+class CategoryCounts:
+    """Список категорий процесса и его поколение каталога"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._categories: Optional[List[Dict]] = None
+        self._generation = None
+
+    def categories(self, db: Session) -> List[Dict]:
+        """Категории, отсортированные по числу товаров (по убыванию)"""
+        generation = catalog_generation.current()
+        with self._lock:
+            if self._categories is not None and generation is not None and generation == self._generation:
+                categories = self._categories
+            else:
+                categories = None
+        if categories is None:
+            categories = load_categories(db)
+            with self._lock:
+                self._categories = categories
+                self._generation = generation
+        result = [dict(category) for category in categories]
+        result.sort(key=lambda category: category["product_count"], reverse=True)
+        return result
+
+    def apply_changes(self, deltas: Counter, categories_changed: bool) -> None:
+        """Учесть закоммиченные изменения этого процесса"""
+        with self._lock:
+            if self._categories is None:
+                return
+            if categories_changed:
+                self._categories = None
+                return
+            for category in self._categories:
+                category["product_count"] += deltas.get(category["level_0"], 0)
+
+    def invalidate(self) -> None:
+        """Сбросить список: следующий categories() прочитает его из базы"""
+        with self._lock:
+            self._categories = None
+
+    def on_generation(self, generation: int) -> None:
+        """Подписчик catalog_generation: этот процесс увеличил поколение"""
+        with self._lock:
+            if self._generation is not None and generation == self._generation + 1:
+                self._generation = generation
+
+
+category_counts = CategoryCounts()
+catalog_generation.add_bump_listener(category_counts.on_generation)
+
+# Прежний level_0 - чтобы уменьшить число товаров категории, из которой ушел товар
+track_previous_values(Product.level_0)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_count_changes(session, flush_context):
+    """Изменения числа товаров по level_0 в этой транзакции"""
+    if not any(isinstance(obj, (Product, Category)) for obj in flushed_objects(session, flush_context)):
+        return
+    deltas = session.info.setdefault('category_count_deltas', Counter())
+    for obj in session.new:
+        if isinstance(obj, Product):
+            deltas[obj.level_0] += 1
+        elif isinstance(obj, Category):
+            session.info['categories_changed'] = True
+    for obj in session.deleted:
+        if isinstance(obj, Product):
+            for level_0 in history_values(obj, 'level_0'):
+                deltas[level_0] -= 1
+        elif isinstance(obj, Category):
+            session.info['categories_changed'] = True
+    for obj in session.dirty:
+        if isinstance(obj, Product):
+            # Товар перенесли в другую категорию
+            history = inspect(obj).attrs.level_0.history
+            for level_0 in history.deleted:
+                deltas[level_0] -= 1
+            for level_0 in history.added:
+                deltas[level_0] += 1
+        elif isinstance(obj, Category):
+            session.info['categories_changed'] = True
+
+
+def mark_products_added(session: Session, level_0_values: Iterable[str]) -> None:
+    """Учесть товары, добавленные в обход ORM (core INSERT): по одному на каждый level_0"""
+    session.info.setdefault('category_count_deltas', Counter()).update(level_0_values)
+
+
+def mark_categories_changed(session: Session) -> None:
+    """Таблица categories изменена в обход ORM - список перечитается после commit"""
+    session.info['categories_changed'] = True
+
+
+@before_generation_bump
+def _apply_after_commit(session):
+    deltas = session.info.pop('category_count_deltas', Counter())
+    categories_changed = session.info.pop('categories_changed', False)
+    if categories_changed or any(deltas.values()):
+        try:
+            category_counts.apply_changes(deltas, categories_changed)
+        except Exception:
+            # Список перечитается из базы при следующем запросе
+            category_counts.invalidate()
+            raise
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_count_changes(session):
+    session.info.pop('category_count_deltas', None)
+    session.info.pop('categories_changed', None)
@@ -11,13 +11,42 @@ class Config:
     # Database Configuration
     DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///./electronics_store.db')
     
+    # Price Storage Configuration
+    # json - цены в файле current_prices.json, db - в таблице prices
+    PRICES_BACKEND = os.getenv('PRICES_BACKEND', 'json').lower()
+    
+    # Search Configuration
+    # Файл SQLite с полнотекстовым индексом (FTS5) для /search
+    SEARCH_INDEX_FILE = os.getenv('SEARCH_INDEX_FILE', 'search_index.db')
+    
+    # Response Cache Configuration
+    # Файл со счетчиком поколения каталога, общий для всех процессов
+    CATALOG_GENERATION_FILE = os.getenv('CATALOG_GENERATION_FILE', 'catalog_generation')
+    # Максимальный объем кэша ответов API в памяти процесса
+    RESPONSE_CACHE_MAX_MB = int(os.getenv('RESPONSE_CACHE_MAX_MB', 64))
+    
+    # Excel Import Configuration
+    # Число строк Excel в одной транзакции потокового импорта
+    EXCEL_IMPORT_CHUNK_SIZE = int(os.getenv('EXCEL_IMPORT_CHUNK_SIZE', 1000))
+    # Каталог загруженных файлов фоновых задач импорта и число потоков-исполнителей
+    IMPORT_JOBS_DIR = os.getenv('IMPORT_JOBS_DIR', 'import_jobs')
+    IMPORT_JOB_WORKERS = int(os.getenv('IMPORT_JOB_WORKERS', 1))
+    # Сколько дней хранить завершенные задачи импорта
+    IMPORT_JOBS_KEEP_DAYS = int(os.getenv('IMPORT_JOBS_KEEP_DAYS', 30))
+    
     # App Configuration
     SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-change-this')
     DEBUG = os.getenv('DEBUG', 'True').lower() == 'true'
     HOST = os.getenv('HOST', '0.0.0.0')
     PORT = int(os.getenv('PORT', 8000))
     
-    # Price Update Configuration - REMOVED
-    # Automatic price updates removed - now only manual via Excel API
-    # PRICE_UPDATE_INTERVAL = 10  # minutes
+    # Price Update Configuration
+    # Синхронизация цен с сервисом внутри процесса API (вместо price_updater_scheduler.py / systemd timer)
+    PRICE_SYNC_IN_PROCESS = os.getenv('PRICE_SYNC_IN_PROCESS', 'false').lower() == 'true'
+    # Пауза между синхронизациями и случайная добавка к ней (секунды)
+    PRICE_SYNC_INTERVAL_SECONDS = int(os.getenv('PRICE_SYNC_INTERVAL_SECONDS', 60))
+    PRICE_SYNC_JITTER_SECONDS = float(os.getenv('PRICE_SYNC_JITTER_SECONDS', 10))
+    # Блокировка "одна синхронизация на все процессы" и итоги последнего запуска
+    PRICE_SYNC_LOCK_FILE = os.getenv('PRICE_SYNC_LOCK_FILE', 'price_sync.lock')
+    PRICE_SYNC_STATUS_FILE = os.getenv('PRICE_SYNC_STATUS_FILE', 'price_sync_status.json')
 
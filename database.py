@@ -1,6 +1,8 @@
-from sqlalchemy import create_engine
+import warnings
+from sqlalchemy import create_engine, inspect, select, text, update, bindparam, Column
 from sqlalchemy.orm import sessionmaker
-from models import Base
+from sqlalchemy.schema import CreateIndex
+from models import Base, Product, VARIANT_FIELDS, parse_specifications, variant_values
 from config import Config
 
 # Create database engine
@@ -13,6 +15,99 @@ def create_tables():
     """Create all tables in the database"""
     Base.metadata.create_all(bind=engine)
 
+# Сколько товаров заполняется за один UPDATE при переносе атрибутов варианта
+VARIANT_BACKFILL_BATCH = 1000
+
+def ensure_variant_columns(backfill_all: bool = False) -> int:
+    """
+    Добавить в products колонки атрибутов варианта (color, disk, ram, sim_config)
+    с индексами и заполнить их из specifications
+    Заполнение выполняется для только что добавленных колонок или при backfill_all.
+    Возвращает число заполненных товаров
+    """
+    if not inspect(engine).has_table(Product.__tablename__):
+        create_tables()
+        return 0
+    
+    table = Product.__table__
+    existing = {column['name'] for column in inspect(engine).get_columns(table.name)}
+    missing = [column for column in table.columns if column.name in VARIANT_FIELDS and column.name not in existing]
+    
+    with engine.begin() as conn:
+        for column in missing:
+            conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}'))
+        for index in table.indexes:
+            if any(column.name in VARIANT_FIELDS for column in index.columns):
+                index.create(bind=conn, checkfirst=True)
+    
+    if not missing and not backfill_all:
+        return 0
+    
+    # Заполняем батчами по id, чтобы не держать весь каталог в памяти
+    statement = update(table).where(table.c.id == bindparam('product_id')).values(
+        {field: bindparam(f'new_{field}') for field in VARIANT_FIELDS}
+    )
+    filled = 0
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(table.c.id, table.c.specifications)
+                .where(table.c.id > last_id)
+                .order_by(table.c.id)
+                .limit(VARIANT_BACKFILL_BATCH)
+            ).all()
+            if not rows:
+                break
+            params = []
+            for row in rows:
+                values = variant_values(parse_specifications(row.specifications))
+                params.append({'product_id': row.id, **{f'new_{field}': value for field, value in values.items()}})
+            conn.execute(statement, params)
+        filled += len(rows)
+        last_id = rows[-1].id
+    return filled
+
+def _existing_indexes(conn, inspector, table_name: str):
+    """Имена и наборы колонок индексов таблицы в базе"""
+    with warnings.catch_warnings():
+        # SQLAlchemy не отражает индексы по выражениям (lower(...)) - имена берем из sqlite_master
+        warnings.simplefilter('ignore')
+        reflected = inspector.get_indexes(table_name)
+    names = {index['name'] for index in reflected}
+    columns = {tuple(index['column_names']) for index in reflected if None not in index['column_names']}
+    columns.add(tuple(inspector.get_pk_constraint(table_name)['constrained_columns']))
+    if engine.dialect.name == 'sqlite':
+        names.update(row[0] for row in conn.execute(
+            text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table"),
+            {'table': table_name}
+        ))
+    return names, columns
+
+def ensure_indexes() -> list:
+    """
+    Создать индексы из models.py, которых нет в существующей базе
+    Индекс не создается, если в базе уже есть индекс по тем же колонкам
+    (в том числе созданный вручную под другим именем).
+    Возвращает имена созданных индексов
+    """
+    created = []
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            names, columns = _existing_indexes(conn, inspector, table.name)
+            for index in table.indexes:
+                if index.name in names:
+                    continue
+                plain = all(isinstance(expression, Column) for expression in index.expressions)
+                if plain and tuple(column.name for column in index.columns) in columns:
+                    continue
+                conn.execute(CreateIndex(index, if_not_exists=True))
+                created.append(index.name)
+    return created
+
 def get_db():
     """Dependency to get database session"""
     db = SessionLocal()
@@ -141,3 +236,8 @@ def init_database():
     finally:
         db.close()
 
+
+# Счетчик поколения каталога: сбрасывает кэш ответов API после любых изменений.
+# Импорт нужен ради побочного эффекта - обработчики событий сессии подключаются
+# при импорте модуля, поэтому поколение растет в любом процессе, открывающем базу
+import catalog_generation  # noqa: F401,E402
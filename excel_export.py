@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+Потоковый экспорт каталога и цен в XLSX, CSV и NDJSON
+
+Товары читаются из базы пачками по EXPORT_BATCH_SIZE (yield_per), цены берутся
+из одного снимка price_storage.get_prices_snapshot(), изображения - одним запросом
+на пачку. Строки не собираются в список, поэтому память не зависит от размера
+каталога.
+
+XLSX пишется openpyxl в режиме write-only, но XML листа уходит не во временный
+файл, а сразу в zip-архив ответа (_StreamingExcelWriter): книга пишется в отдельном
+потоке, архив отдается клиенту частями по мере чтения товаров, как CSV.
+Ширина колонок считается по первым WIDTH_SAMPLE_ROWS строкам листа.
+CSV и NDJSON отдаются по мере чтения товаров, без промежуточного файла.
+"""
+
+import csv
+import io
+import json
+import queue
+import threading
+from contextlib import suppress
+from itertools import chain, islice
+from typing import Callable, Iterable, Iterator, List, Mapping, Optional
+from zipfile import ZipFile, ZIP_DEFLATED
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.drawing.spreadsheet_drawing import SpreadsheetDrawing
+from openpyxl.styles import Alignment, Font, PatternFill
+from openpyxl.utils import get_column_letter
+from openpyxl.worksheet._writer import WorksheetWriter
+from openpyxl.writer.excel import ExcelWriter
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import Product, ProductImage
+from model_cards import get_product_images, load_product_image_lists
+
+# Товаров в одной пачке чтения из базы
+EXPORT_BATCH_SIZE = 1000
+# По скольким первым строкам листа считается ширина колонок
+WIDTH_SAMPLE_ROWS = 200
+# Размер частей ответа
+STREAM_CHUNK_SIZE = 64 * 1024
+# Частей XLSX, которые поток записи может опередить клиента
+XLSX_QUEUE_CHUNKS = 4
+
+EXPORT_FORMATS = {
+    'xlsx': "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    'csv': "text/csv; charset=utf-8",
+    'ndjson': "application/x-ndjson",
+}
+
+
+class ExportSheet:
+    """Лист экспорта: заголовки и генератор строк"""
+
+    def __init__(self, title: str, headers: List[str], rows: Iterable[list],
+                 header_color: str = "366092", max_width: int = 50):
+        self.title = title
+        self.headers = headers
+        self.rows = rows
+        self.header_color = header_color
+        self.max_width = max_width
+
+
+def _batches(db: Session, query) -> Iterator[List[Product]]:
+    """Товары запроса пачками по EXPORT_BATCH_SIZE"""
+    iterator = iter(query.order_by(Product.id).yield_per(EXPORT_BATCH_SIZE))
+    while True:
+        batch = list(islice(iterator, EXPORT_BATCH_SIZE))
+        if not batch:
+            return
+        yield batch
+
+
+def _price_value(price_data: Optional[dict], key: str, default):
+    return price_data.get(key, default) if price_data else default
+
+
+# --- Листы ---
+
+PRODUCT_HEADERS = [
+    'SKU товара', 'Название товара*', 'Описание',
+    'Основная категория (level0)*', 'Подкатегория (level1)*', 'Детальная категория (level2)*',
+    'Бренд', 'Цена*', 'Валюта', 'Количество на складе',
+    'Характеристики (JSON)'
+]
+
+
+def product_rows(db: Session, prices: Mapping[str, dict]) -> Iterator[list]:
+    """Товары в формате шаблона импорта (без изображений)"""
+    for batch in _batches(db, db.query(Product)):
+        for product in batch:
+            price_data = prices.get(product.sku)
+            specifications = product.specs
+            yield [
+                product.sku or '',
+                product.name or '',
+                '',  # description поле удалено
+                product.level_0 or '',
+                product.level_1 or '',
+                product.level_2 or '',
+                product.brand or '',
+                _price_value(price_data, 'price', 0.0),
+                _price_value(price_data, 'currency', 'RUB'),
+                product.stock or 0,
+                json.dumps(specifications, ensure_ascii=False) if specifications else '',
+            ]
+
+
+IMAGE_HEADERS = ['Модель (level_2)*', 'Цвет*', 'URL изображений (через запятую)*']
+
+
+def image_rows(db: Session) -> Iterator[list]:
+    """Списки изображений (модель, цвет) в формате листа импорта"""
+    query = db.query(ProductImage.level_2, ProductImage.color, ProductImage.img_list).order_by(ProductImage.id)
+    for level_2, color, img_list in query.yield_per(EXPORT_BATCH_SIZE):
+        try:
+            images_data = json.loads(img_list) if img_list else []
+            # Список словарей {url} или список строк
+            if images_data and isinstance(images_data[0], dict):
+                image_urls = ', '.join([img.get('url', '') for img in images_data if img.get('url')])
+            else:
+                image_urls = ', '.join(images_data) if images_data else ''
+        except Exception as e:
+            print(f"Ошибка при обработке изображений для {level_2} - {color}: {e}")
+            continue
+        yield [level_2 or '', color or '', image_urls]
+
+
+ASSORTMENT_HEADERS = [
+    'ID', 'SKU', 'Название', 'Описание', 'Бренд', 'Категория', 'Уровень 0', 'Уровень 1', 'Уровень 2',
+    'Цвет', 'Память', 'SIM', 'Цена', 'Старая цена', 'Валюта', 'Скидка %', 'Склад', 'В наличии',
+    'Изображения', 'Кол-во изображений', 'Создано', 'Обновлено'
+]
+
+
+def assortment_rows(db: Session, prices: Mapping[str, dict]) -> Iterator[list]:
+    """Полный ассортимент со всеми столбцами"""
+    for batch in _batches(db, db.query(Product)):
+        image_lists = load_product_image_lists(db, batch)
+        for product in batch:
+            price_data = prices.get(product.sku)
+            images = get_product_images(product, db, image_lists)
+            yield [
+                product.id,
+                product.sku,
+                product.name,
+                '',  # поле description удалено
+                product.brand,
+                product.level_0 or '',
+                product.level_0 or '',
+                product.level_1 or '',
+                product.level_2 or '',
+                product.color or '',
+                product.disk or '',
+                product.sim_config or '',
+                _price_value(price_data, 'price', 0.0),
+                _price_value(price_data, 'old_price', 0.0),
+                _price_value(price_data, 'currency', 'RUB'),
+                _price_value(price_data, 'discount_percentage', 0.0),
+                product.stock,
+                'Да' if product.is_available else 'Нет',
+                ' | '.join(images) if images else '',
+                len(images),
+                product.created_at.strftime('%Y-%m-%d %H:%M:%S') if product.created_at else '',
+                product.updated_at.strftime('%Y-%m-%d %H:%M:%S') if product.updated_at else '',
+            ]
+
+
+PRICE_HEADERS = [
+    'SKU', 'Название товара', 'Бренд', 'Текущая цена', 'Старая цена', 'Валюта', 'Скидка %',
+    'Разница', 'Категория', 'В наличии', 'Обновлено'
+]
+
+
+def price_rows(db: Session, prices: Mapping[str, dict]) -> Iterator[list]:
+    """Цены товаров в наличии (товары без цены пропускаются)"""
+    for batch in _batches(db, db.query(Product).filter(Product.is_available == True)):
+        for product in batch:
+            price_data = prices.get(product.sku)
+            if not price_data:
+                continue
+            price = price_data.get('price', 0.0)
+            old_price = price_data.get('old_price', 0.0)
+            yield [
+                product.sku,
+                product.name,
+                product.brand,
+                price,
+                old_price,
+                price_data.get('currency', 'RUB'),
+                f"{price_data.get('discount_percentage', 0.0):.1f}%",
+                f"{old_price - price:.0f}" if old_price > price else "0",
+                product.level_0 or 'Без категории',
+                product.stock,
+                'Неизвестно',  # updated_at больше не хранится
+            ]
+
+
+# --- Форматы ---
+
+def _write_sheet(ws, sheet: ExportSheet, out) -> int:
+    """Записать write-only лист в поток out (файл листа в zip-архиве); возвращает число строк данных"""
+    rows = iter(sheet.rows)
+    # Ширина колонок пишется в начало листа - считаем ее по первым строкам
+    sample = list(islice(rows, WIDTH_SAMPLE_ROWS))
+    for index, header in enumerate(sheet.headers, 1):
+        width = max([len(str(header))] + [len(str(row[index - 1])) for row in sample if row[index - 1] is not None])
+        ws.column_dimensions[get_column_letter(index)].width = min(width + 2, sheet.max_width)
+    ws._writer = WorksheetWriter(ws, out)
+    ws._writer.write_top()
+
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color=sheet.header_color, end_color=sheet.header_color, fill_type="solid")
+    header_alignment = Alignment(horizontal="center", vertical="center")
+    header_cells = []
+    for header in sheet.headers:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = header_alignment
+        header_cells.append(cell)
+    ws.append(header_cells)
+
+    count = 0
+    for row in chain(sample, rows):
+        ws.append(row)
+        count += 1
+    ws.close()
+    return count
+
+
+class _StreamingExcelWriter(ExcelWriter):
+    """
+    ExcelWriter, который пишет строки листов прямо в архив
+    Стандартный write-only лист копируется в архив из временного файла только при
+    сохранении; здесь строки генерируются во время записи файла листа в архив
+    """
+
+    def __init__(self, workbook: Workbook, archive: ZipFile, sheets: List[ExportSheet]):
+        super().__init__(workbook, archive)
+        self._sheets = {sheet.title: sheet for sheet in sheets}
+
+    def write_worksheet(self, ws):
+        ws._drawing = SpreadsheetDrawing()
+        ws._drawing.charts = ws._charts
+        ws._drawing.images = ws._images
+        with self._archive.open(ws.path[1:], 'w', force_zip64=True) as out:
+            try:
+                _write_sheet(ws, self._sheets[ws.title], out)
+            except BaseException:
+                # XML листа закрывается раньше файла в архиве (после отмены - пишет в пустоту)
+                if ws._writer is not None and not ws.closed:
+                    with suppress(Exception):
+                        ws.close()
+                raise
+        ws._rels = ws._writer._rels
+        self.manifest.append(ws)
+
+
+class _Cancelled(Exception):
+    """Клиент перестал читать ответ"""
+
+
+class _ChunkSink:
+    """
+    Файловый объект для ZipFile: записанные байты уходят в очередь частями по STREAM_CHUNK_SIZE
+    Без tell/seek ZipFile пишет архив последовательно (размеры - после данных файла)
+    """
+
+    def __init__(self):
+        self.chunks = queue.Queue(maxsize=XLSX_QUEUE_CHUNKS)
+        self.cancelled = threading.Event()
+        self._buffer = bytearray()
+        self._discard = False
+
+    def _put(self, item) -> None:
+        # Ждем, пока клиент заберет предыдущие части; если он ушел - прерываем запись
+        while not self.cancelled.is_set():
+            try:
+                self.chunks.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                pass
+        # Закрытие архива после прерывания пишет в пустоту
+        self._discard = True
+        raise _Cancelled()
+
+    def write(self, data) -> int:
+        if not self._discard:
+            self._buffer += data
+            if len(self._buffer) >= STREAM_CHUNK_SIZE:
+                chunk = bytes(self._buffer)
+                self._buffer.clear()
+                self._put(chunk)
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def finish(self, error: Optional[Exception] = None) -> None:
+        """Отдать остаток и признак конца (None) или ошибку записи"""
+        try:
+            if self._buffer and error is None:
+                self._put(bytes(self._buffer))
+            self._put(error)
+        except _Cancelled:
+            pass
+
+
+def _write_xlsx(build_sheets: Callable[[Session], List[ExportSheet]], sink: _ChunkSink) -> None:
+    db = SessionLocal()
+    try:
+        sheets = build_sheets(db)
+        wb = Workbook(write_only=True)
+        for sheet in sheets:
+            wb.create_sheet(sheet.title)
+        _StreamingExcelWriter(wb, ZipFile(sink, 'w', ZIP_DEFLATED, allowZip64=True), sheets).save()
+    except _Cancelled:
+        return
+    except Exception as e:
+        sink.finish(e)
+        return
+    finally:
+        db.close()
+    sink.finish()
+
+
+def iter_xlsx(build_sheets: Callable[[Session], List[ExportSheet]]) -> Iterator[bytes]:
+    """
+    Книга из листов build_sheets(db) частями по мере чтения товаров
+    Книга пишется в отдельном потоке; очередь частей ограничена XLSX_QUEUE_CHUNKS,
+    поэтому запись ждет медленного клиента и память не растет
+    """
+    sink = _ChunkSink()
+    threading.Thread(target=_write_xlsx, args=(build_sheets, sink), daemon=True).start()
+    try:
+        while True:
+            chunk = sink.chunks.get()
+            if chunk is None:
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+    finally:
+        # Ответ прерван - поток записи остановится на следующей части
+        sink.cancelled.set()
+
+
+def iter_text(build_sheets: Callable[[Session], List[ExportSheet]], export_format: str) -> Iterator[bytes]:
+    """
+    Первый лист build_sheets(db) в CSV или NDJSON частями по мере чтения товаров
+    Остальные листы (изображения) есть только в XLSX
+    """
+    db = SessionLocal()
+    try:
+        sheet = build_sheets(db)[0]
+        buffer = io.StringIO()
+        if export_format == 'csv':
+            # BOM - чтобы Excel открыл UTF-8 с кириллицей
+            buffer.write('\ufeff')
+            writer = csv.writer(buffer)
+            writer.writerow(sheet.headers)
+            write_row = writer.writerow
+        else:
+            def write_row(row):
+                buffer.write(json.dumps(dict(zip(sheet.headers, row)), ensure_ascii=False, default=str))
+                buffer.write('\n')
+
+        for row in sheet.rows:
+            write_row(row)
+            if buffer.tell() >= STREAM_CHUNK_SIZE:
+                yield buffer.getvalue().encode('utf-8')
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode('utf-8')
+    finally:
+        db.close()
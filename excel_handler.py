@@ -2,16 +2,75 @@
 Модуль для работы с Excel файлами (XLSX) в Yo Store
 """
 
-import pandas as pd
 import openpyxl
 from openpyxl import Workbook
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from openpyxl.utils.dataframe import dataframe_to_rows
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator, Tuple
 import json
 from datetime import datetime
 import io
 
+# Обязательные колонки листов (первые четыре колонки товара - признак непустой строки)
+PRODUCT_REQUIRED_COLUMNS = ['Название товара*', 'Основная категория (level0)*', 'Подкатегория (level1)*', 'Детальная категория (level2)*', 'Цена*']
+PRICE_REQUIRED_COLUMNS = ['SKU товара*', 'Новая цена*']
+IMAGE_REQUIRED_COLUMNS = ['Модель (level_2)*', 'Цвет*', 'URL изображений (через запятую)*']
+
+
+def _is_empty(value) -> bool:
+    """Пустая ячейка (openpyxl возвращает None)"""
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _text(value, default: str = '') -> str:
+    return default if _is_empty(value) else str(value).strip()
+
+
+def _product_from_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Товар из строки листа 'Товары'"""
+    # Обработка цены: если пустая, пытаемся найти цену в колонке "Цена" или используем 0
+    price_value = row.get('Цена*')
+    if _is_empty(price_value):
+        price_value = row.get('Цена')
+    try:
+        price = float(price_value) if not _is_empty(price_value) else 0
+    except (ValueError, TypeError):
+        price = 0
+
+    # Парсим характеристики
+    specifications = {}
+    if not _is_empty(row.get('Характеристики (JSON)')):
+        try:
+            specifications = json.loads(str(row['Характеристики (JSON)']))
+        except json.JSONDecodeError:
+            specifications = {}
+
+    # Извлекаем специфичные поля из specifications
+    color = specifications.get('color', '') if specifications else ''
+    disk = specifications.get('disk', specifications.get('memory', '')) if specifications else ''
+    ram = specifications.get('ram', '') if specifications else ''
+    sim_config = specifications.get('sim_config', specifications.get('sim_type', '')) if specifications else ''
+
+    stock = row.get('Количество на складе')
+    return {
+        'sku': _text(row.get('SKU товара')),
+        'name': _text(row['Название товара*']),
+        'description': _text(row.get('Описание')),
+        'level0': _text(row['Основная категория (level0)*']),
+        'level1': _text(row['Подкатегория (level1)*']),
+        'level2': _text(row['Детальная категория (level2)*']),
+        'brand': _text(row.get('Бренд')),
+        'price': price,
+        'currency': _text(row.get('Валюта'), 'RUB').upper(),
+        'stock': int(stock) if not _is_empty(stock) else 0,
+        'image_url': _text(row.get('URL изображения (через запятую)')),
+        'specifications': specifications,
+        'color': color,
+        'disk': disk,
+        'ram': ram,
+        'sim_config': sim_config
+    }
+
 class ExcelHandler:
     """Класс для работы с Excel файлами"""
     
@@ -185,180 +244,115 @@ class ExcelHandler:
         output.seek(0)
         return output.getvalue()
     
-    def parse_products_excel(self, file_content: bytes) -> List[Dict[str, Any]]:
-        """Парсить Excel файл с товарами"""
+    # --- Потоковое чтение (openpyxl read-only) ---
+
+    @staticmethod
+    def open_workbook(file_content: bytes):
+        """Открыть книгу в режиме read-only: листы читаются построчно, без загрузки целиком"""
+        return openpyxl.load_workbook(io.BytesIO(file_content), read_only=True, data_only=True)
+
+    @staticmethod
+    def iter_sheet_rows(wb, sheet_name: str, required_columns: List[str]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """(номер строки в Excel, {заголовок: значение}) для строк листа; первая строка - заголовки"""
+        if sheet_name not in wb.sheetnames:
+            raise ValueError(f"Нет листа '{sheet_name}'")
+        rows = wb[sheet_name].iter_rows(values_only=True)
+        header = next(rows, None) or ()
+        columns = [str(value) if value is not None else None for value in header]
+
+        # Проверяем обязательные колонки
+        missing_columns = [col for col in required_columns if col not in columns]
+        if missing_columns:
+            raise ValueError(f"Отсутствуют обязательные колонки: {', '.join(missing_columns)}")
+
+        for number, values in enumerate(rows, 2):
+            yield number, dict(zip(columns, values))
+
+    def iter_products(self, wb, errors: List[str]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Товары листа 'Товары' по одному; ошибки строк добавляются в errors"""
+        for number, row in self.iter_sheet_rows(wb, 'Товары', PRODUCT_REQUIRED_COLUMNS):
+            # Пропускаем пустые строки (проверяем обязательные поля, кроме цены)
+            if any(_is_empty(row.get(col)) for col in PRODUCT_REQUIRED_COLUMNS[:4]):
+                continue
+            try:
+                product = _product_from_row(row)
+            except Exception as e:
+                errors.append(f"Строка {number}: {str(e)}")
+                continue
+            yield number, product
+
+    def iter_prices(self, wb, errors: List[str]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Цены листа 'Цены' по одной; ошибки строк добавляются в errors"""
+        for number, row in self.iter_sheet_rows(wb, 'Цены', PRICE_REQUIRED_COLUMNS):
+            # Пропускаем пустые строки
+            if _is_empty(row.get('SKU товара*')) or _is_empty(row.get('Новая цена*')):
+                continue
+            try:
+                price = float(row['Новая цена*'])
+                old_price = row.get('Старая цена')
+                price_data = {
+                    'sku': _text(row['SKU товара*']),
+                    'name': _text(row.get('Название товара')),
+                    'price': price,
+                    # None - в файле нет старой цены (скидка товара не меняется)
+                    'old_price': None if _is_empty(old_price) else float(old_price),
+                    'currency': _text(row.get('Валюта'), 'RUB').upper()
+                }
+            except Exception as e:
+                errors.append(f"Строка {number}: {str(e)}")
+                continue
+            yield number, price_data
+
+    def iter_images(self, wb, errors: List[str]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Изображения листа 'Изображения' по одной записи (модель + цвет)"""
+        for number, row in self.iter_sheet_rows(wb, 'Изображения', IMAGE_REQUIRED_COLUMNS):
+            # Пропускаем пустые строки
+            if any(_is_empty(row.get(col)) for col in IMAGE_REQUIRED_COLUMNS):
+                continue
+            try:
+                # Разделяем URL по запятой и очищаем от пробелов
+                image_urls = [url.strip() for url in _text(row['URL изображений (через запятую)*']).split(',') if url.strip()]
+                if not image_urls:
+                    continue
+                image_data = {
+                    'level_2': _text(row['Модель (level_2)*']),
+                    'color': _text(row['Цвет*']),
+                    'img_list': image_urls
+                }
+            except Exception as e:
+                errors.append(f"Строка {number}: {str(e)}")
+                continue
+            yield number, image_data
+
+    def _parse_sheet(self, file_content: bytes, iter_rows) -> List[Dict[str, Any]]:
+        """Прочитать лист целиком через потоковый iter_* (для небольших файлов)"""
         try:
-            # Читаем Excel файл
-            df = pd.read_excel(io.BytesIO(file_content), sheet_name='Товары')
-            
-            # Проверяем обязательные колонки
-            required_columns = ['Название товара*', 'Основная категория (level0)*', 'Подкатегория (level1)*', 'Детальная категория (level2)*', 'Цена*']
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            if missing_columns:
-                raise ValueError(f"Отсутствуют обязательные колонки: {', '.join(missing_columns)}")
-            
-            products = []
-            errors = []
-            
-            for index, row in df.iterrows():
-                try:
-                    # Пропускаем пустые строки (проверяем обязательные поля, кроме цены)
-                    if (pd.isna(row['Название товара*']) or 
-                        pd.isna(row['Основная категория (level0)*']) or 
-                        pd.isna(row['Подкатегория (level1)*']) or 
-                        pd.isna(row['Детальная категория (level2)*'])):
-                        continue
-                    
-                    # Обработка цены: если пустая, используем 0 или пропускаем строку
-                    price_value = row['Цена*']
-                    if pd.isna(price_value):
-                        # Пытаемся найти цену в других колонках или используем 0
-                        price_value = row.get('Цена', 0)
-                        if pd.isna(price_value):
-                            price_value = 0
-                    try:
-                        price = float(price_value)
-                    except (ValueError, TypeError):
-                        price = 0
-                    
-                    # Парсим характеристики
-                    specifications = {}
-                    if not pd.isna(row.get('Характеристики (JSON)', '')):
-                        try:
-                            specifications = json.loads(str(row['Характеристики (JSON)']))
-                        except json.JSONDecodeError:
-                            specifications = {}
-                    
-                    # Извлекаем специфичные поля из specifications или из отдельных колонок
-                    color = specifications.get('color', '') if specifications else ''
-                    disk = specifications.get('disk', specifications.get('memory', '')) if specifications else ''
-                    ram = specifications.get('ram', '') if specifications else ''
-                    sim_config = specifications.get('sim_config', specifications.get('sim_type', '')) if specifications else ''
-                    
-                    product = {
-                        'sku': str(row.get('SKU товара', '')).strip() if not pd.isna(row.get('SKU товара', '')) else '',
-                        'name': str(row['Название товара*']).strip(),
-                        'description': str(row.get('Описание', '')).strip() if not pd.isna(row.get('Описание', '')) else '',
-                        'level0': str(row['Основная категория (level0)*']).strip(),
-                        'level1': str(row['Подкатегория (level1)*']).strip(),
-                        'level2': str(row['Детальная категория (level2)*']).strip(),
-                        'brand': str(row.get('Бренд', '')).strip() if not pd.isna(row.get('Бренд', '')) else '',
-                        'price': price,
-                        'currency': str(row.get('Валюта', 'RUB')).strip().upper() if not pd.isna(row.get('Валюта', 'RUB')) else 'RUB',
-                        'stock': int(row.get('Количество на складе', 0)) if not pd.isna(row.get('Количество на складе', 0)) else 0,
-                        'image_url': str(row.get('URL изображения (через запятую)', '')).strip() if not pd.isna(row.get('URL изображения (через запятую)', '')) else '',
-                        'specifications': specifications,
-                        'color': color,
-                        'disk': disk,
-                        'ram': ram,
-                        'sim_config': sim_config
-                    }
-                    
-                    products.append(product)
-                    
-                except Exception as e:
-                    errors.append(f"Строка {index + 2}: {str(e)}")
-            
+            wb = self.open_workbook(file_content)
+            try:
+                errors = []
+                items = [item for _, item in iter_rows(wb, errors)]
+            finally:
+                wb.close()
+
             if errors:
                 raise ValueError(f"Ошибки при парсинге: {'; '.join(errors)}")
-            
-            return products
-            
+
+            return items
+
         except Exception as e:
             raise ValueError(f"Ошибка при чтении Excel файла: {str(e)}")
-    
+
+    def parse_products_excel(self, file_content: bytes) -> List[Dict[str, Any]]:
+        """Парсить Excel файл с товарами"""
+        return self._parse_sheet(file_content, self.iter_products)
+
     def parse_prices_excel(self, file_content: bytes) -> List[Dict[str, Any]]:
         """Парсить Excel файл с ценами"""
-        try:
-            # Читаем Excel файл
-            df = pd.read_excel(io.BytesIO(file_content), sheet_name='Цены')
-            
-            # Проверяем обязательные колонки
-            required_columns = ['SKU товара*', 'Новая цена*']
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            if missing_columns:
-                raise ValueError(f"Отсутствуют обязательные колонки: {', '.join(missing_columns)}")
-            
-            prices = []
-            errors = []
-            
-            for index, row in df.iterrows():
-                try:
-                    # Пропускаем пустые строки
-                    if pd.isna(row['SKU товара*']) or pd.isna(row['Новая цена*']):
-                        continue
-                    
-                    price_data = {
-                        'sku': str(row['SKU товара*']).strip(),
-                        'name': str(row.get('Название товара', '')).strip(),
-                        'price': float(row['Новая цена*']),
-                        'old_price': float(row.get('Старая цена', row['Новая цена*'])),
-                        'currency': str(row.get('Валюта', 'RUB')).strip().upper()
-                    }
-                    
-                    prices.append(price_data)
-                    
-                except Exception as e:
-                    errors.append(f"Строка {index + 2}: {str(e)}")
-            
-            if errors:
-                raise ValueError(f"Ошибки при парсинге: {'; '.join(errors)}")
-            
-            return prices
-            
-        except Exception as e:
-            raise ValueError(f"Ошибка при чтении Excel файла: {str(e)}")
-    
+        return self._parse_sheet(file_content, self.iter_prices)
+
     def parse_images_excel(self, file_content: bytes) -> List[Dict[str, Any]]:
         """Парсить Excel файл с изображениями"""
-        try:
-            # Читаем Excel файл
-            df = pd.read_excel(io.BytesIO(file_content), sheet_name='Изображения')
-            
-            # Проверяем обязательные колонки
-            required_columns = ['Модель (level_2)*', 'Цвет*', 'URL изображений (через запятую)*']
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            if missing_columns:
-                raise ValueError(f"Отсутствуют обязательные колонки: {', '.join(missing_columns)}")
-            
-            images = []
-            errors = []
-            
-            for index, row in df.iterrows():
-                try:
-                    # Пропускаем пустые строки
-                    if pd.isna(row['Модель (level_2)*']) or pd.isna(row['Цвет*']) or pd.isna(row['URL изображений (через запятую)*']):
-                        continue
-                    
-                    # Парсим URL изображений
-                    image_urls_str = str(row['URL изображений (через запятую)*']).strip()
-                    if not image_urls_str:
-                        continue
-                    
-                    # Разделяем URL по запятой и очищаем от пробелов
-                    image_urls = [url.strip() for url in image_urls_str.split(',') if url.strip()]
-                    
-                    if not image_urls:
-                        continue
-                    
-                    image_data = {
-                        'level_2': str(row['Модель (level_2)*']).strip(),
-                        'color': str(row['Цвет*']).strip(),
-                        'img_list': image_urls
-                    }
-                    
-                    images.append(image_data)
-                    
-                except Exception as e:
-                    errors.append(f"Строка {index + 2}: {str(e)}")
-            
-            if errors:
-                raise ValueError(f"Ошибки при парсинге: {'; '.join(errors)}")
-            
-            return images
-            
-        except Exception as e:
-            raise ValueError(f"Ошибка при чтении Excel файла: {str(e)}")
+        return self._parse_sheet(file_content, self.iter_images)
     
     def export_products_to_excel(self, products: List[Dict[str, Any]]) -> bytes:
         """Экспортировать товары в Excel файл"""
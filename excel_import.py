@@ -0,0 +1,666 @@
+#!/usr/bin/env python3
+"""
+Потоковый импорт товаров и изображений из Excel
+
+Книга открывается один раз в режиме read-only (openpyxl), строки листов
+читаются генераторами ExcelHandler.iter_* и обрабатываются пачками по
+EXCEL_IMPORT_CHUNK_SIZE строк: для пачки одним запросом проверяются
+существующие SKU и изображения, товары добавляются одним flush, затем commit
+и одна запись цен в price_storage. Память не растет с размером файла,
+а ошибка в пачке не откатывает уже загруженные пачки.
+
+upsert_products - то же для "обновить или создать": товары пачки, их цены,
+изображения и категории загружаются несколькими IN запросами, строки
+сравниваются с ними в памяти, в базу уходят только изменения: новые товары
+и категории - одним INSERT (executemany) на пачку. Итог содержит
+отчет по строкам; режим dry_run считает изменения, ничего не записывая.
+Строки, хэш и цена которых совпадают с последней загрузкой (feed_hashes),
+пропускаются без чтения товаров, поэтому повторная загрузка того же фида
+почти ничего не стоит.
+
+import_prices - цены листа "Цены": в price_storage записываются только
+отличающиеся цены, одной записью на пачку.
+"""
+
+import json
+import time
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from models import Product, Category, ProductImage, parse_specifications, variant_values
+from excel_handler import ExcelHandler
+from config import Config
+import catalog_generation
+import category_counts
+import facets
+import feed_hashes
+import model_cards
+import price_storage
+import search_index
+
+
+def _chunks(items: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _rows_label(chunk: List[Tuple[int, dict]]) -> str:
+    return f"Строки {chunk[0][0]}-{chunk[-1][0]}"
+
+
+class _CategoryRegistry:
+    """Пары уровней категорий, которые уже есть в таблице categories (как ensure_category_exists в api.py)"""
+
+    def __init__(self, db: Session):
+        self._known: Set[Tuple[Optional[str], Optional[str], Optional[str]]] = set(
+            db.query(Category.level_0, Category.level_1, Category.level_2)
+        )
+
+    def missing(self, level0: str, level1: Optional[str], level2: Optional[str]) -> List[Tuple]:
+        """Уровни товара (level_0, level_1, level_2), которых еще нет в таблице categories"""
+        keys = [(level0, None, None)]
+        if level1:
+            keys.append((level0, level1, None))
+            if level2:
+                keys.append((level0, level1, level2))
+        created = []
+        for key in keys:
+            if key not in self._known:
+                self._known.add(key)
+                created.append(key)
+        return created
+
+
+def _insert_categories(db: Session, keys: List[Tuple]) -> None:
+    """Новые категории - одним INSERT (executemany); события ORM для них не срабатывают"""
+    if not keys:
+        return
+    db.execute(insert(Category.__table__), [
+        {'level_0': level_0, 'level_1': level_1, 'level_2': level_2} for level_0, level_1, level_2 in keys
+    ])
+    category_counts.mark_categories_changed(db)
+    catalog_generation.mark_changed(db)
+
+
+def _insert_products(db: Session, rows: List[dict]) -> None:
+    """
+    Новые товары - одним INSERT (executemany) вместо INSERT на каждый объект при flush
+    Core INSERT не вызывает события сессии, поэтому измененные модели и товары
+    передаются обработчикам after_commit карточек, поиска, фасетов и категорий явно
+    """
+    if not rows:
+        return
+    db.execute(insert(Product.__table__), rows)
+    product_ids = [product_id for (product_id,) in
+                   db.query(Product.id).filter(Product.sku.in_([row['sku'] for row in rows]))]
+    model_keys = {(row['level_2'], row['brand']) for row in rows}
+    model_cards.mark_models_changed(db, model_keys)
+    search_index.mark_models_changed(db, model_keys)
+    facets.mark_products_changed(db, product_ids)
+    category_counts.mark_products_added(db, [row['level_0'] for row in rows])
+    catalog_generation.mark_changed(db)
+
+
+def _generate_sku(product_data: dict, taken: Set[str]) -> str:
+    """SKU из бренда, модели и времени, которого нет в taken"""
+    prefix = f"{product_data['brand'][:3].upper()}{product_data['level2'][:5].upper()}"
+    timestamp = int(time.time() * 1000) % 100000  # последние 5 цифр timestamp
+    sku = f"{prefix}{timestamp}"
+    while sku in taken:
+        timestamp += 1
+        sku = f"{prefix}{timestamp}"
+    return sku
+
+
+def _upsert_images(db: Session, images: Dict[Tuple[str, str], List[str]], dry_run: bool = False) -> Tuple[int, int]:
+    """
+    Записать списки изображений (модель, цвет) -> URL; существующие записи загружаются одним запросом
+    dry_run - только посчитать добавленные и обновленные записи
+    Записи с тем же списком не изменяются и не считаются
+    """
+    if not images:
+        return 0, 0
+    existing = {
+        (image.level_2, image.color): image
+        for image in db.query(ProductImage).filter(ProductImage.level_2.in_({level_2 for level_2, _ in images}))
+    }
+    added = updated = 0
+    for (level_2, color), img_list in images.items():
+        img_list_json = json.dumps(img_list)
+        image = existing.get((level_2, color))
+        if image:
+            if image.img_list == img_list_json:
+                continue
+            if not dry_run:
+                image.img_list = img_list_json
+            updated += 1
+        else:
+            if not dry_run:
+                db.add(ProductImage(level_2=level_2, color=color, img_list=img_list_json))
+            added += 1
+    return added, updated
+
+
+def _import_products_chunk(db: Session, chunk: List[Tuple[int, dict]], categories: _CategoryRegistry,
+                           errors: List[str]) -> int:
+    """Добавить пачку товаров одной транзакцией; возвращает число добавленных"""
+    # Существующие SKU пачки - одним запросом (предыдущие пачки уже закоммичены и тоже видны)
+    file_skus = [product_data['sku'] for _, product_data in chunk if product_data['sku']]
+    taken_skus = set()
+    if file_skus:
+        taken_skus.update(sku for (sku,) in db.query(Product.sku).filter(Product.sku.in_(file_skus)))
+
+    products = []
+    generated = {}
+    new_categories = []
+    prices = {}
+    images = {}
+    for number, product_data in chunk:
+        # Проверяем, что указаны обязательные поля level0
+        if not product_data.get('level0'):
+            errors.append(f"Строка {number}: Не указана основная категория (level0)")
+            continue
+
+        # Проверяем обязательные поля для генерации SKU
+        if not product_data.get('brand') or not product_data.get('level2'):
+            errors.append(f"Строка {number}: Не указан бренд или модель, необходимые для генерации SKU")
+            continue
+
+        sku = product_data['sku']
+        if sku:
+            # Проверяем уникальность SKU (в базе и в этой пачке)
+            if sku in taken_skus:
+                errors.append(f"Строка {number}: SKU '{sku}' уже существует")
+                continue
+        else:
+            sku = _generate_sku(product_data, taken_skus)
+        taken_skus.add(sku)
+
+        # Сформировать specifications из данных
+        specs = dict(product_data.get('specifications') or {})
+        for key in ('color', 'ram', 'disk', 'sim_config'):
+            if product_data.get(key):
+                specs[key] = product_data[key]
+
+        product = Product(
+            sku=sku,
+            name=product_data['name'],
+            level_0=product_data['level0'],
+            level_1=product_data.get('level1'),
+            level_2=product_data.get('level2'),
+            brand=product_data['brand'],
+            specifications=json.dumps(specs),
+            stock=product_data['stock'],
+            is_available=True
+        )
+        products.append(product)
+        if not product_data['sku']:
+            generated[sku] = (product, product_data)
+        new_categories.extend(categories.missing(product_data['level0'], product_data.get('level1'), product_data.get('level2')))
+        prices[sku] = {
+            'price': product_data['price'],
+            'old_price': product_data['price'],
+            'currency': product_data.get('currency', 'RUB'),
+            'is_parse': product_data.get('is_parse', True)
+        }
+
+        # Изображения товара - в ProductImage по модели и цвету
+        image_urls = [url.strip() for url in product_data['image_url'].split(',') if url.strip()]
+        if image_urls and product_data.get('color'):
+            images[(product_data['level2'], product_data['color'])] = image_urls
+
+    if not products:
+        return 0
+
+    # Сгенерированный SKU мог совпасть с товаром из базы
+    if generated:
+        for (sku,) in db.query(Product.sku).filter(Product.sku.in_(list(generated))):
+            product, product_data = generated[sku]
+            product.sku = _generate_sku(product_data, taken_skus)
+            taken_skus.add(product.sku)
+            prices[product.sku] = prices.pop(sku)
+
+    db.add_all(products)
+    _insert_categories(db, new_categories)
+    _upsert_images(db, images)
+    db.commit()
+
+    # Начальные цены пачки - одной записью
+    price_storage.update_prices(prices)
+    return len(products)
+
+
+def _import_images(db: Session, rows: Iterable[Tuple[int, dict]], chunk_size: int,
+                   progress: Optional[Callable] = None, dry_run: bool = False) -> dict:
+    added_count = 0
+    updated_count = 0
+    processed = 0
+    errors = []
+    for chunk in _chunks(rows, chunk_size):
+        processed += len(chunk)
+        # Последняя строка для пары (модель, цвет) перекрывает предыдущие
+        images = {(image_data['level_2'], image_data['color']): image_data['img_list'] for _, image_data in chunk}
+        try:
+            added, updated = _upsert_images(db, images, dry_run)
+            db.commit()
+            added_count += added
+            updated_count += updated
+        except Exception as e:
+            db.rollback()
+            errors.append(f"Ошибка при обработке изображений ({_rows_label(chunk)}): {str(e)}")
+        if progress:
+            progress(processed, errors)
+    return {"images_added": added_count, "images_updated": updated_count, "images_errors": errors}
+
+
+def import_products(db: Session, file_content: bytes, chunk_size: Optional[int] = None,
+                    progress: Optional[Callable] = None) -> dict:
+    """
+    Импортировать товары (лист "Товары") и изображения (лист "Изображения", если есть)
+    Строки с ошибками пропускаются и попадают в errors / images_errors
+    progress(обработано строк, ошибки) вызывается после каждой пачки (см. import_jobs)
+    """
+    chunk_size = chunk_size or Config.EXCEL_IMPORT_CHUNK_SIZE
+    excel_handler = ExcelHandler()
+    wb = excel_handler.open_workbook(file_content)
+    try:
+        errors = []
+        categories = _CategoryRegistry(db)
+        added_count = 0
+        total_processed = 0
+
+        for chunk in _chunks(excel_handler.iter_products(wb, errors), chunk_size):
+            total_processed += len(chunk)
+            try:
+                added_count += _import_products_chunk(db, chunk, categories, errors)
+            except Exception as e:
+                db.rollback()
+                # Категории пачки не записаны - пусть следующие пачки создадут их заново
+                categories = _CategoryRegistry(db)
+                errors.append(f"{_rows_label(chunk)}: {str(e)}")
+            if progress:
+                progress(total_processed, errors)
+
+        images_result = {"images_added": 0, "images_updated": 0, "images_errors": []}
+        if 'Изображения' in wb.sheetnames:
+            images_errors = []
+            try:
+                images_result = _import_images(db, excel_handler.iter_images(wb, images_errors), chunk_size)
+            except ValueError as e:
+                print(f"Предупреждение: Не удалось загрузить изображения: {e}")
+            images_result["images_errors"] = images_errors + images_result["images_errors"]
+
+        return {
+            "added": added_count,
+            "errors": errors,
+            "total_processed": total_processed,
+            **images_result
+        }
+    finally:
+        wb.close()
+
+
+def import_images(db: Session, file_content: bytes, chunk_size: Optional[int] = None,
+                  progress: Optional[Callable] = None) -> dict:
+    """Импортировать изображения (лист "Изображения")"""
+    chunk_size = chunk_size or Config.EXCEL_IMPORT_CHUNK_SIZE
+    excel_handler = ExcelHandler()
+    wb = excel_handler.open_workbook(file_content)
+    try:
+        errors = []
+        total_processed = 0
+
+        def counted(rows):
+            nonlocal total_processed
+            for row in rows:
+                total_processed += 1
+                yield row
+
+        result = _import_images(db, counted(excel_handler.iter_images(wb, errors)), chunk_size,
+                                (lambda processed, chunk_errors: progress(processed, errors + chunk_errors)) if progress else None)
+        return {
+            "added": result["images_added"],
+            "updated": result["images_updated"],
+            "errors": errors + result["images_errors"],
+            "total_processed": total_processed
+        }
+    finally:
+        wb.close()
+
+
+# --- Обновить или создать (update-or-create) ---
+
+# Поля товара, которые задает строка файла
+UPSERT_FIELDS = ('name', 'level_0', 'level_1', 'level_2', 'brand', 'stock')
+# Поля варианта, которые строка дописывает в specifications существующего товара
+UPSERT_SPEC_KEYS = ('color', 'disk', 'ram', 'sim_config')
+
+
+def _row_fields(product_data: dict) -> dict:
+    return {
+        'name': product_data['name'],
+        'level_0': product_data['level0'],
+        'level_1': product_data.get('level1', ''),
+        'level_2': product_data.get('level2', ''),
+        'brand': product_data.get('brand', ''),
+        'stock': product_data.get('stock', 0),
+    }
+
+
+def _product_state(product: Product) -> dict:
+    state = {field: getattr(product, field) for field in UPSERT_FIELDS}
+    state['specs'] = parse_specifications(product.specifications)
+    return state
+
+
+def _diff(old: dict, new: dict) -> dict:
+    """{поле: [было, стало]} для отличающихся полей"""
+    return {key: [old.get(key), value] for key, value in new.items() if old.get(key) != value}
+
+
+def _price_unchanged(existing: Optional[dict], product_data: dict) -> bool:
+    """Цена строки совпадает с записанной в price_storage"""
+    price = float(product_data['price'])
+    return bool(existing) and (
+        existing.get('price') == price
+        and existing.get('old_price') == float(product_data.get('old_price', price))
+        and existing.get('currency') == product_data.get('currency', 'RUB')
+    )
+
+
+def _split_unchanged(db: Session, chunk: List[Tuple[int, dict]], seen_skus: Set[str]) -> Tuple[list, int, dict]:
+    """
+    Отделить строки, совпадающие с последней загрузкой фида (хэш строки и цена)
+    Возвращает (строки для сравнения с базой, число пропущенных строк, хэши строк пачки по SKU)
+    """
+    row_hashes = [feed_hashes.row_hash(product_data) if product_data.get('sku') else None
+                  for _, product_data in chunk]
+    # Для повторов SKU в пачке - хэш последней строки
+    hashes = {product_data['sku']: value for (_, product_data), value in zip(chunk, row_hashes) if value}
+    stored = feed_hashes.load(db, hashes)
+    prices = price_storage.get_prices(hashes)
+
+    pending = []
+    skipped = 0
+    for (number, product_data), value in zip(chunk, row_hashes):
+        sku = product_data.get('sku')
+        # Повтор SKU в файле сравнивается полностью: предыдущая строка могла его изменить
+        if (sku and sku not in seen_skus and stored.get(sku) == value
+                and _price_unchanged(prices.get(sku), product_data)):
+            skipped += 1
+        else:
+            pending.append((number, product_data))
+        if sku:
+            seen_skus.add(sku)
+    return pending, skipped, hashes
+
+
+def _upsert_chunk(db: Session, chunk: List[Tuple[int, dict]], categories: _CategoryRegistry,
+                  dry_run: bool, created_skus: Set[str], hashes: Optional[Dict[str, str]] = None) -> dict:
+    """Сравнить пачку строк с базой и записать изменения одной транзакцией; возвращает отчет пачки"""
+    report = {"added": 0, "updated": 0, "unchanged": 0, "categories_added": 0, "errors": [], "rows": []}
+    # SKU для строк без SKU генерируются так, чтобы не совпасть с остальными строками пачки
+    skus = {product_data['sku'] for _, product_data in chunk if product_data.get('sku')}
+    for _, product_data in chunk:
+        if not product_data.get('sku'):
+            product_data['sku'] = _generate_sku(product_data, skus)
+            skus.add(product_data['sku'])
+
+    # Все, что нужно пачке, - несколькими IN запросами
+    products = {product.sku: product for product in db.query(Product).filter(Product.sku.in_(skus))}
+    prices = price_storage.get_prices(skus)
+
+    states = {sku: _product_state(product) for sku, product in products.items()}
+    original = {sku: dict(state, specs=dict(state['specs'])) for sku, state in states.items()}
+    new_prices = {}
+    images = {}
+    new_categories = []
+    failed_skus = set()
+
+    for number, product_data in chunk:
+        sku = product_data['sku']
+        try:
+            fields = _row_fields(product_data)
+            price = float(product_data['price'])
+            old_price = float(product_data.get('old_price', product_data['price']))
+            currency = product_data.get('currency', 'RUB')
+            failed_skus.discard(sku)
+            state = states.get(sku)
+            exists = state is not None or sku in created_skus
+            if state is None:
+                # Новый товар: характеристики из файла целиком
+                specs = dict(product_data.get('specifications') or {})
+                state = {'specs': {}}
+            else:
+                specs = dict(state['specs'])
+            for key in UPSERT_SPEC_KEYS:
+                if product_data.get(key):
+                    specs[key] = product_data[key]
+            new_state = dict(fields, specs=specs)
+            changes = _diff({k: v for k, v in state.items() if k != 'specs'}, fields) if exists else {}
+            if exists and specs != state['specs']:
+                changes['specifications'] = [state['specs'], specs]
+            states[sku] = new_state
+
+            # Цена: is_parse сохраняется из существующей записи
+            existing_price = new_prices.get(sku) or prices.get(sku)
+            if not _price_unchanged(existing_price, product_data):
+                if existing_price and exists:
+                    changes['price'] = [existing_price.get('price'), price]
+                new_prices[sku] = {
+                    'price': price,
+                    'old_price': old_price,
+                    'currency': currency,
+                    'is_parse': existing_price.get('is_parse', True) if existing_price else product_data.get('is_parse', True)
+                }
+
+            new_categories.extend(categories.missing(fields['level_0'], fields['level_1'], fields['level_2']))
+
+            # Изображения варианта - в ProductImage по модели и цвету
+            image_urls = [url.strip() for url in product_data.get('image_url', '').split(',') if url.strip()]
+            if image_urls and fields['level_2'] and specs.get('color'):
+                images[(fields['level_2'], specs['color'])] = image_urls
+
+            if not exists:
+                action = 'created'
+                report['added'] += 1
+                if dry_run:
+                    created_skus.add(sku)
+            elif changes:
+                action = 'updated'
+                report['updated'] += 1
+            else:
+                action = 'unchanged'
+                report['unchanged'] += 1
+            if action == 'updated':
+                report['rows'].append({'row': number, 'sku': sku, 'action': action, 'changes': changes})
+            elif action == 'created':
+                report['rows'].append({'row': number, 'sku': sku, 'action': action})
+        except Exception as e:
+            failed_skus.add(sku)
+            report['errors'].append(f"Строка {number}: {str(e)}")
+            report['rows'].append({'row': number, 'sku': sku, 'action': 'error', 'error': str(e)})
+
+    report['categories_added'] = len(new_categories)
+    if dry_run:
+        db.rollback()
+        return report
+
+    # Новые товары - строками для одного INSERT, изменения существующих - в объекты сессии
+    new_rows = []
+    for sku, state in states.items():
+        fields = {field: state[field] for field in UPSERT_FIELDS}
+        product = products.get(sku)
+        if product is None:
+            # Колонки варианта заполняются так же, как при присваивании specifications
+            new_rows.append(dict(fields, sku=sku, specifications=json.dumps(state['specs']), is_available=True,
+                                 **variant_values(state['specs'])))
+            continue
+        before = original[sku]
+        for field in UPSERT_FIELDS:
+            if before[field] != fields[field]:
+                setattr(product, field, fields[field])
+        if before['specs'] != state['specs']:
+            product.specifications = json.dumps(state['specs'])
+    _insert_products(db, new_rows)
+    _insert_categories(db, new_categories)
+    _upsert_images(db, images)
+    if hashes:
+        # Хэш запоминается только для строк, записанных без ошибок
+        feed_hashes.store(db, {sku: value for sku, value in hashes.items()
+                               if sku in states and sku not in failed_skus})
+    db.info[feed_hashes.FEED_IMPORT_FLAG] = True
+    try:
+        db.commit()
+    finally:
+        db.info.pop(feed_hashes.FEED_IMPORT_FLAG, None)
+
+    # Цены пачки - одной записью
+    price_storage.update_prices(new_prices)
+    return report
+
+
+def upsert_products(db: Session, file_content: bytes, chunk_size: Optional[int] = None,
+                    progress: Optional[Callable] = None, dry_run: bool = False) -> dict:
+    """
+    Обновить товары по SKU или добавить новые (лист "Товары") и записать лист "Изображения"
+    Возвращает счетчики и rows - отчет по строкам: created / updated (с changes) / error / removed
+    (строки без изменений только считаются в unchanged). removed - SKU, загруженные прежними
+    фидами, которых нет в этом файле; они только попадают в отчет, товары не удаляются.
+    dry_run - сравнить файл с базой и вернуть отчет, ничего не записывая
+    """
+    chunk_size = chunk_size or Config.EXCEL_IMPORT_CHUNK_SIZE
+    feed_hashes.ensure_table(db.get_bind())
+    excel_handler = ExcelHandler()
+    wb = excel_handler.open_workbook(file_content)
+    try:
+        report = {"added": 0, "updated": 0, "unchanged": 0, "removed": 0, "categories_added": 0,
+                  "errors": [], "rows": []}
+        categories = _CategoryRegistry(db)
+        # В dry_run новые товары не попадают в базу - следующие пачки узнают о них отсюда
+        created_skus = set()
+        # SKU файла: повторы строк и товары, которых нет в файле (removed)
+        seen_skus = set()
+        total_processed = 0
+
+        for chunk in _chunks(excel_handler.iter_products(wb, report["errors"]), chunk_size):
+            total_processed += len(chunk)
+            try:
+                pending, skipped, hashes = _split_unchanged(db, chunk, seen_skus)
+                report["unchanged"] += skipped
+                if not pending:
+                    db.rollback()
+                    chunk_report = {}
+                else:
+                    chunk_report = _upsert_chunk(db, pending, categories, dry_run, created_skus, hashes)
+            except Exception as e:
+                db.rollback()
+                categories = _CategoryRegistry(db)
+                report["errors"].append(f"{_rows_label(chunk)}: {str(e)}")
+                report["rows"].extend({'row': number, 'sku': product_data.get('sku'), 'action': 'error', 'error': str(e)}
+                                      for number, product_data in chunk)
+            else:
+                for key, value in chunk_report.items():
+                    report[key] += value
+            if progress:
+                progress(total_processed, report["errors"])
+
+        for sku in feed_hashes.iter_skus(db):
+            if sku not in seen_skus:
+                report["removed"] += 1
+                report["rows"].append({'row': None, 'sku': sku, 'action': 'removed'})
+        db.rollback()
+
+        images_result = {"images_added": 0, "images_updated": 0, "images_errors": []}
+        if 'Изображения' in wb.sheetnames:
+            images_errors = []
+            try:
+                images_result = _import_images(db, excel_handler.iter_images(wb, images_errors), chunk_size,
+                                               dry_run=dry_run)
+            except ValueError as e:
+                print(f"Предупреждение: Не удалось загрузить изображения: {e}")
+            images_result["images_errors"] = images_errors + images_result["images_errors"]
+
+        return {
+            **report,
+            "dry_run": dry_run,
+            "total_processed": total_processed,
+            **images_result
+        }
+    finally:
+        wb.close()
+
+
+# --- Цены (лист "Цены") ---
+
+def _prices_chunk(db: Session, chunk: List[Tuple[int, dict]], report: dict, dry_run: bool) -> None:
+    """Сравнить цены пачки с price_storage и записать отличающиеся одной записью"""
+    skus = {price_data['sku'] for _, price_data in chunk}
+    known = {sku for (sku,) in db.query(Product.sku).filter(Product.sku.in_(skus))}
+    current = price_storage.get_prices(known)
+    new_prices = {}
+
+    for number, price_data in chunk:
+        sku = price_data['sku']
+        if sku not in known:
+            report['errors'].append(f"Строка {number}: Товар с SKU '{sku}' не найден")
+            continue
+        price = price_data['price']
+        if not price:
+            report['errors'].append(f"Строка {number}: price обязательна")
+            continue
+        existing = new_prices.get(sku) or current.get(sku)
+        old_price = price_data['old_price']
+        if existing and existing.get('price') == price and existing.get('currency') == price_data['currency']:
+            # Цена та же: без старой цены в файле скидка товара сохраняется,
+            # старая цена, равная новой, явно убирает скидку
+            if old_price is None or old_price == existing.get('old_price'):
+                report['unchanged'] += 1
+                continue
+        elif old_price is None:
+            # Цена изменилась - старой ценой становится прежняя цена товара
+            old_price = existing['price'] if existing else price
+        new_prices[sku] = {
+            'price': price,
+            'old_price': old_price,
+            'currency': price_data['currency'],
+            'is_parse': existing.get('is_parse', True) if existing else True
+        }
+        report['updated'] += 1
+        report['rows'].append({'row': number, 'sku': sku, 'action': 'updated' if existing else 'created',
+                               'price': [existing.get('price') if existing else None, price]})
+
+    # Чтение завершено - не держим транзакцию между пачками
+    db.rollback()
+    if new_prices and not dry_run:
+        price_storage.update_prices(new_prices)
+
+
+def import_prices(db: Session, file_content: bytes, chunk_size: Optional[int] = None,
+                  progress: Optional[Callable] = None, dry_run: bool = False) -> dict:
+    """
+    Обновить цены товаров из листа "Цены" по SKU
+    В price_storage записываются только отличающиеся цены (одна запись на пачку),
+    rows - отчет по измененным строкам; dry_run - только отчет, без записи
+    """
+    chunk_size = chunk_size or Config.EXCEL_IMPORT_CHUNK_SIZE
+    excel_handler = ExcelHandler()
+    wb = excel_handler.open_workbook(file_content)
+    try:
+        report = {"updated": 0, "unchanged": 0, "errors": [], "rows": []}
+        total_processed = 0
+        for chunk in _chunks(excel_handler.iter_prices(wb, report["errors"]), chunk_size):
+            total_processed += len(chunk)
+            _prices_chunk(db, chunk, report, dry_run)
+            if progress:
+                progress(total_processed, report["errors"])
+        return {**report, "dry_run": dry_run, "total_processed": total_processed}
+    finally:
+        wb.close()
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Фасетные фильтры каталога (/facets)
+
+Инвертированный индекс в памяти процесса: у каждого товара есть номер, у каждого
+значения атрибута (level_0, level_1, level_2, brand, color, disk, ram, sim_config) -
+битовая карта товаров с этим значением (Python int, бит N - товар N).
+Фильтр - AND битовых карт, число товаров - popcount, поэтому все фасеты
+для состояния фильтров считаются без обращения к базе.
+
+Счетчики значений атрибута считаются с учетом всех фильтров, кроме фильтра
+по самому атрибуту: выбранный цвет не скрывает остальные цвета.
+
+Индекс строится при первом запросе и дальше обновляется по изменениям:
+товары - после commit в этом процессе, цены - через price_storage.
+Если поколение каталога (catalog_generation) изменил другой процесс,
+индекс перестраивается целиком при следующем запросе.
+"""
+
+import logging
+import threading
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import Product
+import catalog_generation
+import price_storage
+from change_tracking import before_generation_bump, flushed_objects
+
+logger = logging.getLogger(__name__)
+
+# Атрибуты товара, по которым строятся фасеты (ключ ответа -> колонка Product)
+FACET_ATTRIBUTES = {
+    'level_0': Product.level_0,
+    'level_1': Product.level_1,
+    'level_2': Product.level_2,
+    'brand': Product.brand,
+    'color': Product.color,
+    'disk': Product.disk,
+    'ram': Product.ram,
+    'sim_config': Product.sim_config,
+}
+
+
+def _bitmap(docs: Iterable[int]) -> int:
+    """Битовая карта из номеров товаров"""
+    docs = list(docs)
+    if not docs:
+        return 0
+    data = bytearray(max(docs) // 8 + 1)
+    for doc in docs:
+        data[doc >> 3] |= 1 << (doc & 7)
+    return int.from_bytes(data, 'little')
+
+
+class FacetIndex:
+    """Битовые карты значений атрибутов и цены товаров"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._ready = False
+        self._generation = None
+        self._reset()
+
+    def _reset(self) -> None:
+        self._doc_by_id: Dict[int, int] = {}
+        self._doc_by_sku: Dict[str, int] = {}
+        self._skus: List[str] = []
+        self._doc_values: List[Optional[dict]] = []
+        self._bitmaps: Dict[str, Dict[str, int]] = {attr: {} for attr in FACET_ATTRIBUTES}
+        self._alive = 0
+        self._prices: List[Optional[float]] = []
+        # Отсортированные (цена, номер) для фильтра по диапазону, строятся по требованию
+        self._price_order = None
+
+    # --- Построение и обновление ---
+
+    def _add_doc(self, product_id: int, sku: str, values: dict, price: Optional[float]) -> None:
+        doc = len(self._doc_values)
+        self._doc_by_id[product_id] = doc
+        self._doc_by_sku[sku] = doc
+        self._skus.append(sku)
+        self._doc_values.append(values)
+        self._prices.append(price)
+        bit = 1 << doc
+        self._alive |= bit
+        for attr, value in values.items():
+            if value:
+                bitmaps = self._bitmaps[attr]
+                bitmaps[value] = bitmaps.get(value, 0) | bit
+
+    def _remove_doc(self, doc: int) -> None:
+        values = self._doc_values[doc]
+        if values is None:
+            return
+        mask = ~(1 << doc)
+        self._alive &= mask
+        for attr, value in values.items():
+            bitmaps = self._bitmaps[attr]
+            if value in bitmaps:
+                bitmaps[value] &= mask
+                if not bitmaps[value]:
+                    del bitmaps[value]
+        if self._doc_by_sku.get(self._skus[doc]) == doc:
+            del self._doc_by_sku[self._skus[doc]]
+        self._doc_values[doc] = None
+        self._prices[doc] = None
+        self._price_order = None
+
+    def _load_rows(self, db: Session, product_ids: Optional[set] = None):
+        columns = [Product.id, Product.sku] + list(FACET_ATTRIBUTES.values())
+        # Как и /hierarchy, учитываются только товары в наличии
+        query = db.query(*columns).filter(Product.is_available == True)
+        if product_ids is not None:
+            query = query.filter(Product.id.in_(product_ids))
+        for row in query:
+            yield row[0], row[1], dict(zip(FACET_ATTRIBUTES, row[2:]))
+
+    def rebuild(self, db: Session) -> int:
+        """Построить индекс заново по всем товарам"""
+        # Поколение читается до загрузки: изменения во время загрузки вызовут повторную сборку
+        generation = catalog_generation.current()
+        rows = list(self._load_rows(db))
+        prices = price_storage.get_prices(sku for _, sku, _ in rows)
+
+        with self._lock:
+            self._reset()
+            docs_by_value = {attr: {} for attr in FACET_ATTRIBUTES}
+            for doc, (product_id, sku, values) in enumerate(rows):
+                self._doc_by_id[product_id] = doc
+                self._doc_by_sku[sku] = doc
+                self._skus.append(sku)
+                self._doc_values.append(values)
+                price_data = prices.get(sku)
+                self._prices.append(price_data.get('price') if price_data else None)
+                for attr, value in values.items():
+                    if value:
+                        docs_by_value[attr].setdefault(value, []).append(doc)
+            self._bitmaps = {
+                attr: {value: _bitmap(docs) for value, docs in values.items()}
+                for attr, values in docs_by_value.items()
+            }
+            self._alive = (1 << len(rows)) - 1
+            self._generation = generation
+            self._ready = True
+        return len(rows)
+
+    def update_products(self, db: Session, product_ids: set) -> None:
+        """Переиндексировать товары по id (удаленные и снятые с продажи - убрать из индекса)"""
+        rows = list(self._load_rows(db, product_ids))
+        prices = price_storage.get_prices(sku for _, sku, _ in rows)
+        with self._lock:
+            if not self._ready:
+                return
+            # Номера удаленных товаров не переиспользуются; их соберет следующая перестройка
+            for product_id in product_ids:
+                doc = self._doc_by_id.pop(product_id, None)
+                if doc is not None:
+                    self._remove_doc(doc)
+            for product_id, sku, values in rows:
+                price_data = prices.get(sku)
+                self._add_doc(product_id, sku, values, price_data.get('price') if price_data else None)
+            self._price_order = None
+
+    def update_prices(self, skus: Iterable[str]) -> None:
+        """Обновить цены товаров после изменения в price_storage"""
+        with self._lock:
+            if not self._ready:
+                return
+            docs = {sku: self._doc_by_sku[sku] for sku in skus if sku in self._doc_by_sku}
+        if not docs:
+            return
+        prices = price_storage.get_prices(docs)
+        with self._lock:
+            for sku, doc in docs.items():
+                if self._doc_values[doc] is not None:
+                    price_data = prices.get(sku)
+                    self._prices[doc] = price_data.get('price') if price_data else None
+            self._price_order = None
+
+    def on_generation(self, generation: int) -> None:
+        """Подписчик catalog_generation: этот процесс увеличил поколение"""
+        with self._lock:
+            if self._generation is not None and generation == self._generation + 1:
+                # Изменение сделано в этом процессе - индекс обновят обработчики ниже
+                self._generation = generation
+
+    def invalidate(self) -> None:
+        """Сбросить индекс: следующий ensure() построит его заново"""
+        with self._lock:
+            self._ready = False
+
+    def ensure(self, db: Session) -> None:
+        """Построить индекс, если его нет или каталог менял другой процесс"""
+        generation = catalog_generation.current()
+        with self._lock:
+            fresh = self._ready and (generation is None or generation == self._generation)
+        if not fresh:
+            self.rebuild(db)
+
+    # --- Запросы ---
+
+    def _sorted_prices(self):
+        if self._price_order is None:
+            order = sorted((price, doc) for doc, price in enumerate(self._prices) if price is not None)
+            self._price_order = ([price for price, _ in order], [doc for _, doc in order])
+        return self._price_order
+
+    def _price_bitmap(self, price_min: Optional[float], price_max: Optional[float]) -> int:
+        prices, docs = self._sorted_prices()
+        start = bisect_left(prices, price_min) if price_min is not None else 0
+        end = bisect_right(prices, price_max) if price_max is not None else len(prices)
+        return _bitmap(docs[start:end])
+
+    def _price_range(self, bitmap: int) -> dict:
+        """Минимальная и максимальная цена товаров битовой карты"""
+        prices, docs = self._sorted_prices()
+        data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+
+        def contains(doc: int) -> bool:
+            return (doc >> 3) < len(data) and bool(data[doc >> 3] & (1 << (doc & 7)))
+
+        low = next((i for i in range(len(docs)) if contains(docs[i])), None)
+        if low is None:
+            return {'min': None, 'max': None}
+        high = next(i for i in range(len(docs) - 1, low - 1, -1) if contains(docs[i]))
+        return {'min': prices[low], 'max': prices[high]}
+
+    def facets(self, filters: Dict[str, Optional[str]], price_min: Optional[float] = None,
+               price_max: Optional[float] = None) -> dict:
+        """
+        Значения всех фасетов с числом товаров для состояния фильтров
+        filters - {атрибут: выбранное значение или None}
+        """
+        with self._lock:
+            selected = {attr: value for attr, value in filters.items() if value}
+            masks = {attr: self._bitmaps[attr].get(value, 0) for attr, value in selected.items()}
+            if price_min is not None or price_max is not None:
+                masks['price'] = self._price_bitmap(price_min, price_max)
+
+            def combined(exclude: Optional[str] = None) -> int:
+                result = self._alive
+                for attr, mask in masks.items():
+                    if attr != exclude:
+                        result &= mask
+                return result
+
+            facets = {}
+            for attr, bitmaps in self._bitmaps.items():
+                base = combined(attr)
+                values = []
+                for value, bitmap in bitmaps.items():
+                    count = (bitmap & base).bit_count()
+                    if count or value == selected.get(attr):
+                        values.append({'value': value, 'count': count})
+                values.sort(key=lambda item: item['value'])
+                facets[attr] = values
+
+            return {
+                'total': combined().bit_count(),
+                'facets': facets,
+                # Диапазон цен товаров с учетом всех фильтров, кроме самой цены
+                'price': self._price_range(combined('price')),
+            }
+
+
+facet_index = FacetIndex()
+catalog_generation.add_bump_listener(facet_index.on_generation)
+
+
+def _update_in_new_session(bind, product_ids: set) -> None:
+    """Переиндексировать товары в отдельной сессии; при ошибке индекс перестроится целиком"""
+    db = Session(bind=bind)
+    try:
+        facet_index.update_products(db, product_ids)
+    except Exception as e:
+        facet_index.invalidate()
+        logger.warning(f"⚠️ Не удалось обновить фасеты: {e}")
+    finally:
+        db.close()
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_product_changes(session, flush_context):
+    """Запомнить товары, измененные в этой транзакции"""
+    product_ids = {obj.id for obj in flushed_objects(session, flush_context)
+                   if isinstance(obj, Product) and obj.id is not None}
+    if product_ids:
+        session.info.setdefault('facet_product_ids', set()).update(product_ids)
+
+
+def mark_products_changed(session: Session, product_ids: Iterable[int]) -> None:
+    """Отметить товары, записанные в обход ORM (core INSERT); индекс обновится после commit"""
+    session.info.setdefault('facet_product_ids', set()).update(product_ids)
+
+
+@before_generation_bump
+def _update_after_commit(session):
+    changed = session.info.pop('facet_product_ids', set())
+    if changed:
+        _update_in_new_session(session.get_bind(), changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_product_changes(session):
+    session.info.pop('facet_product_ids', None)
+
+
+price_storage.add_change_listener(facet_index.update_prices)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Хэши строк фида товаров (feed_row_hashes)
+
+Для каждого SKU хранится sha1 содержимого строки фида, которая последней была
+записана в товар (все поля строки, кроме цены - цены сравниваются напрямую
+с price_storage). При повторной загрузке фида строка с тем же хэшем и той же
+ценой пропускается без чтения товара из базы, поэтому фид без изменений
+почти ничего не стоит.
+
+Если товар изменили не импортом фида (админка, скрипты), его хэш удаляется
+в той же транзакции - следующая загрузка фида сравнит строку с базой полностью.
+"""
+
+import hashlib
+import json
+import threading
+from typing import Dict, Iterable, Iterator
+
+from sqlalchemy import delete, event, inspect
+from sqlalchemy.orm import Session
+
+from models import Product, FeedRowHash
+
+# Поля строки, которые не входят в хэш
+PRICE_KEYS = ('price', 'old_price', 'currency', 'is_parse')
+
+# Флаг session.info: изменения товаров в этой транзакции сделаны импортом фида
+FEED_IMPORT_FLAG = 'feed_import'
+
+_lock = threading.Lock()
+_table_ready = False
+
+
+def ensure_table(bind) -> None:
+    """Создать таблицу feed_row_hashes, если её нет (один раз на процесс)"""
+    global _table_ready
+    if _table_ready:
+        return
+    with _lock:
+        if not _table_ready:
+            FeedRowHash.__table__.create(bind=bind, checkfirst=True)
+            _table_ready = True
+
+
+def row_hash(product_data: dict) -> str:
+    """sha1 содержимого строки фида без цены"""
+    content = {key: value for key, value in product_data.items() if key not in PRICE_KEYS}
+    payload = json.dumps(content, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def load(db: Session, skus: Iterable[str]) -> Dict[str, str]:
+    """Сохраненные хэши SKU - одним запросом"""
+    skus = set(skus)
+    if not skus:
+        return {}
+    return dict(db.query(FeedRowHash.sku, FeedRowHash.row_hash).filter(FeedRowHash.sku.in_(skus)))
+
+
+def store(db: Session, hashes: Dict[str, str]) -> None:
+    """Записать хэши в текущую транзакцию"""
+    if not hashes:
+        return
+    existing = {row.sku: row for row in db.query(FeedRowHash).filter(FeedRowHash.sku.in_(hashes))}
+    for sku, value in hashes.items():
+        row = existing.get(sku)
+        if row is None:
+            db.add(FeedRowHash(sku=sku, row_hash=value))
+        elif row.row_hash != value:
+            row.row_hash = value
+
+
+def forget(db: Session, skus: Iterable[str]) -> None:
+    """Удалить хэши - строки этих SKU будут сравнены с базой полностью"""
+    skus = set(skus)
+    if skus:
+        db.execute(delete(FeedRowHash).where(FeedRowHash.sku.in_(skus)))
+
+
+def iter_skus(db: Session) -> Iterator[str]:
+    """Все SKU, загруженные из фида"""
+    for (sku,) in db.query(FeedRowHash.sku).yield_per(1000):
+        yield sku
+
+
+@event.listens_for(Session, "after_flush")
+def _forget_changed_products(session, flush_context):
+    """Товар изменен не импортом фида - его строка фида больше не совпадает с базой"""
+    if session.info.get(FEED_IMPORT_FLAG):
+        return
+    skus = set()
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Product) and obj.sku:
+            skus.add(obj.sku)
+            # SKU мог измениться - прежний хэш тоже не действителен
+            skus.update(value for value in inspect(obj).attrs.sku.history.deleted if value)
+    if not skus:
+        return
+    connection = session.connection()
+    if not _table_ready and not inspect(connection).has_table(FeedRowHash.__tablename__):
+        return
+    connection.execute(delete(FeedRowHash.__table__).where(FeedRowHash.__table__.c.sku.in_(skus)))
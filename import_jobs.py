@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Фоновые задачи импорта Excel
+
+Endpoints импорта сохраняют загруженный файл в IMPORT_JOBS_DIR, создают запись
+import_jobs и сразу возвращают ее id. Сам импорт выполняется в пуле потоков
+(IMPORT_JOB_WORKERS), а не в async обработчике: синхронная работа SQLAlchemy
+больше не останавливает event loop и остальные запросы магазина.
+Ход выполнения, ошибки строк и итог отдает /api/jobs/{id}.
+
+Задачу выполняет процесс, который первым перевел ее из queued в running
+(UPDATE ... WHERE status = 'queued'), поэтому несколько процессов API не
+выполнят одну задачу дважды. recover_jobs() при запуске ставит в пул задачи,
+оставшиеся в очереди, а задачи, процесс которых завершился, помечает прерванными.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import update
+
+from config import Config
+from database import SessionLocal, engine
+from models import ImportJob
+
+# Исполнители по типу задачи: runner(db, file_content, progress) -> dict итога
+_runners: Dict[str, Callable] = {}
+
+_executor: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+_table_ready = False
+
+# Ход выполнения записывается в import_jobs не чаще, чем раз в столько секунд
+PROGRESS_INTERVAL = 1.0
+
+
+def _get_jobs_dir() -> str:
+    """Получить полный путь к каталогу файлов задач"""
+    if os.path.isabs(Config.IMPORT_JOBS_DIR):
+        return Config.IMPORT_JOBS_DIR
+    # Относительный путь от директории проекта
+    project_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(project_dir, Config.IMPORT_JOBS_DIR)
+
+
+def _ensure_table() -> None:
+    """Создать таблицу import_jobs, если её нет (один раз на процесс)"""
+    global _table_ready
+    if _table_ready:
+        return
+    with _lock:
+        if not _table_ready:
+            ImportJob.__table__.create(bind=engine, checkfirst=True)
+            _table_ready = True
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(1, Config.IMPORT_JOB_WORKERS),
+                                           thread_name_prefix="import-job")
+        return _executor
+
+
+def register_runner(kind: str, runner: Callable) -> None:
+    """Зарегистрировать исполнитель задач типа kind"""
+    _runners[kind] = runner
+
+
+def _update_job(job_id: str, **values) -> None:
+    db = SessionLocal()
+    try:
+        db.execute(update(ImportJob).where(ImportJob.id == job_id).values(updated_at=datetime.utcnow(), **values))
+        db.commit()
+    finally:
+        db.close()
+
+
+class JobProgress:
+    """
+    Ход выполнения задачи, передается исполнителю: progress(processed, errors)
+    Вызывать между транзакциями импорта (после commit): запись идет в отдельной сессии
+    """
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.processed = 0
+        self.errors: List[str] = []
+        self._written_at = 0.0
+
+    def __call__(self, processed: int, errors: Optional[List[str]] = None) -> None:
+        self.processed = processed
+        if errors is not None:
+            self.errors = errors
+        now = time.monotonic()
+        if now - self._written_at < PROGRESS_INTERVAL:
+            return
+        self._written_at = now
+        try:
+            _update_job(self.job_id, processed=processed, errors=json.dumps(self.errors, ensure_ascii=False))
+        except Exception as e:
+            # Ход выполнения не должен прерывать импорт
+            print(f"⚠️ Не удалось записать ход задачи импорта {self.job_id}: {e}")
+
+
+def _remove_file(file_path: Optional[str]) -> None:
+    if not file_path:
+        return
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"⚠️ Не удалось удалить файл задачи {file_path}: {e}")
+
+
+def submit_job(kind: str, filename: str, file_content: bytes) -> str:
+    """Сохранить файл, поставить задачу в очередь и вернуть ее id"""
+    if kind not in _runners:
+        raise ValueError(f"Неизвестный тип задачи импорта: {kind}")
+    _ensure_table()
+
+    job_id = uuid.uuid4().hex
+    jobs_dir = _get_jobs_dir()
+    os.makedirs(jobs_dir, exist_ok=True)
+    file_path = os.path.join(jobs_dir, job_id + os.path.splitext(filename or "")[1].lower())
+    with open(file_path, 'wb') as f:
+        f.write(file_content)
+
+    db = SessionLocal()
+    try:
+        db.add(ImportJob(id=job_id, kind=kind, status="queued", filename=filename, file_path=file_path))
+        db.commit()
+    except Exception:
+        _remove_file(file_path)
+        raise
+    finally:
+        db.close()
+
+    _get_executor().submit(_run_job, job_id)
+    return job_id
+
+
+def _claim_job(job_id: str) -> Optional[ImportJob]:
+    """Перевести задачу из queued в running; None - если ее уже забрал другой процесс"""
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        claimed = db.execute(
+            update(ImportJob)
+            .where(ImportJob.id == job_id, ImportJob.status == "queued")
+            .values(status="running", worker_pid=os.getpid(), started_at=now, updated_at=now)
+        ).rowcount
+        db.commit()
+        if not claimed:
+            return None
+        job = db.get(ImportJob, job_id)
+        db.expunge(job)
+        return job
+    finally:
+        db.close()
+
+
+def _run_job(job_id: str) -> None:
+    """Выполнить задачу в потоке пула"""
+    try:
+        job = _claim_job(job_id)
+    except Exception as e:
+        print(f"❌ Не удалось запустить задачу импорта {job_id}: {e}")
+        return
+    if job is None:
+        return
+
+    progress = JobProgress(job_id)
+    db = SessionLocal()
+    try:
+        runner = _runners.get(job.kind)
+        if runner is None:
+            raise ValueError(f"Неизвестный тип задачи импорта: {job.kind}")
+        with open(job.file_path, 'rb') as f:
+            file_content = f.read()
+        result = runner(db, file_content, progress)
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Задача импорта {job_id} ({job.kind}) завершилась с ошибкой: {e}")
+        _finish_job(job_id, "failed", progress.processed, progress.errors, error=str(e))
+    else:
+        _finish_job(job_id, "done", result.get("total_processed", progress.processed),
+                    result.get("errors", progress.errors), result=result)
+        print(f"✅ Задача импорта {job_id} ({job.kind}) выполнена")
+    finally:
+        db.close()
+        _remove_file(job.file_path)
+
+
+def _finish_job(job_id: str, status: str, processed: int, errors: List[str],
+                result: Optional[dict] = None, error: Optional[str] = None) -> None:
+    try:
+        _update_job(
+            job_id,
+            status=status,
+            processed=processed or 0,
+            errors=json.dumps(errors or [], ensure_ascii=False),
+            result=json.dumps(result, ensure_ascii=False, default=str) if result is not None else None,
+            error=error,
+            finished_at=datetime.utcnow()
+        )
+    except Exception as e:
+        print(f"❌ Не удалось сохранить итог задачи импорта {job_id}: {e}")
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    """Состояние задачи для /api/jobs/{id}; None - если задачи нет"""
+    _ensure_table()
+    db = SessionLocal()
+    try:
+        job = db.get(ImportJob, job_id)
+        if job is None:
+            return None
+        errors = json.loads(job.errors or "[]")
+        return {
+            "id": job.id,
+            "kind": job.kind,
+            "status": job.status,
+            "filename": job.filename,
+            "processed": job.processed,
+            "errors_count": len(errors),
+            "errors": errors,
+            "result": json.loads(job.result) if job.result else None,
+            "error": job.error,
+            "created_at": job.created_at.isoformat() if job.created_at else None,
+            "started_at": job.started_at.isoformat() if job.started_at else None,
+            "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        }
+    finally:
+        db.close()
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    """Жив ли процесс, выполнявший задачу (этот процесс только что запущен и задач еще не выполняет)"""
+    if not pid or pid == os.getpid():
+        return False
+    if os.name == 'nt':
+        # os.kill на Windows завершает процесс - считаем его живым
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def recover_jobs() -> int:
+    """
+    Обработать задачи, оставшиеся после перезапуска; возвращает число задач, поставленных в пул
+    Удаляет завершенные задачи старше IMPORT_JOBS_KEEP_DAYS
+    """
+    _ensure_table()
+    db = SessionLocal()
+    try:
+        cutoff = datetime.utcnow() - timedelta(days=Config.IMPORT_JOBS_KEEP_DAYS)
+        db.query(ImportJob).filter(
+            ImportJob.status.in_(("done", "failed")), ImportJob.finished_at < cutoff
+        ).delete(synchronize_session=False)
+
+        # Часть пачек уже записана, повторный запуск дал бы ошибки "уже существует"
+        for job in db.query(ImportJob).filter(ImportJob.status == "running"):
+            if not _pid_alive(job.worker_pid):
+                job.status = "failed"
+                job.error = "Задача прервана перезапуском приложения"
+                job.finished_at = datetime.utcnow()
+                _remove_file(job.file_path)
+
+        queued = [job_id for (job_id,) in db.query(ImportJob.id).filter(ImportJob.status == "queued")
+                  .order_by(ImportJob.created_at)]
+        db.commit()
+    finally:
+        db.close()
+
+    for job_id in queued:
+        _get_executor().submit(_run_job, job_id)
+    if queued:
+        print(f"🔄 Задачи импорта из очереди поставлены в работу: {len(queued)}")
+    return len(queued)
@@ -8,7 +8,7 @@ from datetime import datetime
 from sqlalchemy.orm import Session
 from database import SessionLocal
 from models import Product
-from price_storage import get_price, set_price, get_all_prices
+from price_storage import get_price, set_price, get_price_table
 
 class ManualPriceManager:
     """Класс для ручного управления ценами через Excel файлы"""
@@ -133,12 +133,12 @@ class ManualPriceManager:
             # Получаем все товары
             products = db.query(Product).filter(Product.is_available == True).all()
             
-            # Получаем все цены из JSON файла
-            all_prices = get_all_prices()
+            # Все цены в колоночной таблице - запись собирается только для товаров в наличии
+            price_table = get_price_table()
             
             prices = []
             for product in products:
-                price_data = all_prices.get(product.sku)
+                price_data = price_table.get(product.sku)
                 if price_data:
                     prices.append({
                         'product_id': product.id,
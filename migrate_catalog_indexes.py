@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Скрипт для создания составных индексов каталога в существующей базе
+
+Создает индексы, объявленные в models.py, которых еще нет в базе
+(create_all не добавляет индексы в уже существующие таблицы), и обновляет
+статистику планировщика (ANALYZE). Повторный запуск безопасен.
+Проверка планов запросов: tests/test_query_plans.py
+"""
+
+import os
+import sys
+
+# Добавляем путь к проекту для импорта модулей
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import text
+
+from database import engine, ensure_variant_columns, ensure_indexes
+
+
+def migrate_catalog_indexes():
+    """
+    Создать недостающие индексы и обновить статистику планировщика
+    """
+    print("🔄 Создание индексов каталога...")
+    
+    try:
+        # Индексы атрибутов вариантов ссылаются на колонки из migrate_variant_columns.py
+        ensure_variant_columns()
+        created = ensure_indexes()
+        for name in created:
+            print(f"   ✅ {name}")
+        if not created:
+            print("   Все индексы уже созданы")
+        
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+        print("✅ Статистика планировщика обновлена (ANALYZE)")
+        
+    except Exception as e:
+        print(f"❌ Ошибка при создании индексов: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    migrate_catalog_indexes()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Скрипт для миграции цен из JSON файла в таблицу prices
+Обратный к migrate_prices_to_json.py. После миграции включите PRICES_BACKEND=db
+"""
+
+import os
+import sys
+
+# Добавляем путь к проекту для импорта модулей
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database import SessionLocal, create_tables
+from models import Price
+from price_storage import migrate_to_db, _get_prices_file_path
+
+
+def migrate_prices():
+    """
+    Мигрировать цены из JSON файла в БД
+    """
+    print("🔄 Начало миграции цен из JSON файла в БД...")
+    print(f"📄 Файл цен: {_get_prices_file_path()}")
+    
+    # Создаем таблицу prices, если ее нет
+    create_tables()
+    
+    db = SessionLocal()
+    
+    try:
+        migrated = migrate_to_db(db)
+        
+        if not migrated:
+            print("⚠️  В JSON файле нет цен для миграции")
+            return
+        
+        print(f"✅ Успешно мигрировано {migrated} записей в таблицу prices")
+        print(f"📊 Всего записей в таблице prices: {db.query(Price).count()}")
+        print("💡 Чтобы API читал цены из БД, установите PRICES_BACKEND=db")
+        
+    except Exception as e:
+        print(f"❌ Ошибка при миграции: {e}")
+        import traceback
+        traceback.print_exc()
+        db.rollback()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    migrate_prices()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Скрипт для переноса атрибутов варианта (color, disk, ram, sim_config) из
+specifications в отдельные индексированные колонки таблицы products
+
+Добавляет недостающие колонки и индексы и заполняет их для всех товаров.
+Повторный запуск безопасен. Дальше колонки поддерживаются приложением при
+каждой записи specifications.
+"""
+
+import os
+import sys
+
+# Добавляем путь к проекту для импорта модулей
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import func
+
+from database import SessionLocal, ensure_variant_columns
+from models import Product, VARIANT_FIELDS
+
+
+def migrate_variant_columns():
+    """
+    Добавить колонки атрибутов варианта и заполнить их из specifications
+    """
+    print("🔄 Перенос атрибутов вариантов из specifications в колонки products...")
+    
+    try:
+        filled = ensure_variant_columns(backfill_all=True)
+        print(f"✅ Заполнено товаров: {filled}")
+        
+        db = SessionLocal()
+        try:
+            for field in VARIANT_FIELDS:
+                column = getattr(Product, field)
+                values = db.query(func.count(func.distinct(column))).scalar()
+                filled_rows = db.query(func.count(column)).scalar()
+                print(f"   {field}: {filled_rows} товаров, {values} различных значений")
+        finally:
+            db.close()
+        
+    except Exception as e:
+        print(f"❌ Ошибка при миграции: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    migrate_variant_columns()
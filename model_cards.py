@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+"""
+Карточки моделей каталога (level_2 + brand)
+
+Расчёт данных карточки (минимальная цена, описание, изображения) и их
+материализация в таблице model_cards. Таблица обновляется инкрементально:
+- изменения Product / ProductImage / Level2Description через ORM - после commit сессии
+- изменения цен через price_storage - подписчиком на изменения цен
+- изменения из процессов, где модуль не импортирован (CLI manual_price_manager,
+  правка файла цен вручную), - полной пересборкой при следующем ensure_model_cards(),
+  если изменилось поколение каталога или сигнатура файлов цен (как FacetIndex.ensure)
+
+Полная пересборка: python rebuild_model_cards.py
+"""
+
+import json
+import threading
+from typing import Callable, List, Optional, Iterable
+
+from sqlalchemy import and_, or_, func, event
+from sqlalchemy.orm import Session
+
+from models import Product, ProductImage, Level2Description, ModelCard, Price
+from change_tracking import after_commit, flushed_objects, history_values, track_previous_values
+import catalog_generation
+import price_storage
+from price_storage import get_prices, is_db_backend
+
+# Сколько моделей пересчитывается за один проход (ограничивает размер IN списков)
+REFRESH_CHUNK_SIZE = 200
+
+# Подписчики на пересчет карточек: callback(model_keys) после commit
+_refresh_listeners: List[Callable[[List], None]] = []
+
+
+def _parse_img_list(img_list) -> List[str]:
+    """Разобрать JSON массив изображений из ProductImage.img_list"""
+    images = []
+    try:
+        images_data = json.loads(img_list)
+        
+        # Обработка double-encoded JSON (если после парсинга получили строку)
+        if isinstance(images_data, str):
+            images_data = json.loads(images_data)
+        
+        # Теперь обрабатываем массив
+        if isinstance(images_data, list):
+            for img_data in images_data:
+                if isinstance(img_data, dict):
+                    images.append(img_data["url"])
+                elif isinstance(img_data, str):
+                    images.append(img_data)
+    except (json.JSONDecodeError, TypeError):
+        pass
+    return images
+
+
+def get_product_images(product, db: Session, image_lists: Optional[dict] = None):
+    """
+    Получить массив изображений товара из таблицы ProductImage
+    image_lists - заранее загруженные img_list по (level_2, color), см. load_product_image_lists
+    """
+    # Сначала попробуем получить изображения из specifications
+    images = product.spec_images
+    
+    # Если не нашли в specifications, ищем в таблице ProductImage по (level_2, color)
+    if not images and product.level_2 and product.color:
+        if image_lists is not None:
+            img_list = image_lists.get((product.level_2, product.color))
+        else:
+            product_image = db.query(ProductImage).filter(
+                ProductImage.level_2 == product.level_2,
+                ProductImage.color == product.color
+            ).first()
+            img_list = product_image.img_list if product_image else None
+        
+        if img_list:
+            images = _parse_img_list(img_list)
+    
+    # Если изображений нет, вернем пустой список
+    return images
+
+
+def load_product_image_lists(db: Session, products) -> dict:
+    """Загрузить img_list для всех (level_2, color) списка товаров одним запросом"""
+    keys = {(product.level_2, product.color) for product in products if product.level_2 and product.color}
+    if not keys:
+        return {}
+    
+    rows = db.query(ProductImage.level_2, ProductImage.color, ProductImage.img_list).filter(
+        ProductImage.level_2.in_({level_2 for level_2, _ in keys}),
+        ProductImage.color.in_({color for _, color in keys})
+    ).all()
+    return {(level_2, color): img_list for level_2, color, img_list in rows if (level_2, color) in keys}
+
+
+def load_level2_descriptions(db: Session, products) -> dict:
+    """Загрузить описания level2_descriptions для всех моделей списка товаров одним запросом"""
+    levels = {product.level_2 for product in products if product.level_2}
+    if not levels:
+        return {}
+    
+    rows = db.query(Level2Description).filter(Level2Description.level_2.in_(levels)).all()
+    return {row.level_2: row for row in rows}
+
+
+def _model_keys_filter(model_keys):
+    """Фильтр товаров по набору моделей (level_2, brand); может вернуть лишние строки"""
+    levels = {level_2 for level_2, _ in model_keys if level_2 is not None}
+    brands = {brand for _, brand in model_keys}
+    level_filter = Product.level_2.in_(levels)
+    if any(level_2 is None for level_2, _ in model_keys):
+        level_filter = or_(level_filter, Product.level_2.is_(None))
+    return and_(Product.brand.in_(brands), level_filter)
+
+
+def _query_model_min_prices(db: Session, model_keys) -> dict:
+    """
+    Минимальная цена каждой модели одним GROUP BY запросом (PRICES_BACKEND=db)
+    Возвращает {(level_2, brand): {price, old_price, currency}} варианта с минимальной ценой
+    """
+    keys_filter = _model_keys_filter(model_keys)
+    min_prices = db.query(
+        Product.level_2.label('level_2'),
+        Product.brand.label('brand'),
+        func.min(Price.price).label('min_price')
+    ).join(Price, Price.sku == Product.sku).filter(keys_filter).group_by(Product.level_2, Product.brand).subquery()
+    
+    # Возвращаемся к варианту с минимальной ценой за old_price и валютой
+    rows = db.query(
+        Product.level_2, Product.brand, Price.price, Price.old_price, Price.currency
+    ).join(Price, Price.sku == Product.sku).join(min_prices, and_(
+        min_prices.c.brand == Product.brand,
+        Product.level_2.is_not_distinct_from(min_prices.c.level_2),
+        min_prices.c.min_price == Price.price
+    )).filter(keys_filter).order_by(Product.id).all()
+    
+    best = {}
+    for level_2, brand, price, old_price, currency in rows:
+        key = (level_2, brand)
+        if key in model_keys and key not in best:
+            best[key] = {'price': price, 'old_price': old_price, 'currency': currency or 'RUB'}
+    return best
+
+
+def _fold_model_min_prices(db: Session, model_keys) -> dict:
+    """
+    Минимальная цена каждой модели по снимку цен (PRICES_BACKEND=json)
+    Варианты всех моделей загружаются одним запросом
+    """
+    variants = db.query(Product.level_2, Product.brand, Product.sku).filter(
+        _model_keys_filter(model_keys)
+    ).order_by(Product.id).all()
+    variants = [row for row in variants if (row.level_2, row.brand) in model_keys]
+    prices = get_prices(row.sku for row in variants)
+    
+    best = {}
+    for level_2, brand, sku in variants:
+        variant_price = prices.get(sku)
+        if variant_price is None:
+            continue
+        key = (level_2, brand)
+        if key not in best or variant_price.get('price', 0.0) < best[key].get('price', 0.0):
+            best[key] = variant_price
+    return best
+
+
+def get_model_prices(db: Session, products) -> dict:
+    """
+    Цены карточек моделей: минимальная цена среди всех вариантов модели (level_2 + brand)
+    и old_price/валюта этого варианта
+    Возвращает {(level_2, brand): {price, old_price, discount_percentage, currency}}
+    """
+    model_keys = {(product.level_2, product.brand) for product in products}
+    if not model_keys:
+        return {}
+    
+    if is_db_backend():
+        best = _query_model_min_prices(db, model_keys)
+    else:
+        best = _fold_model_min_prices(db, model_keys)
+    
+    result = {}
+    for key in model_keys:
+        best_variant_price = best.get(key)
+        if best_variant_price is None:
+            result[key] = {
+                'price': 0.0,
+                'old_price': 0.0,
+                'discount_percentage': 0.0,
+                'currency': 'RUB'
+            }
+            continue
+        
+        min_price = best_variant_price.get('price', 0.0)
+        # Используем old_price от варианта с минимальной ценой; если не указан - price
+        min_old_price = best_variant_price.get('old_price') or min_price
+        
+        price_obj = {
+            'price': min_price,
+            'old_price': min_old_price,
+            'currency': best_variant_price.get('currency', 'RUB')
+        }
+        # Вычисляем discount_percentage
+        if min_old_price and min_old_price > min_price:
+            price_obj['discount_percentage'] = ((min_old_price - min_price) / min_old_price) * 100
+        else:
+            price_obj['discount_percentage'] = 0.0
+        result[key] = price_obj
+    return result
+
+
+def card_images(card: ModelCard) -> List[str]:
+    """Изображения материализованной карточки"""
+    return json.loads(card.images) if card.images else []
+
+
+def _chunks(items: List, size: int):
+    """Разбить список на части по size элементов"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _model_keys_for_levels(db: Session, levels: Iterable[str]) -> set:
+    """Все модели (level_2, brand) с указанными level_2"""
+    keys = set()
+    for chunk in _chunks(list(set(levels)), 500):
+        keys.update(
+            (level_2, brand) for level_2, brand in
+            db.query(Product.level_2, Product.brand).filter(Product.level_2.in_(chunk)).distinct()
+        )
+    return keys
+
+
+def _model_keys_for_skus(db: Session, skus: Iterable[str]) -> set:
+    """Модели (level_2, brand), к которым относятся SKU"""
+    keys = set()
+    for chunk in _chunks(list(set(skus)), 500):
+        keys.update(
+            (level_2, brand) for level_2, brand in
+            db.query(Product.level_2, Product.brand).filter(Product.sku.in_(chunk)).distinct()
+        )
+    return keys
+
+
+def _card_keys_filter(model_keys):
+    """Фильтр карточек по набору моделей (level_2, brand); может вернуть лишние строки"""
+    levels = {level_2 for level_2, _ in model_keys if level_2 is not None}
+    level_filter = ModelCard.level_2.in_(levels)
+    if any(level_2 is None for level_2, _ in model_keys):
+        level_filter = or_(level_filter, ModelCard.level_2.is_(None))
+    return and_(ModelCard.brand.in_({brand for _, brand in model_keys}), level_filter)
+
+
+def _fill_card(card: ModelCard, product: Product, price_obj: dict, level2_desc, images: List[str]) -> None:
+    """Записать в карточку данные представителя модели"""
+    card.product_id = product.id
+    card.sku = product.sku
+    card.name = product.name
+    card.level_0 = product.level_0
+    card.level_1 = product.level_1
+    card.specifications = product.specifications
+    card.description = (level2_desc.description or "") if level2_desc else ""
+    card.images = json.dumps(images, ensure_ascii=False)
+    card.price = price_obj.get('price', 0.0)
+    card.old_price = price_obj.get('old_price', 0.0)
+    card.discount_percentage = price_obj.get('discount_percentage', 0.0)
+    card.currency = price_obj.get('currency', 'RUB')
+
+
+def _refresh_chunk(db: Session, model_keys: set) -> None:
+    """Пересчитать карточки набора моделей (без commit)"""
+    rep_ids = [
+        rep_id for rep_id, level_2, brand in db.query(
+            func.min(Product.id), Product.level_2, Product.brand
+        ).filter(_model_keys_filter(model_keys)).group_by(Product.level_2, Product.brand)
+        if (level_2, brand) in model_keys
+    ]
+    representatives = db.query(Product).filter(Product.id.in_(rep_ids)).all() if rep_ids else []
+    
+    cards = {
+        (card.level_2, card.brand): card
+        for card in db.query(ModelCard).filter(_card_keys_filter(model_keys))
+        if (card.level_2, card.brand) in model_keys
+    }
+    
+    model_prices = get_model_prices(db, representatives)
+    descriptions = load_level2_descriptions(db, representatives)
+    image_lists = load_product_image_lists(db, representatives)
+    
+    for product in representatives:
+        key = (product.level_2, product.brand)
+        card = cards.pop(key, None)
+        if card is None:
+            card = ModelCard(level_2=product.level_2, brand=product.brand)
+            db.add(card)
+        _fill_card(
+            card,
+            product,
+            model_prices[key],
+            descriptions.get(product.level_2),
+            get_product_images(product, db, image_lists)
+        )
+    
+    # У оставшихся карточек больше нет товаров
+    for card in cards.values():
+        db.delete(card)
+
+
+def add_refresh_listener(callback: Callable[[List], None]) -> None:
+    """
+    Подписаться на пересчет карточек в этом процессе
+    callback получает список пересчитанных моделей (level_2, brand)
+    """
+    if callback not in _refresh_listeners:
+        _refresh_listeners.append(callback)
+
+
+def _notify_refreshed(model_keys: List) -> None:
+    """Уведомить подписчиков о пересчете карточек; ошибки подписчиков не влияют на пересчет"""
+    for callback in list(_refresh_listeners):
+        try:
+            callback(model_keys)
+        except Exception as e:
+            print(f"⚠️ Ошибка обработчика пересчета карточек: {e}")
+
+
+def refresh_model_cards(db: Session, model_keys: Optional[Iterable] = None) -> int:
+    """
+    Пересчитать карточки моделей и закоммитить
+    model_keys: набор (level_2, brand); None - полная пересборка таблицы
+    Возвращает количество пересчитанных моделей
+    """
+    if model_keys is None:
+        model_keys = set(db.query(Product.level_2, Product.brand).distinct())
+        # Удаляем карточки моделей, которых больше нет
+        for card in db.query(ModelCard).all():
+            if (card.level_2, card.brand) not in model_keys:
+                db.delete(card)
+    model_keys = list(set(model_keys))
+    
+    for chunk in _chunks(model_keys, REFRESH_CHUNK_SIZE):
+        _refresh_chunk(db, set(chunk))
+    db.commit()
+    _notify_refreshed(model_keys)
+    return len(model_keys)
+
+
+# Таблица проверена в этом процессе; поколение каталога и сигнатура файлов цен,
+# которым соответствуют карточки (изменения этого процесса учитывают обработчики ниже)
+_cards_ready = False
+_generation: Optional[int] = None
+_prices_signature: Optional[tuple] = None
+# RLock: пересборка увеличивает поколение, и on_generation вызывается под блокировкой
+_ready_lock = threading.RLock()
+
+
+def _is_fresh(generation: Optional[int], prices_signature: Optional[tuple]) -> bool:
+    return (_cards_ready and (generation is None or generation == _generation)
+            and prices_signature == _prices_signature)
+
+
+def ensure_model_cards(db: Session) -> None:
+    """
+    Создать таблицу model_cards, если её нет, и пересобрать карточки при первом
+    вызове в процессе и после изменений, сделанных другим процессом (поколение
+    каталога или файлы цен изменились не этим процессом)
+    """
+    global _cards_ready, _generation, _prices_signature
+    # Читаются до пересборки: изменения во время пересборки вызовут повторную
+    generation = catalog_generation.current()
+    prices_signature = price_storage.prices_signature()
+    if _is_fresh(generation, prices_signature):
+        return
+    
+    with _ready_lock:
+        if _is_fresh(generation, prices_signature):
+            return
+        ModelCard.__table__.create(bind=db.get_bind(), checkfirst=True)
+        # Поколение запоминается до commit пересборки: его увеличение примет on_generation
+        _generation, _prices_signature = generation, prices_signature
+        _cards_ready = True
+        try:
+            count = refresh_model_cards(db)
+        except Exception:
+            _cards_ready = False
+            raise
+        print(f"✅ Пересобраны карточки моделей: {count}")
+
+
+def on_generation(generation: int) -> None:
+    """Подписчик catalog_generation: этот процесс увеличил поколение"""
+    global _generation
+    with _ready_lock:
+        if _generation is not None and generation == _generation + 1:
+            # Изменение сделано в этом процессе - карточки пересчитают обработчики ниже
+            _generation = generation
+
+
+catalog_generation.add_bump_listener(on_generation)
+
+
+def _refresh_in_new_session(bind, collect_keys) -> None:
+    """
+    Пересчитать карточки в отдельной сессии
+    collect_keys(db) возвращает набор моделей для пересчёта
+    Ошибки не прерывают исходную операцию - карточки догонит следующая пересборка
+    """
+    db = Session(bind=bind)
+    try:
+        ensure_model_cards(db)
+        model_keys = collect_keys(db)
+        if model_keys:
+            refresh_model_cards(db, model_keys)
+    except Exception as e:
+        db.rollback()
+        print(f"⚠️ Не удалось обновить карточки моделей: {e}")
+    finally:
+        db.close()
+
+
+# Прежние level_2/brand - чтобы пересчитать и модель, из которой ушел товар
+track_previous_values(Product.level_2, Product.brand, ProductImage.level_2, Level2Description.level_2)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_catalog_changes(session, flush_context):
+    """Запомнить модели, затронутые изменениями в этой транзакции"""
+    objects = [obj for obj in flushed_objects(session, flush_context)
+               if isinstance(obj, (Product, ProductImage, Level2Description))]
+    if not objects:
+        return
+    changed_keys = session.info.setdefault('model_cards_keys', set())
+    changed_levels = session.info.setdefault('model_cards_levels', set())
+    
+    for obj in objects:
+        if isinstance(obj, Product):
+            # Учитываем и старую модель, если товар перенесли в другую
+            for level_2 in history_values(obj, 'level_2'):
+                for brand in history_values(obj, 'brand'):
+                    changed_keys.add((level_2, brand))
+        elif isinstance(obj, (ProductImage, Level2Description)):
+            changed_levels.update(level_2 for level_2 in history_values(obj, 'level_2') if level_2)
+
+
+def mark_models_changed(session: Session, model_keys: Iterable) -> None:
+    """
+    Отметить модели (level_2, brand), товары которых записаны в обход ORM (core INSERT)
+    Карточки пересчитаются после commit, как и при изменениях объектов сессии
+    """
+    session.info.setdefault('model_cards_keys', set()).update(model_keys)
+
+
+@after_commit
+def _refresh_after_commit(session):
+    """Пересчитать карточки моделей, изменённых в закоммиченной транзакции"""
+    changed_keys = session.info.pop('model_cards_keys', set())
+    changed_levels = session.info.pop('model_cards_levels', set())
+    if not changed_keys and not changed_levels:
+        return
+    
+    _refresh_in_new_session(
+        session.get_bind(),
+        lambda db: changed_keys | _model_keys_for_levels(db, changed_levels)
+    )
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_catalog_changes(session):
+    """Изменения откатились - пересчитывать нечего"""
+    session.info.pop('model_cards_keys', None)
+    session.info.pop('model_cards_levels', None)
+
+
+def _on_prices_changed(skus: List[str]) -> None:
+    """Подписчик price_storage: пересчитать карточки моделей с изменёнными ценами"""
+    global _prices_signature
+    from database import engine
+    with _ready_lock:
+        if _cards_ready:
+            # Цены записал этот процесс - полная пересборка не нужна
+            _prices_signature = price_storage.prices_signature()
+    _refresh_in_new_session(engine, lambda db: _model_keys_for_skus(db, skus))
+
+
+price_storage.add_change_listener(_on_prices_changed)
@@ -1,14 +1,39 @@
 #!/usr/bin/env python3
 """SQLAlchemy models for Yo Store app - Refactored Architecture"""
 
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean, Float, UniqueConstraint, ForeignKey
+from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean, Float, UniqueConstraint, ForeignKey, Index, event, func
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
 import json
 
 Base = declarative_base()
 
+# Атрибуты варианта, которые дублируются из specifications в колонки products
+VARIANT_FIELDS = ('color', 'disk', 'ram', 'sim_config')
+
+
+def parse_specifications(raw) -> dict:
+    """Разобрать specifications товара; некорректный JSON - пустой словарь"""
+    if not raw:
+        return {}
+    try:
+        specs = json.loads(raw) if isinstance(raw, str) else raw
+    except (json.JSONDecodeError, TypeError):
+        return {}
+    return specs if isinstance(specs, dict) else {}
+
+
+def variant_values(specs: dict) -> dict:
+    """Значения колонок варианта из specifications (None, если поле не задано)"""
+    values = {}
+    for field in VARIANT_FIELDS:
+        value = specs.get(field)
+        values[field] = str(value) if value not in (None, '') else None
+    return values
+
+
 class Product(Base):
     """
     Товары с уникальным SKU (только конкретные конфигурации)
@@ -32,43 +57,144 @@ class Product(Base):
     is_available = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Атрибуты варианта - копия полей specifications для фильтров и сортировки в SQL
+    # Заполняются при каждом присваивании specifications (см. _sync_variant_columns),
+    # для существующих баз - migrate_variant_columns.py
+    color_value = Column('color', String(100), index=True)
+    disk_value = Column('disk', String(50), index=True)
+    ram_value = Column('ram', String(50), index=True)
+    sim_config_value = Column('sim_config', String(100), index=True)
+    
+    # Составные индексы горячих фильтров (для существующих баз - migrate_catalog_indexes.py)
+    __table_args__ = (
+        # Группировка по моделям и фильтр по бренду; is_available - для DISTINCT brand без чтения таблицы
+        Index('ix_products_brand_level2', 'brand', 'level_2', 'is_available'),
+        # Категории и бренды категории (/categories, /hierarchy/brands?level0=)
+        Index('ix_products_level0_available', 'level_0', 'is_available', 'brand'),
+        # Иерархия: модели серии (/hierarchy/levels?level=2&parent_level1=)
+        Index('ix_products_level1_level2', 'level_1', 'level_2'),
+    )
+    
     @property
-    def color(self):
+    def specs(self) -> dict:
+        """
+        Разобранный specifications (только для чтения)
+        JSON разбирается один раз на экземпляр; кэш сбрасывается, как только
+        specifications присвоено новое значение или перечитано из базы
+        """
+        raw = self.specifications
+        cached = self.__dict__.get('_specs_cache')
+        if cached is not None and cached[0] is raw:
+            return cached[1]
+        specs = parse_specifications(raw)
+        self.__dict__['_specs_cache'] = (raw, specs)
+        return specs
+    
+    def get_spec(self, key: str) -> str:
+        """Строковое поле варианта из specifications ('' если не задано)"""
+        value = self.specs.get(key)
+        if value is None:
+            return ''
+        return value if isinstance(value, str) else str(value)
+    
+    def set_spec(self, key: str, value) -> None:
+        """Записать поле варианта в specifications"""
+        specs = dict(self.specs)
+        specs[key] = value
+        self.specifications = json.dumps(specs)
+    
+    # Поля варианта: у экземпляра читаются из specifications, в запросах - колонки
+    @hybrid_property
+    def color(self) -> str:
         """Извлечь цвет из specifications"""
-        if self.specifications:
-            try:
-                specs = json.loads(self.specifications) if isinstance(self.specifications, str) else self.specifications
-                return specs.get('color', '')
-            except (json.JSONDecodeError, TypeError):
-                return ''
-        return ''
+        return self.get_spec('color')
     
-    @property
-    def disk(self):
+    @color.setter
+    def color(self, value):
+        self.set_spec('color', value)
+    
+    @color.expression
+    def color(cls):
+        return cls.color_value
+    
+    @hybrid_property
+    def disk(self) -> str:
         """Извлечь объем памяти из specifications"""
-        if self.specifications:
-            try:
-                specs = json.loads(self.specifications) if isinstance(self.specifications, str) else self.specifications
-                return specs.get('disk', '')
-            except (json.JSONDecodeError, TypeError):
-                return ''
-        return ''
+        return self.get_spec('disk')
     
-    @property
-    def sim_config(self):
+    @disk.setter
+    def disk(self, value):
+        self.set_spec('disk', value)
+    
+    @disk.expression
+    def disk(cls):
+        return cls.disk_value
+    
+    @hybrid_property
+    def sim_config(self) -> str:
         """Извлечь конфигурацию SIM из specifications"""
-        if self.specifications:
-            try:
-                specs = json.loads(self.specifications) if isinstance(self.specifications, str) else self.specifications
-                return specs.get('sim_config', '')
-            except (json.JSONDecodeError, TypeError):
-                return ''
-        return ''
+        return self.get_spec('sim_config')
+    
+    @sim_config.setter
+    def sim_config(self, value):
+        self.set_spec('sim_config', value)
+    
+    @sim_config.expression
+    def sim_config(cls):
+        return cls.sim_config_value
+    
+    @hybrid_property
+    def ram(self) -> str:
+        """Извлечь объем оперативной памяти из specifications (ноутбуки)"""
+        return self.get_spec('ram')
+    
+    @ram.setter
+    def ram(self, value):
+        self.set_spec('ram', value)
+    
+    @ram.expression
+    def ram(cls):
+        return cls.ram_value
     
     @property
-    def memory(self):
+    def memory(self) -> str:
         """Алиас для disk (для обратной совместимости)"""
         return self.disk
+    
+    @property
+    def spec_images(self) -> list:
+        """URL изображений из specifications.images (строки или {"url": ...})"""
+        images = []
+        for img_data in self.specs.get('images', []) or []:
+            if isinstance(img_data, dict):
+                images.append(img_data["url"])
+            elif isinstance(img_data, str):
+                images.append(img_data)
+        return images
+
+@event.listens_for(Product.specifications, 'set')
+def _sync_variant_columns(target, value, oldvalue, initiator):
+    """Обновить колонки варианта при любом присваивании specifications"""
+    specs = parse_specifications(value)
+    # Разобранный JSON сразу кладем в кэш экземпляра (см. Product.specs)
+    target.__dict__['_specs_cache'] = (value, specs)
+    for field, field_value in variant_values(specs).items():
+        setattr(target, f'{field}_value', field_value)
+
+class Price(Base):
+    """
+    Текущие цены товаров (используется при PRICES_BACKEND=db)
+    Связь с товарами по SKU, без внешнего ключа - как и в current_prices.json
+    """
+    __tablename__ = "prices"
+    
+    sku = Column(String(50), primary_key=True)
+    price = Column(Float, nullable=False)
+    old_price = Column(Float, nullable=False)
+    currency = Column(String(10), nullable=False, default="RUB")
+    is_parse = Column(Boolean, nullable=False, default=True, index=True)  # Обновлять цену из внешнего сервиса
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class ProductImage(Base):
     """
@@ -117,6 +243,80 @@ class SkuVariant(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
+class ModelCard(Base):
+    """
+    Материализованные карточки моделей для витрины (/products)
+    Одна строка на (level_2, brand): представитель модели, минимальная цена,
+    описание и изображения. Поддерживается в актуальном состоянии модулем model_cards
+    """
+    __tablename__ = "model_cards"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    level_2 = Column(String(100))
+    brand = Column(String(100), nullable=False)
+    
+    # Представитель модели - товар с минимальным id
+    product_id = Column(Integer, nullable=False)
+    sku = Column(String(50), nullable=False)
+    name = Column(String(200), nullable=False)
+    level_0 = Column(String(100), nullable=False)
+    level_1 = Column(String(100))
+    specifications = Column(Text)  # JSON характеристик представителя
+    
+    description = Column(Text, nullable=False, default="")  # Из level2_descriptions
+    images = Column(Text, nullable=False, default="[]")  # JSON массив URL
+    
+    # Минимальная цена среди вариантов модели
+    price = Column(Float, nullable=False, default=0.0)
+    old_price = Column(Float, nullable=False, default=0.0)
+    discount_percentage = Column(Float, nullable=False, default=0.0)
+    currency = Column(String(10), nullable=False, default="RUB")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        UniqueConstraint('level_2', 'brand', name='uix_model_cards_level2_brand'),
+        # Порядок витрины: level_2 DESC, product_id
+        Index('ix_model_cards_grid', level_2.desc(), product_id),
+        Index('ix_model_cards_brand', brand, level_2.desc(), product_id),
+        Index('ix_model_cards_level0', level_0, level_2.desc(), product_id),
+    )
+
+class ImportJob(Base):
+    """
+    Фоновая задача импорта Excel (import_jobs)
+    Загруженный файл лежит в IMPORT_JOBS_DIR до завершения задачи,
+    поэтому задачи в очереди переживают перезапуск приложения
+    """
+    __tablename__ = "import_jobs"
+    
+    id = Column(String(32), primary_key=True)  # uuid4 hex
+    kind = Column(String(50), nullable=False)  # products, update_or_create, prices, prices_simple, images
+    status = Column(String(20), nullable=False, default="queued", index=True)  # queued, running, done, failed
+    filename = Column(String(255))
+    file_path = Column(String(500))
+    worker_pid = Column(Integer)  # Процесс, выполняющий задачу
+    
+    processed = Column(Integer, nullable=False, default=0)  # Обработано строк
+    errors = Column(Text, nullable=False, default="[]")  # JSON массив ошибок строк
+    result = Column(Text)  # JSON итог импорта
+    error = Column(Text)  # Ошибка, из-за которой задача не выполнена
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class FeedRowHash(Base):
+    """
+    Хэш содержимого строки фида, последней записанной в товар (feed_row_hashes)
+    По нему повторная загрузка фида пропускает строки без изменений (см. feed_hashes.py)
+    """
+    __tablename__ = "feed_row_hashes"
+
+    sku = Column(String(50), primary_key=True)
+    row_hash = Column(String(40), nullable=False)  # sha1 hex
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class Level2Description(Base):
     """
     Описания и характеристики для level_2 (моделей товаров)
@@ -130,6 +330,11 @@ class Level2Description(Base):
     details = Column(Text, nullable=False)  # JSON с характеристиками (процессор, память, экран и т.д.)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        # /level2-descriptions/{level_2} ищет без учета регистра
+        Index('ix_level2_descriptions_level2_lower', func.lower(level_2)),
+    )
 
 class PromoCode(Base):
     """
@@ -175,7 +380,7 @@ class Order(Base):
     discount_amount = Column(Float, default=0.0)  # Сумма скидки
     final_total = Column(Float, nullable=False)  # Конечная цена заказа (total - discount_amount)
     status = Column(String(50), default="new")  # new, processing, completed, cancelled
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)  # Список заказов - новые первыми
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Связь с товарами заказа
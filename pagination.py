@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Курсорная (keyset) пагинация
+
+Курсор - непрозрачная строка с ключом сортировки последней строки страницы.
+Следующая страница начинается условием "строго после ключа", поэтому глубокие
+страницы стоят столько же, сколько первая (нет OFFSET).
+
+Порядок NULL соответствует SQLite: NULL меньше любого значения
+(первым при ASC, последним при DESC).
+"""
+
+import base64
+import json
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, or_, false
+
+
+class InvalidCursor(ValueError):
+    """Курсор поврежден или получен для другого порядка сортировки"""
+
+
+def encode_cursor(values: List) -> str:
+    """Упаковать ключ сортировки в непрозрачный курсор"""
+    raw = json.dumps(values, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str, size: int) -> List:
+    """
+    Распаковать курсор в ключ сортировки из size значений
+    InvalidCursor - если курсор поврежден или от другого порядка сортировки
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except (ValueError, UnicodeError):
+        raise InvalidCursor("Invalid cursor")
+
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor("Invalid cursor")
+    return values
+
+
+def _after(column, value, descending: bool):
+    """Условие "значение колонки идет строго после value" в порядке сортировки"""
+    if descending:
+        if value is None:
+            return false()
+        return or_(column < value, column.is_(None))
+    if value is None:
+        return column.isnot(None)
+    return column > value
+
+
+def _equal(column, value):
+    """Условие равенства с учетом NULL"""
+    return column.is_(None) if value is None else column == value
+
+
+def keyset_after(order: List[Tuple], values: List):
+    """
+    Условие WHERE для строк после ключа values
+    order: [(колонка, descending), ...] - тот же порядок, что и в ORDER BY
+    """
+    conditions = []
+    for i, (column, descending) in enumerate(order):
+        prefix = [_equal(order[j][0], values[j]) for j in range(i)]
+        conditions.append(and_(*prefix, _after(column, values[i], descending)))
+    return or_(*conditions)
+
+
+def order_by_clauses(order: List[Tuple]) -> List:
+    """Выражения ORDER BY для порядка [(колонка, descending), ...]"""
+    return [column.desc() if descending else column for column, descending in order]
+
+
+def apply_cursor(query, order: List[Tuple], cursor: Optional[str]):
+    """Отсортировать запрос и продолжить его после курсора (если он передан)"""
+    if cursor:
+        query = query.filter(keyset_after(order, decode_cursor(cursor, len(order))))
+    return query.order_by(*order_by_clauses(order))
+
+
+def next_cursor(rows: List, limit: int, key) -> Optional[str]:
+    """
+    Курсор следующей страницы или None, если страница неполная
+    key(row) возвращает список значений ключа сортировки строки
+    """
+    if limit <= 0 or len(rows) < limit:
+        return None
+    return encode_cursor(key(rows[-1]))
+
+
+def slice_after(keys: List[Tuple], limit: int, cursor: Optional[str]) -> List[Tuple]:
+    """
+    Страница уже отсортированного в памяти списка ключей (например, ранжированной выдачи)
+    keys: возрастающий список кортежей одинаковой длины из чисел
+    """
+    if cursor and keys:
+        after = decode_cursor(cursor, len(keys[0]))
+        if not all(isinstance(value, (int, float)) for value in after):
+            raise InvalidCursor("Invalid cursor")
+        after = tuple(after)
+        keys = [key for key in keys if key > after]
+    return keys[:limit]
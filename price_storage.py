@@ -2,21 +2,50 @@
 """
 Модуль для работы с ценами в JSON файле
 Заменяет таблицу current_prices в БД
+
+При PRICES_BACKEND=db цены хранятся в таблице prices (price_storage_db),
+а этот модуль остается фасадом с тем же API
 """
 
 import json
 import os
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, Optional, List
+from typing import Callable, Dict, Optional, List, Iterable, Iterator, Mapping, Tuple
 from pathlib import Path
+import tempfile
 import threading
 
+import numpy as np
+
+from config import Config
+
+try:
+    import fcntl
+except ImportError:  # Windows: только блокировка внутри процесса
+    fcntl = None
+
+# Где хранятся цены: json (файл PRICES_FILE) или db (таблица prices)
+PRICES_BACKEND = Config.PRICES_BACKEND
+
 # Путь к файлу с ценами
 PRICES_FILE = os.getenv('PRICES_FILE', 'current_prices.json')
 
-# Блокировка для потокобезопасности
+# Режим записи: json - каждое изменение перезаписывает файл целиком,
+# journal - изменения дописываются в журнал и периодически сворачиваются в файл
+PRICES_STORAGE_MODE = os.getenv('PRICES_STORAGE_MODE', 'json').lower()
+
+# Сколько записей журнала накапливать до компактизации
+PRICES_JOURNAL_COMPACT_EVERY = int(os.getenv('PRICES_JOURNAL_COMPACT_EVERY', '500'))
+
+# Блокировка для потокобезопасности (сериализует запись и перечитывание файла)
+# Между процессами (воркеры API, update_prices_from_service.py) - flock на файле
+# <PRICES_FILE>.lock, см. _storage_lock()
 _lock = threading.Lock()
 
+# Подписчики на изменения цен: callback(skus) после успешной записи
+_change_listeners: List[Callable[[List[str]], None]] = []
+
 
 def _get_prices_file_path() -> str:
     """Получить полный путь к файлу с ценами"""
@@ -27,6 +56,58 @@ def _get_prices_file_path() -> str:
     return os.path.join(project_dir, PRICES_FILE)
 
 
+def _get_lock_file_path() -> str:
+    """Файл блокировки записи цен; в нем хранится номер версии цен"""
+    return _get_prices_file_path() + '.lock'
+
+
+@contextmanager
+def _storage_lock(exclusive: bool = True):
+    """
+    Блокировка хранилища цен между потоками и процессами
+    exclusive=True - запись (read-modify-write), False - перечитывание файла
+    Отдает дескриптор файла блокировки или None, если файл недоступен
+    (тогда остается только блокировка внутри процесса)
+    """
+    with _lock:
+        lock_path = _get_lock_file_path()
+        try:
+            os.makedirs(os.path.dirname(lock_path) or '.', exist_ok=True)
+            fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        except OSError as e:
+            print(f"⚠️  Не удалось открыть файл блокировки цен {lock_path}: {e}")
+            yield None
+            return
+        try:
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield fd
+        finally:
+            # Закрытие дескриптора снимает flock
+            os.close(fd)
+
+
+def _read_version(fd: Optional[int]) -> Optional[int]:
+    """Номер версии цен из файла блокировки (увеличивается каждой записью)"""
+    if fd is None:
+        return None
+    try:
+        data = os.pread(fd, 32, 0)
+        return int(data) if data else 0
+    except (OSError, ValueError):
+        return None
+
+
+def _write_version(fd: Optional[int], version: Optional[int]) -> None:
+    if fd is None or version is None:
+        return
+    try:
+        os.ftruncate(fd, 0)
+        os.pwrite(fd, str(version).encode('ascii'), 0)
+    except OSError as e:
+        print(f"⚠️  Не удалось записать версию цен: {e}")
+
+
 def _calculate_discount_percentage(old_price: float, price: float) -> float:
     """
     Вычислить процент скидки из old_price и price
@@ -36,47 +117,449 @@ def _calculate_discount_percentage(old_price: float, price: float) -> float:
     return 0.0
 
 
+def is_db_backend() -> bool:
+    """Цены хранятся в таблице prices, а не в JSON файле"""
+    return PRICES_BACKEND == 'db'
+
+
+def _db_backend():
+    import price_storage_db
+    return price_storage_db
+
+
+def add_change_listener(callback: Callable[[List[str]], None]) -> None:
+    """
+    Подписаться на изменения цен в этом процессе
+    callback получает список изменённых SKU после успешной записи
+    """
+    if callback not in _change_listeners:
+        _change_listeners.append(callback)
+
+
+def _notify_changed(skus: List[str]) -> None:
+    """Уведомить подписчиков об изменении цен; ошибки подписчиков не влияют на запись"""
+    for callback in list(_change_listeners):
+        try:
+            callback(skus)
+        except Exception as e:
+            print(f"⚠️ Ошибка обработчика изменения цен: {e}")
+
+
+def _get_journal_file_path() -> str:
+    """Путь к журналу изменений цен (лежит рядом с файлом цен)"""
+    return _get_prices_file_path() + '.journal'
+
+
+def _storage_mode() -> str:
+    """Режим записи цен: json (перезапись файла) или journal (журнал + компактизация)"""
+    return PRICES_STORAGE_MODE if PRICES_STORAGE_MODE in ('json', 'journal') else 'json'
+
+
+def _clean_price_info(price_info: Dict) -> Dict:
+    """Убрать вычисляемые и устаревшие поля из записи цены"""
+    return {k: v for k, v in price_info.items() if k not in ['updated_at', 'discount_percentage']}
+
+
+def _load_journal(prices: Dict[str, Dict]) -> int:
+    """
+    Наложить журнал изменений на снимок цен (изменяет prices)
+    Возвращает количество примененных записей журнала
+    
+    Недописанная последняя строка (сбой во время записи) пропускается
+    """
+    journal_path = _get_journal_file_path()
+    
+    if not os.path.exists(journal_path):
+        return 0
+    
+    applied = 0
+    try:
+        with open(journal_path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                    sku = entry.pop('sku')
+                except (json.JSONDecodeError, KeyError, AttributeError):
+                    print(f"⚠️  Пропущена поврежденная строка {line_number} журнала цен {journal_path}")
+                    continue
+                
+                if entry.get('deleted'):
+                    prices.pop(sku, None)
+                else:
+                    prices[sku] = _clean_price_info(entry)
+                applied += 1
+    except IOError as e:
+        print(f"⚠️  Ошибка при чтении журнала цен {journal_path}: {e}")
+    
+    return applied
+
+
+def _load_state() -> tuple:
+    """
+    Загрузить снимок цен с наложенным журналом
+    Возвращает (цены, количество записей в журнале)
+    """
+    file_path = _get_prices_file_path()
+    prices = {}
+    
+    if os.path.exists(file_path):
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+                # Удаляем updated_at и discount_percentage из всех записей при загрузке (для обратной совместимости)
+                for sku, price_info in data.items():
+                    prices[sku] = _clean_price_info(price_info)
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"⚠️  Ошибка при загрузке цен из {file_path}: {e}")
+            prices = {}
+    
+    journal_entries = _load_journal(prices)
+    return prices, journal_entries
+
+
 def _load_prices() -> Dict[str, Dict]:
     """
-    Загрузить цены из JSON файла
+    Загрузить цены из JSON файла (с учетом журнала изменений)
     Возвращает словарь: {sku: {price, old_price, currency, is_parse}}
     """
-    file_path = _get_prices_file_path()
+    return _load_state()[0]
+
+
+def _file_signature(file_path: str) -> Optional[tuple]:
+    """
+    Сигнатура файла: (inode, mtime, size)
+    Меняется при любой перезаписи файла, в том числе из другого процесса
+    """
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def _storage_signature() -> tuple:
+    """Сигнатура хранилища цен: файл снимка + журнал"""
+    return (_file_signature(_get_prices_file_path()), _file_signature(_get_journal_file_path()))
+
+
+def prices_signature() -> Optional[tuple]:
+    """
+    Сигнатура файлов цен: меняется при любой записи цен, в том числе другим процессом
+    или правкой файла вручную; None - цены хранятся в базе (PRICES_BACKEND=db)
+    """
+    if is_db_backend():
+        return None
+    return _storage_signature()
+
+
+class _PriceIndex:
+    """
+    Индекс цен в памяти процесса
+    
+    Файл читается один раз и перечитывается только когда меняется его сигнатура
+    (inode/mtime/size файла и журнала), поэтому записи из update_prices_from_service.py
+    в другом процессе по-прежнему видны. Снимок никогда не изменяется на месте: запись
+    публикует новый словарь, поэтому чтение идет без блокировки.
+    
+    Снимок помнит версию цен, при которой прочитан. Запись под блокировкой файла
+    сверяет ее с версией в файле блокировки и перечитывает файл, если в него писал
+    другой процесс, - изменения другого процесса не теряются, даже если сигнатура
+    файла случайно совпала.
+    """
+    
+    def __init__(self):
+        # (путь, сигнатура, {sku: {price, old_price, currency, is_parse}}, записей в журнале, версия)
+        self._state = (None, None, {}, 0, None)
+        # (снимок, PriceTable этого снимка) - таблица строится один раз на снимок
+        self._table = None
+    
+    @property
+    def journal_entries(self) -> int:
+        """Количество записей журнала, наложенных на текущий снимок"""
+        return self._state[3]
+    
+    @property
+    def version(self) -> Optional[int]:
+        """Версия цен, при которой прочитан текущий снимок"""
+        return self._state[4]
+    
+    def snapshot(self) -> Dict[str, Dict]:
+        """Получить актуальный снимок цен (не изменять!)"""
+        file_path = _get_prices_file_path()
+        path, signature, prices, _, _ = self._state
+        if path == file_path and signature == _storage_signature():
+            return prices
+        
+        # Разделяемая блокировка: не читать снимок и журнал посреди чужой записи
+        with _storage_lock(exclusive=False) as fd:
+            return self.refresh(file_path, _read_version(fd))
+    
+    def refresh(self, file_path: str, version: Optional[int]) -> Dict[str, Dict]:
+        """Перечитать файл, если он изменился или изменилась версия (вызывать под _storage_lock)"""
+        signature = _storage_signature()
+        path, cached_signature, prices, _, cached_version = self._state
+        if path == file_path and signature == cached_signature and version == cached_version:
+            return prices
+        
+        prices, journal_entries = _load_state()
+        self._state = (file_path, signature, prices, journal_entries, version)
+        return prices
+    
+    def publish(self, prices: Dict[str, Dict], journal_entries: int, version: Optional[int]) -> None:
+        """Опубликовать снимок, только что записанный на диск (вызывать под _storage_lock)"""
+        self._state = (_get_prices_file_path(), _storage_signature(), prices, journal_entries, version)
+    
+    def table(self) -> 'PriceTable':
+        """Колоночная таблица актуального снимка (строится заново только после изменения цен)"""
+        prices = self.snapshot()
+        cached = self._table
+        if cached is not None and cached[0] is prices:
+            return cached[1]
+        table = PriceTable.from_prices(prices)
+        self._table = (prices, table)
+        return table
+    
+    def invalidate(self) -> None:
+        """Сбросить снимок - следующее чтение перечитает файл"""
+        self._state = (None, None, {}, 0, None)
+        self._table = None
+
+
+class PriceTable:
+    """
+    Все цены в колонках для массовых потребителей (только чтение)
+    
+    skus и index (SKU -> номер строки) + непрерывные массивы numpy price, old_price,
+    is_parse и discount_percentage (считается сразу для всех строк), валюта - код
+    строки в currencies. Занимает в несколько раз меньше памяти, чем словарь словарей
+    get_all_prices(), и обходится без создания словаря на каждый SKU.
+    """
+    
+    def __init__(self, skus: List[str], price: np.ndarray, old_price: np.ndarray, is_parse: np.ndarray,
+                 currency_codes: np.ndarray, currencies: List[str]):
+        self.skus = skus
+        self.index = {sku: row for row, sku in enumerate(skus)}
+        self.price = price
+        self.old_price = old_price
+        self.is_parse = is_parse
+        self.currency_codes = currency_codes
+        self.currencies = currencies
+        self.discount = _discount_percentages(old_price, price)
+    
+    @classmethod
+    def from_prices(cls, prices: Dict[str, Dict]) -> 'PriceTable':
+        """Таблица из снимка {sku: {price, old_price, currency, is_parse}}"""
+        count = len(prices)
+        records = prices.values()
+        codes: Dict[str, int] = {}
+        return cls(
+            list(prices),
+            np.fromiter((data.get('price') or 0.0 for data in records), dtype=np.float64, count=count),
+            np.fromiter((data.get('old_price') or 0.0 for data in records), dtype=np.float64, count=count),
+            np.fromiter((data.get('is_parse', True) for data in records), dtype=np.bool_, count=count),
+            np.fromiter((codes.setdefault(data.get('currency') or 'RUB', len(codes)) for data in records),
+                        dtype=np.int32, count=count),
+            list(codes),
+        )
+    
+    def __len__(self) -> int:
+        return len(self.skus)
     
-    if not os.path.exists(file_path):
-        return {}
+    def __contains__(self, sku: str) -> bool:
+        return sku in self.index
     
+    def row(self, sku: str) -> Optional[int]:
+        """Номер строки SKU или None"""
+        return self.index.get(sku)
+    
+    def get(self, sku: str) -> Optional[Dict]:
+        """Запись цены SKU в формате get_price"""
+        row = self.index.get(sku)
+        if row is None:
+            return None
+        return {
+            "price": float(self.price[row]),
+            "old_price": float(self.old_price[row]),
+            "currency": self.currencies[self.currency_codes[row]],
+            "is_parse": bool(self.is_parse[row]),
+            "discount_percentage": float(self.discount[row]),
+        }
+    
+    def rows(self) -> Iterator[Tuple[str, float, float, str, bool, float]]:
+        """Обход всех строк: (sku, price, old_price, currency, is_parse, discount_percentage)"""
+        currencies = self.currencies
+        return zip(self.skus, self.price.tolist(), self.old_price.tolist(),
+                   (currencies[code] for code in self.currency_codes.tolist()),
+                   self.is_parse.tolist(), self.discount.tolist())
+    
+    def skus_with_parse_flag(self, is_parse: bool = True) -> List[str]:
+        """SKU с флагом is_parse"""
+        skus = self.skus
+        mask = self.is_parse if is_parse else ~self.is_parse
+        return [skus[row] for row in np.flatnonzero(mask).tolist()]
+
+
+def _discount_percentages(old_price: np.ndarray, price: np.ndarray) -> np.ndarray:
+    """_calculate_discount_percentage для массивов цен"""
+    has_discount = (old_price > price) & (old_price > 0)
+    safe_old_price = np.where(has_discount, old_price, 1.0)
+    return np.where(has_discount, (old_price - price) / safe_old_price * 100, 0.0)
+
+
+_index = _PriceIndex()
+
+
+def _with_discount(price_data: Dict) -> Dict:
+    """Копия записи цены с вычисленным discount_percentage"""
+    result = dict(price_data)
+    result['discount_percentage'] = _calculate_discount_percentage(
+        result.get('old_price', 0.0),
+        result.get('price', 0.0)
+    )
+    return result
+
+
+def _current_snapshot(fd: Optional[int]) -> Dict[str, Dict]:
+    """
+    Актуальный снимок для чтения перед изменением (вызывать под _storage_lock())
+    Версия снимка сверяется с версией в файле блокировки - при расхождении файл перечитывается
+    """
+    return _index.refresh(_get_prices_file_path(), _read_version(fd))
+
+
+def _next_version() -> Optional[int]:
+    version = _index.version
+    return None if version is None else version + 1
+
+
+def _append_journal(changes: Dict[str, Optional[Dict]]) -> bool:
+    """
+    Дописать изменения в журнал одной записью на диск
+    changes: {sku: запись цены или None для удаления}
+    """
+    journal_path = _get_journal_file_path()
+    
+    lines = []
+    for sku, price_info in changes.items():
+        entry = {"sku": sku, "deleted": True} if price_info is None else {"sku": sku, **price_info}
+        lines.append(json.dumps(entry, ensure_ascii=False) + '\n')
+    
+    try:
+        os.makedirs(os.path.dirname(journal_path) or '.', exist_ok=True)
+        with open(journal_path, 'a+b') as f:
+            # Недописанная строка после сбоя: новая запись начинается с новой строки,
+            # иначе она склеится с поврежденной и пропадет при чтении журнала
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    lines.insert(0, '\n')
+            f.write(''.join(lines).encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+        return True
+    except IOError as e:
+        print(f"❌ Ошибка при записи журнала цен {journal_path}: {e}")
+        return False
+
+
+def _remove_journal() -> None:
+    """Удалить журнал после того, как он вошел в снимок"""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            # Удаляем updated_at и discount_percentage из всех записей при загрузке (для обратной совместимости)
-            cleaned_data = {}
-            for sku, price_info in data.items():
-                cleaned_info = {k: v for k, v in price_info.items() if k not in ['updated_at', 'discount_percentage']}
-                cleaned_data[sku] = cleaned_info
-            return cleaned_data
-    except (json.JSONDecodeError, IOError) as e:
-        print(f"⚠️  Ошибка при загрузке цен из {file_path}: {e}")
-        return {}
+        os.remove(_get_journal_file_path())
+    except FileNotFoundError:
+        pass
+
+
+def _apply_changes(fd: Optional[int], current: Dict[str, Dict], changes: Dict[str, Optional[Dict]]) -> bool:
+    """
+    Применить изменения к снимку, записать их на диск и опубликовать новый снимок
+    fd: дескриптор из _storage_lock(), под которой получен current
+    current: снимок, полученный через _current_snapshot(fd)
+    changes: {sku: запись цены или None для удаления}
+    """
+    prices = dict(current)
+    for sku, price_info in changes.items():
+        if price_info is None:
+            prices.pop(sku, None)
+        else:
+            prices[sku] = price_info
+    
+    if _storage_mode() == 'journal':
+        if not _append_journal(changes):
+            _index.invalidate()
+            return False
+        
+        journal_entries = _index.journal_entries + len(changes)
+        if journal_entries < PRICES_JOURNAL_COMPACT_EVERY:
+            version = _next_version()
+            _write_version(fd, version)
+            _index.publish(prices, journal_entries, version)
+            return True
+    
+    # Режим json или журнал дорос до порога - пишем полный снимок
+    if not _save_prices(prices):
+        _index.invalidate()
+        return False
+    _remove_journal()
+    version = _next_version()
+    _write_version(fd, version)
+    _index.publish(prices, 0, version)
+    return True
 
 
 def _save_prices(prices: Dict[str, Dict]) -> bool:
     """
     Сохранить цены в JSON файл
+    Запись атомарная: временный файл + os.replace, поэтому сбой посреди записи
+    не обрезает файл цен
     """
     file_path = _get_prices_file_path()
+    directory = os.path.dirname(file_path) or '.'
+    tmp_path = None
     
     try:
         # Создаем директорию если нужно
-        os.makedirs(os.path.dirname(file_path) if os.path.dirname(file_path) else '.', exist_ok=True)
+        os.makedirs(directory, exist_ok=True)
         
-        # Сохраняем с форматированием
-        with open(file_path, 'w', encoding='utf-8') as f:
+        # Сохраняем с форматированием во временный файл рядом с основным
+        fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(file_path) + '.', suffix='.tmp', dir=directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
             json.dump(prices, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+        tmp_path = None
         return True
     except IOError as e:
         print(f"❌ Ошибка при сохранении цен в {file_path}: {e}")
         return False
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def compact_prices() -> bool:
+    """
+    Свернуть журнал изменений в новый снимок файла цен
+    Безопасно вызывать в любом режиме (например, по расписанию)
+    """
+    if is_db_backend():
+        return True
+    
+    with _storage_lock() as fd:
+        prices = _current_snapshot(fd)
+        if _index.journal_entries == 0 and not os.path.exists(_get_journal_file_path()):
+            return True
+        if not _save_prices(prices):
+            return False
+        _remove_journal()
+        version = _next_version()
+        _write_version(fd, version)
+        _index.publish(prices, 0, version)
+        return True
 
 
 def get_price(sku: str) -> Optional[Dict]:
@@ -84,30 +567,78 @@ def get_price(sku: str) -> Optional[Dict]:
     Получить цену для SKU
     Возвращает словарь с полями: price, old_price, currency, discount_percentage (вычисляется), is_parse
     """
-    with _lock:
-        prices = _load_prices()
+    if is_db_backend():
+        price_data = _db_backend().get_price(sku)
+    else:
+        price_data = _index.snapshot().get(sku)
+    if price_data:
+        # Вычисляем discount_percentage динамически
+        return _with_discount(price_data)
+    return price_data
+
+
+def get_prices(skus: Iterable[str]) -> Dict[str, Dict]:
+    """
+    Получить цены для нескольких SKU из одного снимка
+    Возвращает словарь {sku: {price, old_price, currency, discount_percentage (вычисляется), is_parse}}
+    SKU без цены в результат не попадают
+    """
+    if is_db_backend():
+        return {sku: _with_discount(price_data) for sku, price_data in _db_backend().get_prices(skus).items()}
+    
+    prices = _index.snapshot()
+    result = {}
+    for sku in skus:
         price_data = prices.get(sku)
         if price_data:
-            # Вычисляем discount_percentage динамически
-            old_price = price_data.get('old_price', 0.0)
-            price = price_data.get('price', 0.0)
-            price_data['discount_percentage'] = _calculate_discount_percentage(old_price, price)
-        return price_data
+            result[sku] = _with_discount(price_data)
+    return result
+
+
+class _PricesView(Mapping):
+    """Снимок цен только для чтения: discount_percentage вычисляется при обращении к записи"""
+    
+    def __init__(self, prices: Dict[str, Dict]):
+        self._prices = prices
+    
+    def __getitem__(self, sku: str) -> Dict:
+        return _with_discount(self._prices[sku])
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._prices)
+    
+    def __len__(self) -> int:
+        return len(self._prices)
+
+
+def get_prices_snapshot() -> Mapping[str, Dict]:
+    """
+    Все цены одним снимком без копирования (экспорт, массовое чтение)
+    Записи - в том же виде, что у get_prices; снимок не меняется после записи цен
+    """
+    prices = _db_backend().get_all_prices() if is_db_backend() else _index.snapshot()
+    return _PricesView(prices)
+
+
+def get_price_table() -> PriceTable:
+    """
+    Все цены в колоночной таблице PriceTable (без словаря на каждый SKU)
+    Для файлового хранилища таблица кэшируется до следующего изменения цен
+    """
+    if is_db_backend():
+        return PriceTable.from_prices(_db_backend().get_all_prices())
+    return _index.table()
 
 
 def get_all_prices() -> Dict[str, Dict]:
     """
     Получить все цены
     Возвращает словарь всех цен: {sku: {price, old_price, currency, discount_percentage (вычисляется), is_parse}}
+    Для обхода всех цен дешевле get_price_table() или get_prices_snapshot()
     """
-    with _lock:
-        prices = _load_prices()
-        # Вычисляем discount_percentage для всех записей
-        for sku, price_data in prices.items():
-            old_price = price_data.get('old_price', 0.0)
-            price = price_data.get('price', 0.0)
-            price_data['discount_percentage'] = _calculate_discount_percentage(old_price, price)
-        return prices
+    prices = _db_backend().get_all_prices() if is_db_backend() else _index.snapshot()
+    # Вычисляем discount_percentage для всех записей
+    return {sku: _with_discount(price_data) for sku, price_data in prices.items()}
 
 
 def set_price(
@@ -121,17 +652,36 @@ def set_price(
     Установить цену для SKU
     discount_percentage вычисляется автоматически из old_price и price
     """
-    with _lock:
-        prices = _load_prices()
-        
-        prices[sku] = {
-            "price": float(price),
-            "old_price": float(old_price) if old_price else float(price),
-            "currency": currency,
-            "is_parse": is_parse
-        }
-        
-        return _save_prices(prices)
+    price_info = {
+        "price": float(price),
+        "old_price": float(old_price) if old_price else float(price),
+        "currency": currency,
+        "is_parse": is_parse
+    }
+    
+    if is_db_backend():
+        saved = _db_backend().update([sku], lambda _sku, _existing: price_info)
+    else:
+        with _storage_lock() as fd:
+            prices = _current_snapshot(fd)
+            saved = _apply_changes(fd, prices, {sku: price_info})
+    
+    if saved:
+        _notify_changed([sku])
+    return saved
+
+
+def _merge_price_update(existing: Dict, price_data: Dict) -> Dict:
+    """Новая запись цены: поля из price_data, недостающие - из существующей записи"""
+    # Сохраняем is_parse если он был
+    is_parse = price_data.get('is_parse', existing.get('is_parse', True))
+    
+    return {
+        "price": float(price_data.get('price', existing.get('price', 0))),
+        "old_price": float(price_data.get('old_price', existing.get('old_price', price_data.get('price', 0)))),
+        "currency": price_data.get('currency', existing.get('currency', 'RUB')),
+        "is_parse": is_parse
+    }
 
 
 def update_prices(prices_dict: Dict[str, Dict]) -> bool:
@@ -139,43 +689,51 @@ def update_prices(prices_dict: Dict[str, Dict]) -> bool:
     Обновить несколько цен за раз
     prices_dict: {sku: {price, old_price, currency, ...}}
     """
-    with _lock:
-        all_prices = _load_prices()
-        
-        for sku, price_data in prices_dict.items():
-            # Сохраняем is_parse если он был
-            existing = all_prices.get(sku, {})
-            is_parse = price_data.get('is_parse', existing.get('is_parse', True))
-            
-            all_prices[sku] = {
-                "price": float(price_data.get('price', existing.get('price', 0))),
-                "old_price": float(price_data.get('old_price', existing.get('old_price', price_data.get('price', 0)))),
-                "currency": price_data.get('currency', existing.get('currency', 'RUB')),
-                "is_parse": is_parse
+    if not prices_dict:
+        return True
+    
+    if is_db_backend():
+        saved = _db_backend().update(prices_dict.keys(), lambda sku, existing: _merge_price_update(existing, prices_dict[sku]))
+    else:
+        with _storage_lock() as fd:
+            all_prices = _current_snapshot(fd)
+            changes = {
+                sku: _merge_price_update(all_prices.get(sku, {}), price_data)
+                for sku, price_data in prices_dict.items()
             }
-        
-        return _save_prices(all_prices)
+            saved = _apply_changes(fd, all_prices, changes)
+    
+    if saved:
+        _notify_changed(list(prices_dict.keys()))
+    return saved
 
 
 def delete_price(sku: str) -> bool:
     """
     Удалить цену для SKU
     """
-    with _lock:
-        prices = _load_prices()
-        if sku in prices:
-            del prices[sku]
-            return _save_prices(prices)
-        return True
+    if is_db_backend():
+        saved = _db_backend().update([sku], lambda _sku, _existing: None)
+    else:
+        with _storage_lock() as fd:
+            prices = _current_snapshot(fd)
+            if sku not in prices:
+                return True
+            saved = _apply_changes(fd, prices, {sku: None})
+    
+    if saved:
+        _notify_changed([sku])
+    return saved
 
 
 def get_prices_by_parse_flag(is_parse: bool = True) -> List[str]:
     """
     Получить список SKU с флагом is_parse
     """
-    with _lock:
-        prices = _load_prices()
-        return [sku for sku, data in prices.items() if data.get('is_parse', True) == is_parse]
+    if is_db_backend():
+        return _db_backend().get_prices_by_parse_flag(is_parse)
+    
+    return _index.table().skus_with_parse_flag(is_parse)
 
 
 def migrate_from_db(db_session) -> int:
@@ -240,3 +798,30 @@ def migrate_from_db(db_session) -> int:
         traceback.print_exc()
         return 0
 
+
+
+def migrate_to_db(db_session) -> int:
+    """
+    Перенести цены из JSON файла (вместе с журналом) в таблицу prices
+    Обратная операция к migrate_from_db; существующие записи таблицы перезаписываются
+    Возвращает количество перенесенных записей
+    """
+    from models import Price
+    
+    prices = _load_prices()
+    if not prices:
+        return 0
+    
+    existing = {row.sku: row for row in db_session.query(Price).all()}
+    for sku, price_info in prices.items():
+        row = existing.get(sku)
+        if row is None:
+            row = Price(sku=sku)
+            db_session.add(row)
+        row.price = float(price_info.get('price', 0.0))
+        row.old_price = float(price_info.get('old_price', price_info.get('price', 0.0)))
+        row.currency = price_info.get('currency', 'RUB')
+        row.is_parse = bool(price_info.get('is_parse', True))
+    
+    db_session.commit()
+    return len(prices)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Хранение цен в таблице prices базы данных
+Бэкенд для price_storage при PRICES_BACKEND=db - напрямую не импортировать,
+использовать функции price_storage
+"""
+
+from typing import Callable, Dict, Iterable, List, Optional
+
+from database import SessionLocal
+from models import Price
+
+# Размер пачки SKU для запросов IN (...)
+_CHUNK_SIZE = 500
+
+
+def _to_dict(row: Price) -> Dict:
+    """Запись таблицы prices в формате price_storage"""
+    return {
+        "price": row.price,
+        "old_price": row.old_price,
+        "currency": row.currency or "RUB",
+        "is_parse": bool(row.is_parse) if row.is_parse is not None else True
+    }
+
+
+def _chunks(items: List[str]):
+    for start in range(0, len(items), _CHUNK_SIZE):
+        yield items[start:start + _CHUNK_SIZE]
+
+
+def _load_rows(db, skus: List[str]) -> Dict[str, Price]:
+    rows = {}
+    for chunk in _chunks(skus):
+        for row in db.query(Price).filter(Price.sku.in_(chunk)).all():
+            rows[row.sku] = row
+    return rows
+
+
+def get_price(sku: str) -> Optional[Dict]:
+    """Цена одного SKU или None"""
+    db = SessionLocal()
+    try:
+        row = db.query(Price).filter(Price.sku == sku).first()
+        return _to_dict(row) if row else None
+    finally:
+        db.close()
+
+
+def get_prices(skus: Iterable[str]) -> Dict[str, Dict]:
+    """Цены нескольких SKU одной транзакцией"""
+    skus = list(dict.fromkeys(skus))
+    if not skus:
+        return {}
+    db = SessionLocal()
+    try:
+        return {sku: _to_dict(row) for sku, row in _load_rows(db, skus).items()}
+    finally:
+        db.close()
+
+
+def get_all_prices() -> Dict[str, Dict]:
+    """Все цены"""
+    db = SessionLocal()
+    try:
+        return {row.sku: _to_dict(row) for row in db.query(Price).all()}
+    finally:
+        db.close()
+
+
+def update(skus: Iterable[str], build: Callable[[str, Dict], Optional[Dict]]) -> bool:
+    """
+    Обновить цены одной транзакцией
+    build(sku, существующая запись или {}) возвращает новую запись или None для удаления
+    """
+    skus = list(dict.fromkeys(skus))
+    if not skus:
+        return True
+    db = SessionLocal()
+    try:
+        rows = _load_rows(db, skus)
+        for sku in skus:
+            row = rows.get(sku)
+            price_info = build(sku, _to_dict(row) if row else {})
+            if price_info is None:
+                if row:
+                    db.delete(row)
+                continue
+            if row is None:
+                row = Price(sku=sku)
+                db.add(row)
+            row.price = price_info["price"]
+            row.old_price = price_info["old_price"]
+            row.currency = price_info["currency"]
+            row.is_parse = price_info["is_parse"]
+        db.commit()
+        return True
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Ошибка при сохранении цен в БД: {e}")
+        return False
+    finally:
+        db.close()
+
+
+def get_prices_by_parse_flag(is_parse: bool = True) -> List[str]:
+    """SKU с флагом is_parse"""
+    db = SessionLocal()
+    try:
+        return [sku for (sku,) in db.query(Price.sku).filter(Price.is_parse == is_parse).all()]
+    finally:
+        db.close()
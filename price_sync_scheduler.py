@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Синхронизация цен с сервисом по расписанию внутри процесса API
+
+run_once() выполняет update_prices_from_service.sync_prices() под блокировкой
+файла PRICE_SYNC_LOCK_FILE (flock): в каждый момент идет не больше одной
+синхронизации на все процессы - воркеры API, price_updater_scheduler.py,
+systemd timer и cron. Итоги последнего запуска (длительность, изменённые SKU,
+ошибки) записываются в PRICE_SYNC_STATUS_FILE и доступны любому воркеру
+через /api/admin/price-sync. Идущий запуск отмечен там записью current_run (pid).
+
+При PRICE_SYNC_IN_PROCESS=true каждый воркер API запускает фоновую задачу
+asyncio (scheduler.start() в lifespan). Задача ждет PRICE_SYNC_INTERVAL_SECONDS
+плюс случайную добавку до PRICE_SYNC_JITTER_SECONDS после окончания прошлого
+запуска, поэтому запуски одного процесса не пересекаются, а воркеры не
+обращаются к сервису одновременно. Если другой воркер уже синхронизировал цены
+в последние полинтервала, запуск пропускается. Без PRICE_SYNC_MODE=delta и если
+сервис не поддерживает изменения цен, запуски пропускаются до очередной полной
+синхронизации (PRICE_SYNC_FALLBACK_MINUTES).
+
+Синхронизация в процессе API записывает цены через price_storage этого процесса:
+снимок цен в памяти, карточки моделей, фасеты и поколение каталога обновляются
+подписчиками price_storage сразу, без повторного чтения файла цен.
+"""
+
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from config import Config
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировка между процессами недоступна
+    fcntl = None
+
+# Поля статистики sync_prices, которые попадают в итоги запуска
+_STATS_KEYS = ('updated', 'created', 'not_found', 'errors', 'failed')
+
+
+def _project_path(file_name: str) -> str:
+    """Путь относительно директории проекта (общий для всех процессов)"""
+    if os.path.isabs(file_name):
+        return file_name
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), file_name)
+
+
+def _try_lock() -> Optional[int]:
+    """Захватить блокировку синхронизации; None - синхронизация уже идет"""
+    fd = os.open(_project_path(Config.PRICE_SYNC_LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+    if fcntl:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+    return fd
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    """Жив ли процесс с этим pid"""
+    if not pid:
+        return False
+    if os.name == 'nt':
+        # os.kill на Windows завершает процесс - считаем его живым
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def is_running(status: Dict) -> bool:
+    """
+    Идет ли синхронизация в каком-либо процессе - по записи current_run в итогах
+    Блокировку не захватывает: иначе run_once, начавшийся во время проверки,
+    был бы пропущен как "уже выполняется"
+    """
+    current_run = status.get('current_run')
+    return bool(current_run) and _pid_alive(current_run.get('pid'))
+
+
+def _read_status() -> Dict:
+    try:
+        with open(_project_path(Config.PRICE_SYNC_STATUS_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Не удалось прочитать итоги синхронизации цен: {e}")
+        return {}
+
+
+def _write_status(status: Dict) -> None:
+    """Записать итоги атомарно (временный файл + rename)"""
+    file_path = _project_path(Config.PRICE_SYNC_STATUS_FILE)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(file_path), prefix='.price_sync_status_', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(status, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, file_path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _recently_synced(status: Dict, min_interval: float) -> bool:
+    try:
+        started_at = datetime.fromisoformat(status['last_run']['started_at'])
+    except (KeyError, TypeError, ValueError):
+        return False
+    return datetime.now() - started_at < timedelta(seconds=min_interval)
+
+
+def _sync(full: bool) -> Dict:
+    """Выполнить синхронизацию и собрать итоги запуска"""
+    import update_prices_from_service as updater
+
+    started = time.monotonic()
+    run = {
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'pid': os.getpid(),
+        'mode': 'full' if full else None,
+        'ok': False,
+        'error': None,
+        'changed': 0,
+    }
+    run.update(dict.fromkeys(_STATS_KEYS, 0))
+    try:
+        stats = updater.sync_prices(full=full)
+        if stats is None:
+            run['error'] = "Цены не получены из сервиса"
+        else:
+            run.update({key: stats.get(key, 0) for key in _STATS_KEYS})
+            run['mode'] = stats.get('mode', run['mode'])
+            run['changed'] = stats['updated'] + stats['created']
+            run['ok'] = stats['saved']
+            if not stats['saved']:
+                run['error'] = "Не удалось записать цены"
+    except Exception as e:
+        updater.logger.error(f"❌ Критическая ошибка: {e}", exc_info=True)
+        run['error'] = str(e)
+    run['finished_at'] = datetime.now().isoformat(timespec='seconds')
+    run['duration_seconds'] = round(time.monotonic() - started, 3)
+    return run
+
+
+def run_once(full: bool = False, min_interval: float = 0) -> Optional[Dict]:
+    """
+    Синхронизировать цены, если синхронизация не идет в другом процессе
+    min_interval - пропустить запуск, если последний начался меньше min_interval секунд назад
+    Без full запуск пропускается и тогда, когда синхронизация не нужна (sync_due)
+    Возвращает итоги запуска или None, если запуск пропущен
+    """
+    import update_prices_from_service as updater
+
+    fd = _try_lock()
+    if fd is None:
+        print("⏭️ Синхронизация цен уже выполняется в другом процессе - запуск пропущен")
+        return None
+    try:
+        status = _read_status()
+        if min_interval and _recently_synced(status, min_interval):
+            return None
+        if not full and not updater.sync_due():
+            return None
+
+        # Запуск виден в итогах, пока идет (is_running); запись с pid завершившегося процесса не учитывается
+        status['current_run'] = {'pid': os.getpid(), 'started_at': datetime.now().isoformat(timespec='seconds')}
+        try:
+            _write_status(status)
+        except OSError as e:
+            print(f"⚠️ Не удалось записать итоги синхронизации цен: {e}")
+
+        run = _sync(full)
+        status.pop('current_run', None)
+        status['last_run'] = run
+        status['runs'] = status.get('runs', 0) + 1
+        if run['ok']:
+            status['last_success_at'] = run['finished_at']
+            status['consecutive_failures'] = 0
+        else:
+            status['failed_runs'] = status.get('failed_runs', 0) + 1
+            status['consecutive_failures'] = status.get('consecutive_failures', 0) + 1
+        try:
+            _write_status(status)
+        except OSError as e:
+            print(f"⚠️ Не удалось записать итоги синхронизации цен: {e}")
+        return run
+    finally:
+        # Закрытие дескриптора снимает flock
+        os.close(fd)
+
+
+class PriceSyncScheduler:
+    """Фоновая задача asyncio: run_once() каждые interval секунд плюс случайная добавка до jitter"""
+
+    def __init__(self, interval: float, jitter: float):
+        self.interval = interval
+        self.jitter = jitter
+        self.next_run_at: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Запустить задачу в текущем event loop (вызывать из lifespan)"""
+        if self.running:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._loop())
+        print(f"✅ Синхронизация цен в процессе: каждые {self.interval} с (+ до {self.jitter} с)")
+
+    async def stop(self) -> None:
+        """Остановить задачу; идущая синхронизация завершится в своем потоке"""
+        task, self._task = self._task, None
+        self.next_run_at = None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def _loop(self) -> None:
+        # Первый запуск - вскоре после старта, в разное время у разных воркеров
+        delay = random.uniform(0, self.jitter)
+        while True:
+            self.next_run_at = datetime.now() + timedelta(seconds=delay)
+            await asyncio.sleep(delay)
+            self.next_run_at = None
+            try:
+                # Следующий запуск ждет окончания этого - запуски не пересекаются
+                await run_in_threadpool(run_once, False, self.min_interval())
+            except Exception as e:
+                print(f"⚠️ Ошибка синхронизации цен: {e}")
+            delay = self.interval + random.uniform(0, self.jitter)
+
+    def min_interval(self) -> float:
+        """
+        Пропускать запуск, если последний начался меньше стольких секунд назад
+        Без PRICE_SYNC_MODE=delta каждый запуск - полная синхронизация: не чаще PRICE_SYNC_FALLBACK_MINUTES
+        """
+        import update_prices_from_service as updater
+
+        if updater.PRICE_SYNC_MODE == 'delta':
+            return self.interval / 2
+        return max(self.interval / 2, updater.PRICE_SYNC_FALLBACK_MINUTES * 60)
+
+    def status(self) -> Dict:
+        """Итоги последнего запуска (любого процесса) и расписание этого процесса"""
+        status = _read_status()
+        status['running'] = is_running(status)
+        status['scheduler'] = {
+            'in_process': self.running,
+            'interval_seconds': self.interval,
+            'jitter_seconds': self.jitter,
+            'next_run_at': self.next_run_at.isoformat(timespec='seconds') if self.next_run_at else None,
+        }
+        return status
+
+
+scheduler = PriceSyncScheduler(Config.PRICE_SYNC_INTERVAL_SECONDS, Config.PRICE_SYNC_JITTER_SECONDS)
@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 """
 Шедулер для автоматического обновления цен из внешнего сервиса
-Запускает обновление каждые 30 минут
+Запускает обновление каждые PRICE_UPDATE_INTERVAL_MINUTES минут (по умолчанию 30)
+С инкрементальной синхронизацией (PRICE_SYNC_MODE=delta, включается явно) можно запускать раз в минуту
 """
 
 import os
@@ -25,6 +26,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Интервал обновления цен в минутах
+PRICE_UPDATE_INTERVAL_MINUTES = int(os.getenv('PRICE_UPDATE_INTERVAL_MINUTES', '30'))
+
 # Импортируем функцию main из скрипта обновления цен
 from update_prices_from_service import main as update_prices
 
@@ -48,11 +52,11 @@ def main():
     """Основная функция шедулера"""
     logger.info("🚀 Запуск шедулера обновления цен")
     logger.info(f"📅 Время запуска: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    logger.info("⏰ Расписание: каждые 30 минут")
+    logger.info(f"⏰ Расписание: каждые {PRICE_UPDATE_INTERVAL_MINUTES} мин.")
     logger.info("")
     
-    # Настраиваем расписание: каждые 30 минут
-    schedule.every(30).minutes.do(run_price_update)
+    # Настраиваем расписание
+    schedule.every(PRICE_UPDATE_INTERVAL_MINUTES).minutes.do(run_price_update)
     
     # Запускаем сразу при старте (опционально)
     logger.info("🔄 Запуск первого обновления при старте...")
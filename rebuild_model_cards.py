@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Скрипт для полной пересборки таблицы model_cards (карточки моделей витрины)
+Нужен после изменений в обход приложения: ручная правка файла цен или SQL напрямую
+"""
+
+import os
+import sys
+
+# Добавляем путь к проекту для импорта модулей
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database import SessionLocal, create_tables
+from model_cards import refresh_model_cards
+
+
+def rebuild_cards():
+    """
+    Пересобрать карточки всех моделей
+    """
+    print("🔄 Пересборка карточек моделей...")
+    
+    # Создаем таблицу model_cards, если ее нет
+    create_tables()
+    
+    db = SessionLocal()
+    
+    try:
+        count = refresh_model_cards(db)
+        print(f"✅ Пересобрано карточек моделей: {count}")
+        
+    except Exception as e:
+        print(f"❌ Ошибка при пересборке карточек: {e}")
+        import traceback
+        traceback.print_exc()
+        db.rollback()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    rebuild_cards()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Скрипт для полной пересборки поискового индекса (SEARCH_INDEX_FILE)
+Нужен после изменений каталога в обход приложения (SQL напрямую, сторонние скрипты)
+"""
+
+import os
+import sys
+
+# Добавляем путь к проекту для импорта модулей
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database import SessionLocal
+from search_index import search_index
+
+
+def rebuild_index():
+    """
+    Пересобрать поисковый индекс всех моделей
+    """
+    print("🔄 Пересборка поискового индекса...")
+    
+    db = SessionLocal()
+    
+    try:
+        count = search_index.rebuild(db)
+        print(f"✅ Проиндексировано моделей: {count}")
+        
+    except Exception as e:
+        print(f"❌ Ошибка при пересборке индекса: {e}")
+        import traceback
+        traceback.print_exc()
+        db.rollback()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    rebuild_index()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Кэш ответов read-only endpoints каталога
+
+Ключ - путь запроса и отсортированные параметры. Записи хранятся в памяти
+процесса с ограничением по объему (RESPONSE_CACHE_MAX_MB) и вытеснением LRU.
+Каждая запись помнит поколение каталога (catalog_generation), при котором
+получена: после любого изменения каталога или цен кэш сбрасывается.
+
+Ответы получают сильный ETag (хэш тела) и Cache-Control: no-cache, поэтому
+клиенты (Telegram webapp) перепроверяют их через If-None-Match и получают 304.
+"""
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import Response
+
+import catalog_generation
+from config import Config
+
+# Кэшируемые GET endpoints - чистые функции каталога и цен
+CACHEABLE_PATHS = re.compile(
+    r"^/(categories"
+    r"|facets"
+    r"|products"
+    r"|products/[^/]+/variants"
+    r"|products/\d+"
+    r"|hierarchy/(brands|levels|models)"
+    r"|level2-descriptions/[^/]+"
+    r"|product-images/[^/]+/[^/]+)$"
+)
+
+# Заголовки ответа, которые сохраняются вместе с телом
+STORED_HEADERS = ("content-type", "x-next-cursor")
+
+
+class _Entry:
+    __slots__ = ("generation", "body", "etag", "headers", "size")
+
+    def __init__(self, generation: int, body: bytes, headers: dict):
+        self.generation = generation
+        self.body = body
+        self.etag = make_etag(body)
+        self.headers = headers
+        self.size = len(body) + 256
+
+
+def make_etag(body: bytes) -> str:
+    """Сильный ETag по содержимому ответа"""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+class ResponseCache:
+    """LRU кэш ответов с ограничением по объему"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._size = 0
+        self._generation = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _reset(self, generation: int) -> None:
+        self._entries.clear()
+        self._size = 0
+        self._generation = generation
+
+    def get(self, key: str, generation: int) -> Optional[_Entry]:
+        with self._lock:
+            if generation != self._generation:
+                # Каталог изменился - все записи устарели
+                self._reset(generation)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, generation: int, body: bytes, headers: dict) -> _Entry:
+        entry = _Entry(generation, body, headers)
+        # Слишком большие ответы не вытесняют весь кэш
+        if entry.size > self.max_bytes // 8:
+            return entry
+        with self._lock:
+            if generation != self._generation:
+                return entry
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous.size
+            self._entries[key] = entry
+            self._size += entry.size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.size
+        return entry
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "generation": self._generation,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+response_cache = ResponseCache(Config.RESPONSE_CACHE_MAX_MB * 1024 * 1024)
+
+
+def cache_key(request: Request) -> str:
+    """Путь + отсортированные параметры запроса"""
+    params = sorted(request.query_params.multi_items())
+    return request.url.path + "?" + "&".join(f"{name}={value}" for name, value in params)
+
+
+def _respond(entry: _Entry, request: Request, cache_status: str) -> Response:
+    headers = dict(entry.headers)
+    headers["etag"] = entry.etag
+    headers["cache-control"] = "no-cache"
+    headers["x-cache"] = cache_status
+    if _etag_matches(request.headers.get("if-none-match"), entry.etag):
+        headers.pop("content-type", None)
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, headers=headers)
+
+
+class ResponseCacheMiddleware(BaseHTTPMiddleware):
+    """Отдает кэшируемые GET ответы из response_cache и проставляет ETag"""
+
+    async def dispatch(self, request: Request, call_next):
+        if request.method != "GET" or not CACHEABLE_PATHS.match(request.url.path):
+            return await call_next(request)
+
+        generation = catalog_generation.current()
+        if generation is None:
+            return await call_next(request)
+
+        key = cache_key(request)
+        entry = response_cache.get(key, generation)
+        if entry is not None:
+            return _respond(entry, request, "HIT")
+
+        response = await call_next(request)
+        if response.status_code != 200:
+            return response
+
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        stored = {name: response.headers[name] for name in STORED_HEADERS if name in response.headers}
+        entry = response_cache.put(key, generation, body, stored)
+        return _respond(entry, request, "MISS")
@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+"""
+Полнотекстовый поисковый индекс товаров (SQLite FTS5)
+
+Индекс хранится в отдельном файле SQLite (SEARCH_INDEX_FILE) и не зависит
+от основной базы. Документ - модель (level_2 + brand), как и карточка в выдаче:
+названия всех вариантов, бренд, уровни категорий, характеристики вариантов
+(color, disk, sim_config), описание и details из level2_descriptions.
+Поэтому число документов и стоимость широких запросов растут с числом моделей,
+а не SKU.
+
+Текст документов и запросов приводится к одной латинской "звуковой" форме:
+транслитерация кириллицы, упрощение написания (ph -> f, x -> ks, y -> i ...)
+и словарь разговорных названий ("айфон" -> iphone). Поэтому "айфон 16 про"
+и "iphone16pro" находят iPhone 16 Pro.
+
+Ранжирование - BM25 (название/бренд/модель весомее описания). Слова запроса
+ищутся по префиксу в названии и целиком в остальном тексте, слова без совпадений
+исправляются по словарю индекса (расстояние Дамерау-Левенштейна 1-2).
+
+Индекс обновляется инкрементально (по затронутым моделям) после commit сессий,
+изменивших Product или Level2Description. Полная пересборка: python rebuild_search_index.py
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from config import Config
+from models import Product, Level2Description
+from model_cards import _model_keys_filter
+from change_tracking import after_commit, flushed_objects, history_values
+
+# Версия нормализации текста: при изменении индекс пересобирается
+INDEX_VERSION = "1"
+
+# Веса BM25 по колонкам: title (название, бренд, модель), body (остальное)
+TITLE_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+
+# Сколько моделей индексируется за одну пачку
+INDEX_BATCH_SIZE = 200
+
+# Максимум моделей в ранжированной выдаче
+MAX_MATCHES = 1000
+
+# Разговорные и русские написания -> каноническое написание
+SYNONYMS = {
+    'айфон': 'iphone', 'айфоны': 'iphone', 'айфона': 'iphone',
+    'айпад': 'ipad', 'айпады': 'ipad', 'айпада': 'ipad',
+    'аймак': 'imac',
+    'эйрподс': 'airpods', 'аирподс': 'airpods', 'эирподс': 'airpods',
+    'эппл': 'apple', 'эпл': 'apple', 'эплл': 'apple',
+    'эйр': 'air', 'аир': 'air', 'эир': 'air',
+    'плюс': 'plus',
+    'вотч': 'watch', 'вотчи': 'watch', 'воч': 'watch', 'вач': 'watch',
+    'ксиоми': 'xiaomi', 'сяоми': 'xiaomi', 'ксяоми': 'xiaomi',
+    'гэлакси': 'galaxy', 'гелакси': 'galaxy',
+    'дайсон': 'dyson',
+    'плейстейшн': 'playstation', 'плейстейшен': 'playstation', 'плэйстейшн': 'playstation',
+}
+
+CYRILLIC_TO_LATIN = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e',
+    'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'i', 'к': 'k', 'л': 'l', 'м': 'm',
+    'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+    'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch', 'ъ': '',
+    'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+}
+
+# Упрощение латинского написания, порядок важен
+PHONETIC_RULES = [
+    (re.compile(r'ph'), 'f'),
+    (re.compile(r'ck'), 'k'),
+    (re.compile(r'x'), 'ks'),
+    (re.compile(r'q'), 'k'),
+    (re.compile(r'w'), 'v'),
+    (re.compile(r'c(?!h)'), 'k'),
+    (re.compile(r'kh'), 'h'),
+    (re.compile(r'[yj]'), 'i'),
+    (re.compile(r'ee'), 'i'),
+    (re.compile(r'oo'), 'u'),
+    (re.compile(r'([a-z])\1+'), r'\1'),
+]
+
+# Слова: буквы отдельно от цифр ("iphone16pro" -> iphone, 16, pro)
+TOKEN_RE = re.compile(r'[a-zа-яё]+|\d+')
+
+
+def _get_index_file_path() -> str:
+    """Получить полный путь к файлу поискового индекса"""
+    if os.path.isabs(Config.SEARCH_INDEX_FILE):
+        return Config.SEARCH_INDEX_FILE
+    # Относительный путь от директории проекта
+    project_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(project_dir, Config.SEARCH_INDEX_FILE)
+
+
+def normalize_token(token: str) -> str:
+    """Привести одно слово (буквы или цифры) к канонической латинской форме"""
+    token = SYNONYMS.get(token, token)
+    if not token.isdigit():
+        token = ''.join(CYRILLIC_TO_LATIN.get(ch, ch) for ch in token)
+        for pattern, replacement in PHONETIC_RULES:
+            token = pattern.sub(replacement, token)
+    return token
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Разбить текст на нормализованные слова"""
+    if not text:
+        return []
+    tokens = (normalize_token(token) for token in TOKEN_RE.findall(str(text).lower()))
+    return [token for token in tokens if token]
+
+
+def _normalize_text(parts: Iterable) -> str:
+    """
+    Нормализованный текст колонки индекса
+    Каждое слово - один раз: модель с десятками вариантов не должна выигрывать BM25 за счет повторов
+    """
+    seen = {}
+    for part in parts:
+        for token in tokenize(part):
+            seen.setdefault(token, None)
+    return ' '.join(seen)
+
+
+def _details_values(details) -> List[str]:
+    """Значения характеристик из Level2Description.details (JSON, возможно вложенный)"""
+    if not details:
+        return []
+    try:
+        data = json.loads(details) if isinstance(details, str) else details
+    except (json.JSONDecodeError, TypeError):
+        return [str(details)]
+
+    values = []
+    stack = [data]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            stack.extend(item.values())
+        elif isinstance(item, list):
+            stack.extend(item)
+        elif item is not None:
+            values.append(str(item))
+    return values
+
+
+def _model_document(variants: List[Product], level2_desc) -> Tuple[str, str]:
+    """Колонки (title, body) документа модели по всем её вариантам"""
+    first = variants[0]
+    title_parts = [first.level_2, first.brand] + [product.name for product in variants]
+    body_parts = [first.level_0, first.level_1]
+    for product in variants:
+        body_parts.extend([product.color, product.disk, product.sim_config])
+    if level2_desc:
+        body_parts.append(level2_desc.description)
+        body_parts.extend(_details_values(level2_desc.details))
+    return _normalize_text(title_parts), _normalize_text(body_parts)
+
+
+def _damerau_levenshtein(a: str, b: str, limit: int) -> int:
+    """Расстояние Дамерау-Левенштейна с ранним выходом, если оно больше limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+
+class SearchIndex:
+    """
+    Поисковый индекс в файле SQLite
+    Соединение открывается на каждую операцию - объект можно использовать из любых потоков
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.available = True
+        self._ready = False
+        self._lock = threading.Lock()
+        # Словарь индекса для исправления опечаток: (поколение индекса, термы)
+        self._vocabulary = (None, [])
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _create(self, conn: sqlite3.Connection) -> None:
+        conn.executescript("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS search_docs USING fts5(
+                title, body,
+                representative_id UNINDEXED, is_available UNINDEXED,
+                tokenize = 'unicode61', prefix = '2 3'
+            );
+            -- rowid документа для модели (level_2, brand)
+            CREATE TABLE IF NOT EXISTS search_models (
+                id INTEGER PRIMARY KEY,
+                model_key TEXT NOT NULL UNIQUE
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS search_vocab USING fts5vocab(search_docs, 'row');
+            CREATE TABLE IF NOT EXISTS search_meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+
+    def _meta(self, conn: sqlite3.Connection, key: str) -> Optional[str]:
+        row = conn.execute("SELECT value FROM search_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, conn: sqlite3.Connection, key: str, value: str) -> None:
+        conn.execute("INSERT OR REPLACE INTO search_meta (key, value) VALUES (?, ?)", (key, value))
+
+    def _bump_generation(self, conn: sqlite3.Connection) -> None:
+        generation = int(self._meta(conn, 'generation') or 0) + 1
+        self._set_meta(conn, 'generation', str(generation))
+
+    def ensure(self, db: Session) -> bool:
+        """
+        Подготовить индекс: создать таблицы и пересобрать, если индекс построен
+        для другой базы или другой версией нормализации. Один раз на процесс
+        Возвращает False, если SQLite собран без FTS5
+        """
+        if self._ready or not self.available:
+            return self.available
+
+        with self._lock:
+            if self._ready or not self.available:
+                return self.available
+            try:
+                conn = self._connect()
+            except sqlite3.Error as e:
+                print(f"⚠️ Поисковый индекс недоступен ({self.path}): {e}")
+                self.available = False
+                return False
+            try:
+                self._create(conn)
+                database_url = str(db.get_bind().url)
+                if self._meta(conn, 'version') != INDEX_VERSION or self._meta(conn, 'database_url') != database_url:
+                    count = self._rebuild(conn, db)
+                    self._set_meta(conn, 'version', INDEX_VERSION)
+                    self._set_meta(conn, 'database_url', database_url)
+                    conn.commit()
+                    print(f"✅ Построен поисковый индекс: {count} моделей")
+                self._ready = True
+            except sqlite3.OperationalError as e:
+                # Например, SQLite без модуля FTS5 - поиск вернется к ILIKE
+                print(f"⚠️ Поисковый индекс недоступен: {e}")
+                self.available = False
+            finally:
+                conn.close()
+        return self.available
+
+    def _load_descriptions(self, db: Session, levels: Iterable[str]) -> Dict[str, Level2Description]:
+        levels = list({level_2 for level_2 in levels if level_2})
+        descriptions = {}
+        for start in range(0, len(levels), 500):
+            chunk = levels[start:start + 500]
+            for row in db.query(Level2Description).filter(Level2Description.level_2.in_(chunk)):
+                descriptions[row.level_2] = row
+        return descriptions
+
+    def _model_rowid(self, conn: sqlite3.Connection, key: Tuple) -> int:
+        """rowid документа модели (создается при первом обращении)"""
+        model_key = json.dumps(list(key), ensure_ascii=False)
+        conn.execute("INSERT OR IGNORE INTO search_models (model_key) VALUES (?)", (model_key,))
+        return conn.execute("SELECT id FROM search_models WHERE model_key = ?", (model_key,)).fetchone()[0]
+
+    def _write_models(self, conn: sqlite3.Connection, db: Session, model_keys: set) -> None:
+        """Записать документы моделей (заменяя существующие); модели без товаров удаляются"""
+        variants = {}
+        for product in db.query(Product).filter(_model_keys_filter(model_keys)).order_by(Product.id):
+            key = (product.level_2, product.brand)
+            if key in model_keys:
+                variants.setdefault(key, []).append(product)
+        descriptions = self._load_descriptions(db, (level_2 for level_2, _ in variants))
+
+        rows = []
+        for key in model_keys:
+            rowid = self._model_rowid(conn, key)
+            conn.execute("DELETE FROM search_docs WHERE rowid = ?", (rowid,))
+            products = variants.get(key)
+            if not products:
+                continue
+            title, body = _model_document(products, descriptions.get(key[0]))
+            # Представитель - доступный вариант с минимальным id, как в карточках витрины
+            available = [product for product in products if product.is_available]
+            representative = (available or products)[0]
+            rows.append((rowid, title, body, representative.id, 1 if available else 0))
+        conn.executemany(
+            "INSERT INTO search_docs (rowid, title, body, representative_id, is_available) VALUES (?, ?, ?, ?, ?)",
+            rows
+        )
+
+    def _write_in_batches(self, conn: sqlite3.Connection, db: Session, model_keys: Iterable) -> int:
+        model_keys = list(set(model_keys))
+        for start in range(0, len(model_keys), INDEX_BATCH_SIZE):
+            self._write_models(conn, db, set(model_keys[start:start + INDEX_BATCH_SIZE]))
+        self._bump_generation(conn)
+        return len(model_keys)
+
+    def _rebuild(self, conn: sqlite3.Connection, db: Session) -> int:
+        """Полная пересборка индекса (без commit)"""
+        conn.execute("DELETE FROM search_docs")
+        conn.execute("DELETE FROM search_models")
+        return self._write_in_batches(conn, db, db.query(Product.level_2, Product.brand).distinct())
+
+    def rebuild(self, db: Session) -> int:
+        """Пересобрать индекс целиком по основной базе"""
+        with self._lock:
+            conn = self._connect()
+            try:
+                self._create(conn)
+                count = self._rebuild(conn, db)
+                self._set_meta(conn, 'version', INDEX_VERSION)
+                self._set_meta(conn, 'database_url', str(db.get_bind().url))
+                conn.commit()
+            finally:
+                conn.close()
+            self._ready = True
+            return count
+
+    def update(self, db: Session, model_keys: Iterable[Tuple] = (), levels: Iterable[str] = ()) -> None:
+        """
+        Инкрементально обновить документы моделей
+        model_keys: затронутые модели (level_2, brand), в т.ч. оставшиеся без товаров
+        levels: level_2, у которых изменилось описание - переиндексируются все их модели
+        """
+        model_keys = set(model_keys)
+        levels = list(set(levels))
+        for start in range(0, len(levels), 500):
+            chunk = levels[start:start + 500]
+            model_keys.update(
+                (level_2, brand) for level_2, brand in
+                db.query(Product.level_2, Product.brand).filter(Product.level_2.in_(chunk)).distinct()
+            )
+        if not model_keys:
+            return
+
+        conn = self._connect()
+        try:
+            self._write_in_batches(conn, db, model_keys)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _vocabulary_terms(self, conn: sqlite3.Connection) -> List[str]:
+        """Термы индекса (кэш до следующего изменения индекса)"""
+        generation = self._meta(conn, 'generation')
+        cached_generation, terms = self._vocabulary
+        if cached_generation != generation:
+            terms = [row[0] for row in conn.execute("SELECT term FROM search_vocab")]
+            self._vocabulary = (generation, terms)
+        return terms
+
+    def _term_expression(self, conn: sqlite3.Connection, token: str) -> str:
+        """Выражение MATCH для одного слова запроса: префикс и исправления опечаток"""
+        if token.isdigit():
+            return f'"{token}"'
+
+        # По префиксу ищем только в title: иначе "pro" находит "процессор" в описаниях
+        variants = [f'{{title}} : "{token}"*', f'"{token}"']
+        terms = self._vocabulary_terms(conn)
+        if len(token) >= 4 and not any(term.startswith(token) for term in terms):
+            # Слово не встречается в индексе - добавляем близкие термы
+            limit = 1 if len(token) < 8 else 2
+            variants.extend(f'"{term}"' for term in terms if _damerau_levenshtein(token, term, limit) <= limit)
+        return '(' + ' OR '.join(variants) + ')'
+
+    def search(self, query: str) -> Optional[List[Tuple[float, int]]]:
+        """
+        Найти модели по запросу
+        Возвращает [(score, id представителя модели), ...] по убыванию релевантности
+        (оценка BM25, представитель - доступный вариант модели с минимальным id)
+        None - индекс недоступен или в запросе нет слов (нужен обычный поиск)
+        """
+        tokens = tokenize(query)
+        if not self.available or not tokens:
+            return None
+
+        conn = self._connect()
+        try:
+            expression = ' AND '.join(self._term_expression(conn, token) for token in tokens)
+            rows = conn.execute(
+                f"""
+                SELECT bm25(search_docs, {TITLE_WEIGHT}, {BODY_WEIGHT}), representative_id
+                FROM search_docs
+                WHERE search_docs MATCH ? AND is_available = 1
+                ORDER BY 1
+                LIMIT {MAX_MATCHES}
+                """,
+                (expression,)
+            ).fetchall()
+        except sqlite3.OperationalError as e:
+            print(f"⚠️ Ошибка поискового индекса: {e}")
+            return None
+        finally:
+            conn.close()
+
+        # BM25 в SQLite отрицательный: чем меньше, тем релевантнее
+        return sorted((score, representative_id) for score, representative_id in rows)
+
+
+search_index = SearchIndex(_get_index_file_path())
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_search_changes(session, flush_context):
+    """Запомнить модели, документы которых нужно обновить"""
+    objects = [obj for obj in flushed_objects(session, flush_context) if isinstance(obj, (Product, Level2Description))]
+    if not objects:
+        return
+    model_keys = session.info.setdefault('search_model_keys', set())
+    levels = session.info.setdefault('search_levels', set())
+
+    for obj in objects:
+        if isinstance(obj, Product):
+            # Учитываем и старую модель, если товар перенесли в другую
+            for level_2 in history_values(obj, 'level_2'):
+                for brand in history_values(obj, 'brand'):
+                    model_keys.add((level_2, brand))
+        elif isinstance(obj, Level2Description):
+            levels.update(level_2 for level_2 in history_values(obj, 'level_2') if level_2)
+
+
+def mark_models_changed(session: Session, model_keys: Iterable[Tuple]) -> None:
+    """Отметить модели (level_2, brand), товары которых записаны в обход ORM (core INSERT)"""
+    session.info.setdefault('search_model_keys', set()).update(model_keys)
+
+
+@after_commit
+def _update_after_commit(session):
+    """Обновить документы моделей, изменённых в закоммиченной транзакции"""
+    model_keys = session.info.pop('search_model_keys', set())
+    levels = session.info.pop('search_levels', set())
+    if not (model_keys or levels) or not search_index.available:
+        return
+
+    db = Session(bind=session.get_bind())
+    try:
+        # Индекс еще не построен в этом процессе - ensure построит его целиком
+        if search_index.ensure(db):
+            search_index.update(db, model_keys, levels)
+    except Exception as e:
+        print(f"⚠️ Не удалось обновить поисковый индекс: {e}")
+    finally:
+        db.close()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_search_changes(session):
+    """Изменения откатились - обновлять нечего"""
+    session.info.pop('search_model_keys', None)
+    session.info.pop('search_levels', None)
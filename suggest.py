@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Подсказки поиска по мере ввода (/search/suggest)
+
+Префиксное дерево в памяти процесса по названиям моделей, брендам и популярным
+запросам. В каждом узле заранее хранится top-k подсказок его поддерева, поэтому
+поиск стоит O(длина префикса) и не обращается к базе.
+
+Ключи подсказки: полное название, его окончания с начала каждого слова
+("16 pro" для "iPhone 16 Pro") и те же строки в нормализованной латинской форме
+search_index ("айфон 16" находит iPhone 16).
+
+Дерево строится из model_cards и пересобирается после пересчета карточек
+в этом процессе, а также не реже раза в SUGGEST_MAX_AGE секунд
+(изменения из других процессов). Новое дерево строится в фоновом потоке,
+запросы тем временем обслуживает прежнее.
+"""
+
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from models import ModelCard
+import model_cards
+from search_index import tokenize
+
+# Сколько подсказок хранится в каждом узле (максимальный limit запроса)
+MAX_SUGGESTIONS = 10
+
+# Не реже чем раз в столько секунд дерево пересобирается из model_cards
+SUGGEST_MAX_AGE = 60
+
+# Запрос попадает в подсказки, если его искали не меньше стольких раз
+POPULAR_QUERY_MIN_COUNT = 3
+
+# Сколько разных запросов помнить для подсказок
+POPULAR_QUERIES_LIMIT = 1000
+
+# Порядок типов подсказок при равном весе
+TYPE_RANK = {'brand': 0, 'query': 1, 'model': 2}
+
+
+class _Node:
+    __slots__ = ('children', 'top')
+
+    def __init__(self):
+        self.children: Dict[str, '_Node'] = {}
+        # [(ключ сортировки, номер подсказки)], не больше MAX_SUGGESTIONS
+        self.top: List[tuple] = []
+
+
+def _normalize_prefix(text: str) -> str:
+    """Ключ дерева: нижний регистр, одиночные пробелы"""
+    return ' '.join(text.lower().split())
+
+
+def _suffix_keys(text: str) -> List[str]:
+    """Ключи подсказки: строка целиком и её окончания с начала каждого слова"""
+    words = _normalize_prefix(text).split(' ')
+    return [' '.join(words[i:]) for i in range(len(words)) if words[i]]
+
+
+class SuggestTrie:
+    """Неизменяемое префиксное дерево подсказок: строится целиком, затем только читается"""
+
+    def __init__(self, entries: List[Dict]):
+        """
+        entries: подсказки {'type', 'text', ...}, поле 'weight' - чем больше, тем выше
+        """
+        self.root = _Node()
+        self.entries = []
+        for entry in entries:
+            weight = entry.pop('weight', 0)
+            number = len(self.entries)
+            self.entries.append(entry)
+            rank = (-weight, TYPE_RANK.get(entry['type'], 9), len(entry['text']), entry['text'])
+
+            keys = set(_suffix_keys(entry['text']))
+            keys.update(_suffix_keys(' '.join(tokenize(entry['text']))))
+            for key in keys:
+                self._insert(key, (rank, number))
+
+    def _insert(self, key: str, item: tuple) -> None:
+        node = self.root
+        for ch in key:
+            node = node.children.setdefault(ch, _Node())
+            top = node.top
+            if item in top:
+                continue
+            if len(top) < MAX_SUGGESTIONS:
+                top.append(item)
+                top.sort()
+            elif item < top[-1]:
+                top[-1] = item
+                top.sort()
+
+    def _lookup(self, key: str) -> List[tuple]:
+        node = self.root
+        for ch in key:
+            node = node.children.get(ch)
+            if node is None:
+                return []
+        return node.top
+
+    def complete(self, text: str, limit: int = MAX_SUGGESTIONS) -> List[Dict]:
+        """Top-k подсказок для введенного текста"""
+        key = _normalize_prefix(text)
+        if not key:
+            return []
+
+        found = list(self._lookup(key))
+        # Та же строка в латинской форме: "айфон 1" -> "ifone 1"
+        normalized = ' '.join(tokenize(text))
+        if normalized and normalized != key:
+            found.extend(item for item in self._lookup(normalized) if item not in found)
+            found.sort()
+        return [self.entries[number] for _, number in found[:limit]]
+
+
+class Suggester:
+    """Подсказки процесса: текущее дерево, его пересборка и статистика запросов"""
+
+    def __init__(self):
+        self._trie: Optional[SuggestTrie] = None
+        self._built_at = 0.0
+        self._stale = True
+        self._build_lock = threading.Lock()
+        self._queries = Counter()
+        self._queries_lock = threading.Lock()
+
+    def invalidate(self, *_args) -> None:
+        """Пометить дерево устаревшим (подписчик model_cards)"""
+        self._stale = True
+
+    def record_query(self, query: str) -> None:
+        """Учесть поисковый запрос, который дал результаты"""
+        query = _normalize_prefix(query)
+        if len(query) < 2:
+            return
+        with self._queries_lock:
+            self._queries[query] += 1
+            if len(self._queries) > POPULAR_QUERIES_LIMIT * 2:
+                self._queries = Counter(dict(self._queries.most_common(POPULAR_QUERIES_LIMIT)))
+
+    def _entries(self, db: Session) -> List[Dict]:
+        entries = []
+        brands = set()
+        for card in db.query(ModelCard):
+            brands.add(card.brand)
+            if not card.level_2:
+                continue
+            images = model_cards.card_images(card)
+            entries.append({
+                'type': 'model',
+                'text': card.level_2,
+                'model': card.level_2,
+                'brand': card.brand,
+                'price': card.price,
+                'image': images[0] if images else '',
+                'weight': 0,
+            })
+        for brand in brands:
+            entries.append({'type': 'brand', 'text': brand, 'brand': brand, 'weight': 0})
+
+        with self._queries_lock:
+            popular = self._queries.most_common(POPULAR_QUERIES_LIMIT)
+        for query, count in popular:
+            if count >= POPULAR_QUERY_MIN_COUNT:
+                entries.append({'type': 'query', 'text': query, 'weight': count})
+        return entries
+
+    def _fresh(self) -> bool:
+        return self._trie is not None and not self._stale and time.monotonic() - self._built_at < SUGGEST_MAX_AGE
+
+    def _rebuild(self, db: Session) -> None:
+        try:
+            if self._fresh():
+                return
+            self._stale = False
+            model_cards.ensure_model_cards(db)
+            self._trie = SuggestTrie(self._entries(db))
+            self._built_at = time.monotonic()
+        finally:
+            self._build_lock.release()
+
+    def _rebuild_in_background(self, bind) -> None:
+        db = Session(bind=bind)
+        try:
+            self._rebuild(db)
+        except Exception as e:
+            print(f"⚠️ Не удалось пересобрать подсказки: {e}")
+        finally:
+            db.close()
+
+    def refresh(self, db: Session) -> None:
+        """
+        Пересобрать дерево, если оно устарело
+        Первое построение - в текущем запросе; дальше дерево пересобирается
+        в фоновом потоке, а запросы тем временем читают прежнее
+        """
+        if self._fresh():
+            return
+        if self._trie is None:
+            self._build_lock.acquire()
+            self._rebuild(db)
+        elif self._build_lock.acquire(blocking=False):
+            threading.Thread(target=self._rebuild_in_background, args=(db.get_bind(),), daemon=True).start()
+
+    def suggest(self, db: Session, text: str, limit: int = 8) -> List[Dict]:
+        """Подсказки для введенного текста"""
+        self.refresh(db)
+        return self._trie.complete(text, max(0, min(limit, MAX_SUGGESTIONS)))
+
+
+suggester = Suggester()
+model_cards.add_refresh_listener(suggester.invalidate)
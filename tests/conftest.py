@@ -0,0 +1,50 @@
+"""
+Общая настройка тестов: база, файлы цен и индексов - во временной директории
+
+Переменные окружения задаются до импорта модулей проекта (Config читает их при импорте).
+"""
+
+import os
+import sys
+import tempfile
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+WORK_DIR = tempfile.mkdtemp(prefix="yo_store_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(WORK_DIR, 'catalog.db')}"
+os.environ["PRICES_FILE"] = os.path.join(WORK_DIR, "prices.json")
+os.environ["SEARCH_INDEX_FILE"] = os.path.join(WORK_DIR, "search.db")
+os.environ["CATALOG_GENERATION_FILE"] = os.path.join(WORK_DIR, "generation")
+os.environ["IMPORT_JOBS_DIR"] = os.path.join(WORK_DIR, "import_jobs")
+
+import pytest
+
+from database import SessionLocal, create_tables, ensure_variant_columns
+
+create_tables()
+ensure_variant_columns()
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture(scope="session")
+def client():
+    """TestClient API без lifespan (фоновые задачи не запускаются)"""
+    from fastapi.testclient import TestClient
+
+    # api.py монтирует static относительно текущей директории
+    cwd = os.getcwd()
+    os.chdir(PROJECT_DIR)
+    try:
+        import api
+    finally:
+        os.chdir(cwd)
+    return TestClient(api.app)
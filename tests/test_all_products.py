@@ -0,0 +1,21 @@
+import pytest
+
+
+def test_stream_error_is_not_a_complete_array(client, monkeypatch):
+    import api
+
+    def broken_page(db, limit, cursor):
+        if cursor is None:
+            return [], "next"
+        raise RuntimeError("нет базы")
+
+    monkeypatch.setattr(api, 'all_products_page', broken_page)
+    chunks = []
+    # Ошибка доходит до сервера - соединение обрывается вместо закрытого массива
+    with pytest.raises(RuntimeError, match="нет базы"):
+        for chunk in api.stream_all_products():
+            chunks.append(chunk)
+    assert chunks == ["["]
+
+    with pytest.raises(RuntimeError, match="нет базы"):
+        client.get("/all-products")
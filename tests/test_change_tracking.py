@@ -0,0 +1,68 @@
+import json
+
+from category_counts import category_counts
+from facets import facet_index
+from models import Category, ModelCard, Product
+
+
+def counts(db) -> dict:
+    return {category["level_0"]: category["product_count"] for category in category_counts.categories(db)}
+
+
+def test_moved_product_updates_counts_cards_and_facets(db):
+    db.add_all([Category(level_0="Старая категория"), Category(level_0="Новая категория")])
+    db.add(Product(sku="TEST-MOVE-1", name="Move Phone", brand="MoveBrand", level_0="Старая категория",
+                   level_1="Move Series", level_2="Move Phone", stock=1, is_available=True,
+                   specifications=json.dumps({"color": "Black"})))
+    db.commit()
+    facet_index.ensure(db)
+    before = counts(db)
+
+    # После commit атрибуты не загружены: прежние значения дает track_previous_values
+    product = db.query(Product).filter_by(sku="TEST-MOVE-1").one()
+    db.expire(product)
+    product.level_0 = "Новая категория"
+    product.level_2 = "Move Phone 2"
+    db.commit()
+
+    after = counts(db)
+    assert after["Старая категория"] == before["Старая категория"] - 1
+    assert after["Новая категория"] == before["Новая категория"] + 1
+    assert db.query(ModelCard).filter_by(level_2="Move Phone", brand="MoveBrand").count() == 0
+    assert db.query(ModelCard).filter_by(level_2="Move Phone 2", brand="MoveBrand").count() == 1
+    assert facet_index.facets({"level_0": "Новая категория", "brand": "MoveBrand"})["total"] == 1
+    assert facet_index.facets({"level_0": "Старая категория", "brand": "MoveBrand"})["total"] == 0
+
+
+def test_failed_facet_update_invalidates_index(db, monkeypatch):
+    import facets
+
+    facet_index.ensure(db)
+
+    def broken_update(db, product_ids):
+        raise RuntimeError("нет базы")
+
+    monkeypatch.setattr(facet_index, 'update_products', broken_update)
+    facets._update_in_new_session(db.get_bind(), {1})
+    monkeypatch.undo()
+
+    # Индекс сброшен - ensure перестраивает его, даже если поколение не менялось
+    rebuilt = []
+    monkeypatch.setattr(facet_index, 'rebuild', lambda db: rebuilt.append(True))
+    facet_index.ensure(db)
+    assert rebuilt == [True]
+
+
+def test_failed_count_update_does_not_fail_commit(db, monkeypatch):
+    before = counts(db)
+
+    def broken_apply(deltas, categories_changed):
+        raise RuntimeError("нет базы")
+
+    monkeypatch.setattr(category_counts, 'apply_changes', broken_apply)
+    db.add(Category(level_0="Категория со сбоем"))
+    db.commit()
+    monkeypatch.undo()
+
+    # Данные записаны, сброшенный список перечитывается из базы
+    assert counts(db) == {**before, "Категория со сбоем": 0}
@@ -0,0 +1,56 @@
+import io
+import json
+
+import pytest
+from openpyxl import load_workbook
+
+import excel_export
+import price_storage
+from models import Product, ProductImage
+
+
+def build_sheets(db):
+    prices = price_storage.get_prices_snapshot()
+    return [
+        excel_export.ExportSheet("Товары", excel_export.PRODUCT_HEADERS, excel_export.product_rows(db, prices)),
+        excel_export.ExportSheet("Изображения", excel_export.IMAGE_HEADERS, excel_export.image_rows(db),
+                                 header_color="27ae60", max_width=80),
+    ]
+
+
+def test_iter_xlsx_streams_all_sheets(db, monkeypatch):
+    # Маленькие части - чтобы книга точно пришла несколькими частями
+    monkeypatch.setattr(excel_export, 'STREAM_CHUNK_SIZE', 1024)
+    db.add_all([
+        Product(sku=f"TEST-EXPORT-{i}", name=f"Export Phone {i}", brand="ExportBrand", level_0="Смартфоны",
+                level_1="Export Series", level_2="Export Phone", stock=i, is_available=True,
+                specifications=json.dumps({"color": "Black"}))
+        for i in range(300)
+    ])
+    db.add(ProductImage(level_2="Export Phone", color="Black", img_list=json.dumps(["/static/export/1.jpg"])))
+    db.commit()
+    price_storage.update_prices({
+        "TEST-EXPORT-1": {'price': 500.0, 'old_price': 500.0, 'currency': 'RUB', 'is_parse': True}
+    })
+
+    chunks = list(excel_export.iter_xlsx(build_sheets))
+
+    assert len(chunks) > 1
+    wb = load_workbook(io.BytesIO(b''.join(chunks)))
+    assert wb.sheetnames == ["Товары", "Изображения"]
+    products = wb["Товары"]
+    assert [cell.value for cell in products[1]] == excel_export.PRODUCT_HEADERS
+    assert products["A1"].font.b
+    rows = {row[0]: row for row in products.iter_rows(min_row=2, values_only=True)}
+    assert {f"TEST-EXPORT-{i}" for i in range(300)} <= rows.keys()
+    assert rows["TEST-EXPORT-1"][7] == 500.0
+    images = list(wb["Изображения"].iter_rows(min_row=2, values_only=True))
+    assert ("Export Phone", "Black", "/static/export/1.jpg") in images
+
+
+def test_iter_xlsx_reports_errors(db):
+    def broken_sheets(db):
+        raise RuntimeError("нет базы")
+
+    with pytest.raises(RuntimeError, match="нет базы"):
+        next(excel_export.iter_xlsx(broken_sheets))
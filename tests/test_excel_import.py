@@ -0,0 +1,120 @@
+import io
+import json
+
+from openpyxl import Workbook
+
+import excel_import
+import price_storage
+from category_counts import category_counts
+from facets import facet_index
+from models import Category, ModelCard, Product, ProductImage
+
+PRODUCT_HEADERS = [
+    'SKU товара', 'Название товара*', 'Описание', 'Основная категория (level0)*', 'Подкатегория (level1)*',
+    'Детальная категория (level2)*', 'Бренд', 'Цена*', 'Валюта', 'Количество на складе',
+    'URL изображения (через запятую)', 'Характеристики (JSON)'
+]
+IMAGE_HEADERS = ['Модель (level_2)*', 'Цвет*', 'URL изображений (через запятую)*']
+
+
+def build_feed(rows) -> bytes:
+    wb = Workbook()
+    products = wb.active
+    products.title = "Товары"
+    products.append(PRODUCT_HEADERS)
+    for row in rows:
+        products.append(row)
+    images = wb.create_sheet("Изображения")
+    images.append(IMAGE_HEADERS)
+    images.append(["Test Phone", "Black", "/static/test/black/1.jpg, /static/test/black/2.jpg"])
+    output = io.BytesIO()
+    wb.save(output)
+    return output.getvalue()
+
+
+def test_import_products_adds_rows(db):
+    specs = json.dumps({"color": "Black", "disk": "256GB"})
+    feed = build_feed([
+        ["TEST-IMPORT-1", "Test Phone 256GB Black", "", "Смартфоны", "Test Series", "Test Phone",
+         "Brand", 10000, "RUB", 3, "", specs],
+        ["TEST-IMPORT-2", "Test Phone 512GB Black", "", "Смартфоны", "Test Series", "Test Phone",
+         "Brand", 12000, "RUB", 1, "", specs],
+        # SKU из предыдущей пачки - ошибка строки, остальные строки пачки записываются
+        ["TEST-IMPORT-1", "Duplicate", "", "Смартфоны", "Test Series", "Test Phone", "Brand", 1, "RUB", 1, "", ""],
+        ["TEST-IMPORT-3", "Test Phone 1TB Black", "", "Смартфоны", "Test Series", "Test Phone",
+         "Brand", 15000, "RUB", 2, "", specs],
+    ])
+
+    result = excel_import.import_products(db, feed, chunk_size=2)
+
+    assert result["added"] == 3
+    assert result["total_processed"] == 4
+    assert result["errors"] == ["Строка 4: SKU 'TEST-IMPORT-1' уже существует"]
+    assert result["images_added"] == 1
+
+    skus = {sku for (sku,) in db.query(Product.sku).filter(Product.sku.like("TEST-IMPORT-%"))}
+    assert skus == {"TEST-IMPORT-1", "TEST-IMPORT-2", "TEST-IMPORT-3"}
+    assert db.query(ProductImage).filter_by(level_2="Test Phone", color="Black").count() == 1
+    assert price_storage.get_price("TEST-IMPORT-2")["price"] == 12000.0
+
+
+def test_upsert_products_inserts_new_rows_and_updates_indexes(db):
+    facet_index.ensure(db)
+    category_counts.categories(db)
+    specs = json.dumps({"color": "Blue", "disk": "128GB"})
+    feed = build_feed([
+        ["TEST-UPSERT-1", "Tabula 128GB Blue", "", "Планшеты", "Tabula Series", "Tabula",
+         "UpsertBrand", 30000, "RUB", 4, "", specs],
+        ["TEST-UPSERT-2", "Tabula 256GB Blue", "", "Планшеты", "Tabula Series", "Tabula",
+         "UpsertBrand", 35000, "RUB", 2, "", specs],
+    ])
+
+    result = excel_import.upsert_products(db, feed)
+
+    assert result["added"] == 2
+    assert result["categories_added"] == 3
+    product = db.query(Product).filter_by(sku="TEST-UPSERT-1").one()
+    assert (product.color_value, product.disk_value, product.is_available) == ("Blue", "128GB", True)
+    assert product.created_at is not None
+    assert db.query(Category).filter_by(level_0="Планшеты").count() == 3
+
+    # Строки записаны core INSERT - индексы обновлены явными отметками, а не событиями ORM
+    assert db.query(ModelCard).filter_by(level_2="Tabula", brand="UpsertBrand").one().sku.startswith("TEST-UPSERT-")
+    assert facet_index.facets({"brand": "UpsertBrand"})["total"] == 2
+    counts = {category["level_0"]: category["product_count"] for category in category_counts.categories(db)}
+    assert counts["Планшеты"] == 2
+
+
+def build_price_sheet(rows) -> bytes:
+    wb = Workbook()
+    sheet = wb.active
+    sheet.title = "Цены"
+    sheet.append(['SKU товара*', 'Название товара', 'Новая цена*', 'Старая цена', 'Валюта'])
+    for row in rows:
+        sheet.append(row)
+    output = io.BytesIO()
+    wb.save(output)
+    return output.getvalue()
+
+
+def test_import_prices_keeps_or_removes_discount(db):
+    db.add_all([
+        Product(sku=f"TEST-PRICE-{i}", name=f"Price Phone {i}", brand="PriceBrand", level_0="Смартфоны",
+                level_1="Price Series", level_2="Price Phone", stock=1, is_available=True)
+        for i in (1, 2)
+    ])
+    db.commit()
+    price_storage.update_prices({
+        f"TEST-PRICE-{i}": {'price': 900.0, 'old_price': 1000.0, 'currency': 'RUB', 'is_parse': True} for i in (1, 2)
+    })
+
+    result = excel_import.import_prices(db, build_price_sheet([
+        # Старой цены в файле нет - скидка сохраняется
+        ["TEST-PRICE-1", "", 900, None, "RUB"],
+        # Старая цена равна новой - скидка убирается
+        ["TEST-PRICE-2", "", 900, 900, "RUB"],
+    ]))
+
+    assert (result["updated"], result["unchanged"], result["errors"]) == (1, 1, [])
+    assert price_storage.get_price("TEST-PRICE-1")["old_price"] == 1000.0
+    assert price_storage.get_price("TEST-PRICE-2")["old_price"] == 900.0
@@ -0,0 +1,66 @@
+import json
+
+from sqlalchemy import update
+
+import catalog_generation
+import model_cards
+import price_storage
+from database import engine
+from models import ModelCard, Product
+
+
+def add_model(db, level_2, brand, variants):
+    db.add_all(Product(sku=sku, name=f"{level_2} {sku}", brand=brand, level_0=level_0, level_1=f"{brand} Series",
+                       level_2=level_2, stock=1, is_available=True)
+               for sku, level_0 in variants)
+    db.commit()
+
+
+def card(db, level_2, brand) -> ModelCard:
+    db.expire_all()
+    return db.query(ModelCard).filter_by(level_2=level_2, brand=brand).one()
+
+
+def test_cards_rebuild_after_changes_from_other_processes(db, monkeypatch):
+    add_model(db, "Foreign Phone", "ForeignBrand", [("TEST-FOREIGN-1", "Смартфоны"), ("TEST-FOREIGN-2", "Смартфоны")])
+    price_storage.update_prices({
+        "TEST-FOREIGN-1": {'price': 500.0, 'old_price': 500.0, 'currency': 'RUB', 'is_parse': True},
+        "TEST-FOREIGN-2": {'price': 600.0, 'old_price': 600.0, 'currency': 'RUB', 'is_parse': True},
+    })
+    model_cards.ensure_model_cards(db)
+    assert card(db, "Foreign Phone", "ForeignBrand").price == 500.0
+
+    # Файл цен изменен вручную - ни поколение, ни подписчики price_storage об этом не знают
+    file_path = price_storage._get_prices_file_path()
+    with open(file_path, 'r', encoding='utf-8') as f:
+        prices = json.load(f)
+    prices["TEST-FOREIGN-2"]['price'] = 300.0
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump(prices, f)
+    model_cards.ensure_model_cards(db)
+    assert card(db, "Foreign Phone", "ForeignBrand").price == 300.0
+
+    # Другой процесс изменил товар в обход обработчиков этого процесса и увеличил поколение
+    with engine.begin() as conn:
+        conn.execute(update(Product).where(Product.sku == "TEST-FOREIGN-1").values(name="Renamed Phone"))
+    catalog_generation._write_next_generation()
+    model_cards.ensure_model_cards(db)
+    assert card(db, "Foreign Phone", "ForeignBrand").name == "Renamed Phone"
+
+    # Пересборка без изменений не увеличивает поколение - иначе процессы пересобирали бы карточки друг за другом
+    generation = catalog_generation._write_next_generation()
+    model_cards.ensure_model_cards(db)
+    assert catalog_generation.current() == generation
+    rebuilt = []
+    monkeypatch.setattr(model_cards, 'refresh_model_cards', lambda db: rebuilt.append(True))
+    model_cards.ensure_model_cards(db)
+    assert rebuilt == []
+
+def test_category_filter_matches_any_variant(client, db):
+    # Представитель модели (минимальный id) - в первой категории, второй вариант - в другой
+    add_model(db, "Split Phone", "SplitBrand", [("TEST-SPLIT-1", "Смартфоны"), ("TEST-SPLIT-2", "Планшеты")])
+
+    for level0 in ("Смартфоны", "Планшеты"):
+        response = client.get("/products", params={"brand": "SplitBrand", "level0": level0})
+        assert [product["level_2"] for product in response.json()] == ["Split Phone"]
+    assert client.get("/products", params={"brand": "SplitBrand", "level0": "Ноутбуки"}).json() == []
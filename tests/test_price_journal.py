@@ -0,0 +1,72 @@
+import json
+import os
+
+import pytest
+
+import price_storage
+
+
+@pytest.fixture
+def journal(tmp_path, monkeypatch):
+    """Хранилище цен в режиме журнала во временной директории; возвращает путь к журналу"""
+    monkeypatch.setattr(price_storage, 'PRICES_FILE', str(tmp_path / 'prices.json'))
+    monkeypatch.setattr(price_storage, 'PRICES_STORAGE_MODE', 'journal')
+    monkeypatch.setattr(price_storage, 'PRICES_JOURNAL_COMPACT_EVERY', 1000)
+    price_storage._index.invalidate()
+    with open(tmp_path / 'prices.json', 'w', encoding='utf-8') as f:
+        json.dump({f"SKU-{i}": {"price": 1000.0 + i, "old_price": 1000.0 + i, "currency": "RUB", "is_parse": True}
+                   for i in range(20)}, f)
+    yield price_storage._get_journal_file_path()
+    price_storage._index.invalidate()
+
+
+def reload_prices() -> dict:
+    """Цены так, как их прочитает новый процесс после сбоя"""
+    price_storage._index.invalidate()
+    return {sku: info['price'] for sku, info in price_storage.get_all_prices().items()}
+
+
+def write_acknowledged(count: int) -> dict:
+    acknowledged = {}
+    for i in range(count):
+        sku, price = f"SKU-{i % 20}", 5000.0 + i
+        assert price_storage.set_price(sku, price)
+        acknowledged[sku] = price
+    return acknowledged
+
+
+def test_torn_last_line_keeps_acknowledged_prices(journal):
+    acknowledged = write_acknowledged(30)
+    # Сбой посреди записи: последняя строка журнала не дописана
+    with open(journal, 'a', encoding='utf-8') as f:
+        f.write('{"sku": "SKU-1", "price": 99')
+
+    prices = reload_prices()
+    assert {sku: prices[sku] for sku in acknowledged} == acknowledged
+    assert reload_prices() == prices
+
+    # Запись после сбоя не склеивается с недописанной строкой
+    assert price_storage.set_price("SKU-2", 7777.0)
+    assert reload_prices()["SKU-2"] == 7777.0
+
+
+def test_crash_before_compaction_replays_idempotently(journal):
+    acknowledged = write_acknowledged(30)
+    expected = reload_prices()
+
+    # Сбой при компактизации: новый снимок записан, журнал еще не удален
+    price_storage._save_prices(price_storage._load_prices())
+    assert os.path.exists(journal)
+    assert reload_prices() == expected
+    assert reload_prices() == expected
+
+    # Сбой до записи снимка: остался только временный файл
+    with open(price_storage._get_prices_file_path() + '.tmp', 'w', encoding='utf-8') as f:
+        f.write('{"SKU-1": ')
+    assert reload_prices() == expected
+
+    assert price_storage.compact_prices()
+    assert not os.path.exists(journal)
+    prices = reload_prices()
+    assert prices == expected
+    assert {sku: prices[sku] for sku in acknowledged} == acknowledged
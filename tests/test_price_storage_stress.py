@@ -0,0 +1,56 @@
+import json
+import multiprocessing
+
+import pytest
+
+import price_storage
+
+PROCESSES = 3
+WRITES = 200
+
+
+def write_prices(args) -> list:
+    """Пишущий процесс: WRITES вызовов update_prices; возвращает версию цен после каждого"""
+    file_path, mode, number = args
+    price_storage.PRICES_FILE = file_path
+    price_storage.PRICES_STORAGE_MODE = mode
+    price_storage.PRICES_JOURNAL_COMPACT_EVERY = 50
+    versions = []
+    for i in range(WRITES):
+        assert price_storage.update_prices({f"P{number}-{i:04d}": {"price": 100.0 + i, "currency": "RUB"}})
+        with price_storage._storage_lock(exclusive=False) as fd:
+            versions.append(price_storage._read_version(fd))
+    return versions
+
+
+@pytest.mark.parametrize("mode", ["json", "journal"])
+def test_concurrent_writers_do_not_lose_prices(tmp_path, mode):
+    file_path = str(tmp_path / "prices.json")
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump({f"SKU-{i}": {"price": 1000.0, "old_price": 1000.0, "currency": "RUB", "is_parse": True}
+                   for i in range(200)}, f)
+
+    # spawn - чистые процессы, как отдельные воркеры API и скрипт обновления цен
+    with multiprocessing.get_context("spawn").Pool(PROCESSES) as pool:
+        results = pool.map(write_prices, [(file_path, mode, number) for number in range(PROCESSES)])
+
+    for versions in results:
+        assert versions == sorted(set(versions))
+
+    # Файл цен читается целиком (журнал свернут в снимок) и содержит каждую запись
+    previous_file, previous_mode = price_storage.PRICES_FILE, price_storage.PRICES_STORAGE_MODE
+    price_storage.PRICES_FILE, price_storage.PRICES_STORAGE_MODE = file_path, mode
+    try:
+        assert price_storage.compact_prices()
+        with open(file_path, 'r', encoding='utf-8') as f:
+            prices = json.load(f)
+        with open(price_storage._get_lock_file_path(), 'r') as f:
+            version = int(f.read())
+    finally:
+        price_storage.PRICES_FILE, price_storage.PRICES_STORAGE_MODE = previous_file, previous_mode
+        price_storage._index.invalidate()
+
+    expected = {f"P{number}-{i:04d}": 100.0 + i for number in range(PROCESSES) for i in range(WRITES)}
+    assert {sku: prices[sku]["price"] for sku in expected if sku in prices} == expected
+    assert len(prices) == 200 + len(expected)
+    assert version >= PROCESSES * WRITES
@@ -0,0 +1,102 @@
+import logging
+from datetime import datetime, timedelta
+
+import pytest
+import requests
+
+import price_sync_scheduler
+import update_prices_from_service as updater
+from config import Config
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    """Сервис цен без /changes (404): считает запросы полной синхронизации"""
+    monkeypatch.setattr(updater, 'PRICE_SYNC_MODE', 'delta')
+    monkeypatch.setattr(updater, 'PRICE_SYNC_STATE_FILE', str(tmp_path / 'price_sync_state.json'))
+    monkeypatch.setattr(Config, 'PRICE_SYNC_LOCK_FILE', str(tmp_path / 'price_sync.lock'))
+    monkeypatch.setattr(Config, 'PRICE_SYNC_STATUS_FILE', str(tmp_path / 'price_sync_status.json'))
+
+    calls = {'full': 0, 'changes_supported': False}
+
+    def post_json(session, url, payload, label):
+        if not calls['changes_supported']:
+            response = requests.Response()
+            response.status_code = 404
+            raise requests.exceptions.HTTPError(response=response)
+        return {'prices': {}, 'cursor': '42', 'has_more': False}
+
+    def fetch_prices(skus):
+        calls['full'] += 1
+        return {sku: {'price': 100.0} for sku in skus}, 0
+
+    monkeypatch.setattr(updater, '_post_json', post_json)
+    monkeypatch.setattr(updater, '_fetch_prices', fetch_prices)
+    monkeypatch.setattr(updater, 'get_all_skus', lambda: ['SKU-1'])
+    monkeypatch.setattr(updater, 'update_prices_in_json', lambda prices: {
+        'updated': len(prices), 'created': 0, 'not_found': 0, 'errors': 0, 'saved': True
+    })
+    return calls
+
+
+def test_full_sync_cadence_when_changes_unsupported(service):
+    run = price_sync_scheduler.run_once()
+    assert run['mode'] == 'full' and run['ok']
+    assert service['full'] == 1
+
+    # Сервис не поддерживает изменения - следующие запуски не тянут все цены заново
+    assert price_sync_scheduler.run_once() is None
+    assert price_sync_scheduler.run_once() is None
+    assert service['full'] == 1
+    # Явная полная синхронизация выполняется всегда
+    assert price_sync_scheduler.run_once(full=True)['mode'] == 'full'
+    assert service['full'] == 2
+
+    # Прошел PRICE_SYNC_FALLBACK_MINUTES, сервис начал отдавать изменения
+    state = updater._load_sync_state()
+    state['full_sync_at'] = (datetime.now() - timedelta(minutes=updater.PRICE_SYNC_FALLBACK_MINUTES)).isoformat()
+    updater._save_sync_state(state)
+    service['changes_supported'] = True
+    assert price_sync_scheduler.run_once()['mode'] == 'full'
+    assert service['full'] == 3
+    assert updater._load_sync_state()['cursor'] == '42'
+
+    # Дальше - инкрементальная синхронизация на каждом запуске
+    assert price_sync_scheduler.run_once()['mode'] == 'delta'
+    assert service['full'] == 3
+
+
+def test_import_does_not_configure_logging():
+    # Логирование скрипта настраивается только при запуске из командной строки
+    assert not any(getattr(handler, 'baseFilename', '').endswith('price_updater.log')
+                   for handler in logging.getLogger().handlers)
+
+
+def test_status_reports_running_without_lock(service, monkeypatch):
+    seen = []
+
+    def fetch_prices(skus):
+        # Проверка статуса во время синхронизации не захватывает блокировку
+        seen.append(price_sync_scheduler.scheduler.status()['running'])
+        seen.append(price_sync_scheduler._try_lock() is None)
+        return {sku: {'price': 100.0} for sku in skus}, 0
+
+    monkeypatch.setattr(updater, '_fetch_prices', fetch_prices)
+    assert price_sync_scheduler.run_once(full=True)['ok']
+    assert seen == [True, True]
+    status = price_sync_scheduler.scheduler.status()
+    assert not status['running'] and 'current_run' not in status
+
+    # Запись процесса, завершившегося посреди синхронизации, не считается идущим запуском
+    status['current_run'] = {'pid': 2 ** 22 + 1, 'started_at': '2025-11-10T12:00:00'}
+    price_sync_scheduler._write_status(status)
+    assert not price_sync_scheduler.scheduler.status()['running']
+
+
+def test_full_mode_is_default_and_limits_in_process_runs(monkeypatch):
+    assert updater.PRICE_SYNC_MODE == 'full'
+    scheduler = price_sync_scheduler.PriceSyncScheduler(interval=60, jitter=0)
+    assert scheduler.min_interval() == updater.PRICE_SYNC_FALLBACK_MINUTES * 60
+
+    monkeypatch.setattr(updater, 'PRICE_SYNC_MODE', 'delta')
+    assert scheduler.min_interval() == 30
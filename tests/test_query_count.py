@@ -0,0 +1,76 @@
+import json
+
+import pytest
+from sqlalchemy import event
+
+import price_storage
+from database import engine
+from models import Level2Description, Product, ProductImage
+
+COLORS = ["Black", "White", "Blue"]
+LIMITS = (2, 5, 20)
+# /search: товары-представители, цены моделей, описания, изображения; /products читает готовые карточки
+MAX_QUERIES_PER_PAGE = 4
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    """Небольшой каталог: модели с вариантами, описаниями, изображениями и ценами"""
+    from database import SessionLocal
+
+    db = SessionLocal()
+    prices = {}
+    try:
+        for m in range(25):
+            level_2 = f"Querycount Phone {m:03d}"
+            db.add(Level2Description(level_2=level_2, description=f"Описание {level_2}",
+                                     details=json.dumps({"screen": "6.1"})))
+            for color in COLORS:
+                db.add(ProductImage(level_2=level_2, color=color,
+                                    img_list=json.dumps([f"/static/{m}/{color}/1.jpg", f"/static/{m}/{color}/2.jpg"])))
+            for v in range(3):
+                sku = f"TEST-QC-{m:03d}-{v}"
+                db.add(Product(sku=sku, name=f"{level_2} {v}", brand="QuerycountBrand", level_0="Querycount",
+                               level_1="Querycount Series", level_2=level_2, stock=1, is_available=True,
+                               specifications=json.dumps({"color": COLORS[v], "disk": f"{128 * (v + 1)}GB"})))
+                prices[sku] = {"price": 50000.0 + m * 100 + v, "old_price": 60000.0 + m * 100,
+                               "currency": "RUB", "is_parse": True}
+        db.commit()
+    finally:
+        db.close()
+    price_storage.update_prices(prices)
+
+
+@pytest.fixture
+def count_queries():
+    """Считает SQL запросы, выполненные через engine во время вызова"""
+    statements = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    def run(client, url):
+        statements.clear()
+        event.listen(engine, "before_cursor_execute", on_execute)
+        try:
+            response = client.get(url)
+        finally:
+            event.remove(engine, "before_cursor_execute", on_execute)
+        assert response.status_code == 200
+        return len(statements), len(response.json())
+
+    return run
+
+
+@pytest.mark.parametrize("path", ["/products?level0=Querycount&", "/search?q=Querycount&"])
+def test_query_count_does_not_depend_on_limit(client, catalog, count_queries, path):
+    # Первый запрос строит карточки моделей и поисковый индекс - в замер не входит
+    client.get(f"{path}limit=1")
+    counts = []
+    for limit in LIMITS:
+        queries, cards = count_queries(client, f"{path}limit={limit}")
+        assert cards == limit
+        counts.append(queries)
+    # Нет N+1 по вариантам, описаниям и изображениям
+    assert len(set(counts)) == 1, counts
+    assert counts[0] <= MAX_QUERIES_PER_PAGE
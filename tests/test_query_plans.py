@@ -0,0 +1,128 @@
+import json
+import random
+import re
+
+import pytest
+from sqlalchemy import event
+
+import catalog_generation
+import price_storage
+from database import SessionLocal, engine
+from models import Category, Level2Description, Product, ProductImage, parse_specifications, variant_values
+
+CATEGORIES = {
+    "Plan Смартфоны": ["PlanApple", "PlanSamsung"],
+    "Plan Ноутбуки": ["PlanApple", "PlanLenovo"],
+}
+COLORS = ["Black", "White", "Blue"]
+DISKS = ["128GB", "256GB", "512GB"]
+
+# План SQLite: "SCAN products" - полный просмотр таблицы; "SCAN products USING INDEX ..." -
+# обход индекса (с LIMIT или покрывающий), "SEARCH ..." - поиск по индексу
+FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+
+SAMPLE = {"level_0": "Plan Смартфоны", "level_1": "PlanApple 1 Series", "level_2": "PlanApple Model 1.1",
+          "brand": "PlanApple", "color": "White"}
+
+# Endpoints, которые должны обходиться индексами (/debug/db-status и /api/images читают таблицу целиком)
+ENDPOINTS = [
+    ("/categories", {}),
+    ("/products", {}),
+    ("/products", {"brand": SAMPLE["brand"], "limit": 50}),
+    ("/products", {"level0": SAMPLE["level_0"]}),
+    ("/products", {"level2": SAMPLE["level_2"]}),
+    ("/products", {"color": SAMPLE["color"], "disk": "256GB"}),
+    ("/products", {"offset": 40, "limit": 20}),
+    (f"/products/{SAMPLE['level_2']}/variants", {}),
+    ("/all-products", {"limit": 50}),
+    ("/search", {"q": SAMPLE["brand"]}),
+    ("/search/suggest", {"q": SAMPLE["brand"][:5]}),
+    ("/facets", {"level0": SAMPLE["level_0"], "color": SAMPLE["color"]}),
+    ("/hierarchy/brands", {}),
+    ("/hierarchy/brands", {"level0": SAMPLE["level_0"]}),
+    ("/hierarchy/levels", {"level": 0}),
+    ("/hierarchy/levels", {"level": 1, "parent_level0": SAMPLE["level_0"]}),
+    ("/hierarchy/levels", {"level": 1, "brand": SAMPLE["brand"]}),
+    ("/hierarchy/levels", {"level": 2, "parent_level1": SAMPLE["level_1"]}),
+    ("/hierarchy/models", {"brand": SAMPLE["brand"], "level1": SAMPLE["level_1"]}),
+    ("/hierarchy/skus", {"model": SAMPLE["level_2"]}),
+    ("/hierarchy/skus", {"brand": SAMPLE["brand"], "level1": SAMPLE["level_1"]}),
+    (f"/level2-descriptions/{SAMPLE['level_2'].lower()}", {}),
+    (f"/product-images/{SAMPLE['level_2']}/{SAMPLE['color']}", {}),
+    (f"/api/images/{SAMPLE['level_2']}/{SAMPLE['color']}", {}),
+    ("/api/orders", {}),
+]
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    """Небольшой каталог со связанными таблицами (без статистики ANALYZE план не зависит от размера таблиц)"""
+    rng = random.Random(42)
+    rows, prices, model_colors, hierarchy = [], {}, {}, set()
+    for i in range(300):
+        level_0 = list(CATEGORIES)[i % 2]
+        brand = CATEGORIES[level_0][i // 2 % 2]
+        series = i // 4 % 3
+        level_1 = f"{brand} {series} Series"
+        level_2 = f"{brand} Model {series}.{i % 5}"
+        specifications = json.dumps({"color": COLORS[i % 3], "disk": rng.choice(DISKS)})
+        sku = f"TEST-PLAN-{i:04d}"
+        rows.append({
+            "sku": sku, "name": f"{level_2} {i}", "brand": brand, "level_0": level_0, "level_1": level_1,
+            "level_2": level_2, "specifications": specifications, "stock": 1, "is_available": True,
+            **variant_values(parse_specifications(specifications)),
+        })
+        prices[sku] = {"price": float(rng.randrange(5000, 200000)), "old_price": 0.0, "currency": "RUB"}
+        model_colors.setdefault(level_2, set()).add(COLORS[i % 3])
+        hierarchy.add((level_0, level_1, level_2))
+
+    # Через сессию ORM - индексы процесса (карточки, поиск, фасеты) узнают о товарах после commit
+    db = SessionLocal()
+    try:
+        db.add_all(Product(**row) for row in rows)
+        db.add_all(Category(level_0=level_0, level_1=level_1, level_2=level_2)
+                   for level_0, level_1, level_2 in sorted(hierarchy))
+        db.add_all(Level2Description(level_2=level_2, description=f"Описание {level_2}", details="{}")
+                   for level_2 in model_colors)
+        db.add_all(ProductImage(level_2=level_2, color=color, img_list=json.dumps([f"/static/{level_2}/{color}.jpg"]))
+                   for level_2, colors in model_colors.items() for color in colors)
+        db.commit()
+    finally:
+        db.close()
+    price_storage.update_prices(prices)
+
+
+@pytest.fixture
+def admin_client(client):
+    import api
+
+    client.cookies.set("admin_session", api.ADMIN_SESSION_TOKEN)
+    yield client
+    client.cookies.clear()
+
+
+@pytest.mark.filterwarnings("error::sqlalchemy.exc.SAWarning")
+@pytest.mark.parametrize("path, params", ENDPOINTS, ids=[f"{path} {params}" for path, params in ENDPOINTS])
+def test_endpoint_does_not_scan_tables(admin_client, catalog, path, params):
+    # Первый запрос строит индексы в памяти и model_cards - проверяется второй, как в работающем API
+    assert admin_client.get(path, params=params).status_code == 200
+    catalog_generation.bump()
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        assert admin_client.get(path, params=params).status_code == 200
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    # Ответы из индексов в памяти (фасеты, подсказки) обходятся без запросов
+    with engine.connect() as conn:
+        for statement, parameters in statements:
+            plan = [row[3] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters or ())]
+            scans = [detail for detail in plan if FULL_SCAN.match(detail)]
+            assert not scans, f"{' '.join(statement.split())}\n" + "\n".join(plan)
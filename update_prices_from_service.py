@@ -1,35 +1,92 @@
 #!/usr/bin/env python3
 """
 Скрипт для автоматического обновления цен из внешнего сервиса
-Запускается каждые 30 минут через systemd timer или cron
+Запускается через systemd timer, cron или price_updater_scheduler.py
+
+По умолчанию (PRICE_SYNC_MODE=full) каждый запуск - полная синхронизация всех SKU.
+
+Инкрементальная синхронизация (PRICE_SYNC_MODE=delta, включается явно, если сервис
+цен отдает /changes): скрипт хранит курсор
+последней синхронизации (PRICE_SYNC_STATE_FILE) и запрашивает у сервиса только
+цены, изменившиеся после него (PRICE_SERVICE_CHANGES_URL), - обычно это несколько
+SKU. Полная синхронизация всех SKU с is_parse=True выполняется, если курсора нет,
+сервис его не принимает (410) или не поддерживает изменения (404), а также раз
+в PRICE_SYNC_FULL_EVERY_HOURS часов. Запуск с --full - всегда полная синхронизация.
+
+Если сервис не поддерживает изменения, это запоминается в файле состояния:
+запуски по расписанию (sync_due) выполняют полную синхронизацию не чаще, чем раз
+в PRICE_SYNC_FALLBACK_MINUTES минут, и при ней же проверяют, не появились ли изменения.
 """
 
 import os
 import sys
+import json
+import random
+import tempfile
+import time
 import requests
 import logging
-from datetime import datetime
-from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional, Tuple
+
+from requests.adapters import HTTPAdapter
 
 # Добавляем путь к проекту для импорта модулей
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from price_storage import get_prices_by_parse_flag, update_prices
-
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('price_updater.log', encoding='utf-8')
-    ]
-)
+from price_storage import get_prices, get_prices_by_parse_flag, update_prices
+# Импорт ради побочного эффекта: карточки моделей подписываются на изменения цен
+# price_storage при импорте модуля и обновляются после записи цен этим скриптом
+import model_cards  # noqa: F401
+
 logger = logging.getLogger(__name__)
 
+
+def setup_logging() -> None:
+    """
+    Логирование запуска скрипта (cron, systemd): stdout и price_updater.log
+    Только при запуске как скрипта - при импорте (API, шедулер) логирование настраивает процесс
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(sys.stdout),
+            logging.FileHandler('price_updater.log', encoding='utf-8')
+        ]
+    )
+
 # Конфигурация из переменных окружения
 PRICE_SERVICE_URL = os.getenv('PRICE_SERVICE_URL', 'http://0.0.0.0:8005/api/prices')
 PRICE_SERVICE_TOKEN = os.getenv('PRICE_SERVICE_TOKEN', None)
+# SKU в одном запросе и число одновременных запросов
+PRICE_SERVICE_CHUNK_SIZE = int(os.getenv('PRICE_SERVICE_CHUNK_SIZE', '500'))
+PRICE_SERVICE_CONCURRENCY = int(os.getenv('PRICE_SERVICE_CONCURRENCY', '4'))
+# Таймаут одного запроса (секунды) и повторы неудачной пачки
+PRICE_SERVICE_TIMEOUT = float(os.getenv('PRICE_SERVICE_TIMEOUT', '30'))
+PRICE_SERVICE_RETRIES = int(os.getenv('PRICE_SERVICE_RETRIES', '3'))
+# Пауза перед повтором: случайная в пределах BACKOFF * 2^попытка, не больше BACKOFF_MAX
+PRICE_SERVICE_BACKOFF = float(os.getenv('PRICE_SERVICE_BACKOFF', '0.5'))
+PRICE_SERVICE_BACKOFF_MAX = float(os.getenv('PRICE_SERVICE_BACKOFF_MAX', '10'))
+
+# full - всегда все цены, delta - изменения после курсора (только если сервис поддерживает /changes)
+PRICE_SYNC_MODE = os.getenv('PRICE_SYNC_MODE', 'full').lower()
+PRICE_SERVICE_CHANGES_URL = os.getenv('PRICE_SERVICE_CHANGES_URL', PRICE_SERVICE_URL.rstrip('/') + '/changes')
+# Курсор последней синхронизации и время последней полной синхронизации
+PRICE_SYNC_STATE_FILE = os.getenv('PRICE_SYNC_STATE_FILE', 'price_sync_state.json')
+# Полная синхронизация не реже, чем раз в столько часов (страховка от пропущенных изменений)
+PRICE_SYNC_FULL_EVERY_HOURS = float(os.getenv('PRICE_SYNC_FULL_EVERY_HOURS', '24'))
+# Сервис без изменений цен: полная синхронизация не чаще, чем раз в столько минут
+PRICE_SYNC_FALLBACK_MINUTES = float(os.getenv('PRICE_SYNC_FALLBACK_MINUTES', '30'))
+
+
+class ResyncRequired(Exception):
+    """Сервис не может отдать изменения после курсора - нужна полная синхронизация"""
+
+
+class ChangesUnsupported(ResyncRequired):
+    """Сервис не поддерживает изменения цен (404/405/501)"""
 
 
 def get_all_skus() -> List[str]:
@@ -48,79 +105,142 @@ def get_all_skus() -> List[str]:
         return []
 
 
-def get_prices_from_service(skus: List[str]) -> Optional[Dict]:
+def _chunks(items: List[str], size: int) -> List[List[str]]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _create_session(concurrency: int) -> requests.Session:
+    """HTTP сессия с пулом соединений на concurrency параллельных запросов"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['Content-Type'] = 'application/json'
+    # Добавляем токен авторизации, если он указан
+    if PRICE_SERVICE_TOKEN:
+        session.headers['Authorization'] = f'Bearer {PRICE_SERVICE_TOKEN}'
+    return session
+
+
+def _backoff_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    """Пауза перед повтором: экспоненциальная с полным джиттером, не меньше Retry-After"""
+    delay = random.uniform(0, min(PRICE_SERVICE_BACKOFF_MAX, PRICE_SERVICE_BACKOFF * 2 ** attempt))
+    if retry_after:
+        try:
+            delay = max(delay, min(float(retry_after), PRICE_SERVICE_BACKOFF_MAX))
+        except ValueError:
+            pass
+    return delay
+
+
+def _post_json(session: requests.Session, url: str, payload: Dict, label: str) -> Dict:
+    """
+    POST запрос к сервису с повторами; возвращает JSON ответа
+    Повторяются сетевые ошибки, таймауты, 429 и 5xx; остальные ошибки сразу прерывают запрос
+    """
+    for attempt in range(PRICE_SERVICE_RETRIES + 1):
+        retry_after = None
+        try:
+            response = session.post(url, json=payload, timeout=PRICE_SERVICE_TIMEOUT)
+            if response.status_code == 429 or response.status_code >= 500:
+                retry_after = response.headers.get('Retry-After')
+                raise requests.exceptions.HTTPError(f"HTTP {response.status_code}", response=response)
+            response.raise_for_status()
+            return response.json()
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                requests.exceptions.HTTPError) as e:
+            status = e.response.status_code if e.response is not None else None
+            retryable = status is None or status == 429 or status >= 500
+            if not retryable or attempt == PRICE_SERVICE_RETRIES:
+                raise
+            delay = _backoff_delay(attempt, retry_after)
+            logger.warning(f"⚠️  {label}: {e}. Повтор {attempt + 1}/{PRICE_SERVICE_RETRIES} через {delay:.1f} с")
+            time.sleep(delay)
+
+
+def _fetch_chunk(session: requests.Session, chunk: List[str], number: int, total: int) -> Dict:
+    """Получить цены одной пачки SKU с повторами"""
+    data = _post_json(session, PRICE_SERVICE_URL, {"skus": chunk}, f"Пачка {number}/{total}")
+    if 'prices' not in data:
+        raise ValueError("Неожиданный формат ответа: отсутствует поле 'prices'")
+    return data['prices']
+
+
+def get_prices_from_service(skus: List[str], chunk_size: Optional[int] = None,
+                            concurrency: Optional[int] = None) -> Optional[Dict]:
     """
     Получить цены из внешнего сервиса
     
+    SKU отправляются пачками по chunk_size (PRICE_SERVICE_CHUNK_SIZE), до concurrency
+    (PRICE_SERVICE_CONCURRENCY) запросов одновременно через общий пул соединений.
+    Неудачные пачки повторяются с экспоненциальной паузой; цены пачек, которые
+    не удалось получить, остаются без изменений, остальные применяются.
+    
     Args:
         skus: Список SKU для запроса
+        chunk_size: Размер пачки SKU
+        concurrency: Число одновременных запросов
         
     Returns:
-        Dict с ценами или None в случае ошибки
+        Dict с ценами полученных пачек или None, если не получено ни одной
     """
     if not skus:
         logger.warning("⚠️  Список SKU пуст, пропускаем запрос к сервису")
         return None
     
+    prices_dict, _ = _fetch_prices(skus, chunk_size, concurrency)
+    return prices_dict or None
+
+
+def _fetch_prices(skus: List[str], chunk_size: Optional[int] = None,
+                  concurrency: Optional[int] = None) -> Tuple[Dict, int]:
+    """Цены всех SKU пачками; возвращает (полученные цены, число SKU неудачных пачек)"""
+    chunk_size = max(1, chunk_size or PRICE_SERVICE_CHUNK_SIZE)
+    concurrency = max(1, concurrency or PRICE_SERVICE_CONCURRENCY)
+    chunks = _chunks(skus, chunk_size)
+    
+    logger.info(f"📡 Отправка запросов к сервису: {PRICE_SERVICE_URL}")
+    logger.info(f"📋 Запрашиваем цены для {len(skus)} товаров: {len(chunks)} пачек по {chunk_size}, "
+                f"одновременно {concurrency}")
+    
+    prices_dict = {}
+    failed_skus = 0
+    session = _create_session(concurrency)
     try:
-        # Подготавливаем заголовки
-        headers = {
-            'Content-Type': 'application/json'
-        }
-        
-        # Добавляем токен авторизации, если он указан
-        if PRICE_SERVICE_TOKEN:
-            headers['Authorization'] = f'Bearer {PRICE_SERVICE_TOKEN}'
-        
-        # Формируем тело запроса
-        payload = {
-            "skus": skus
-        }
-        
-        logger.info(f"📡 Отправка запроса к сервису: {PRICE_SERVICE_URL}")
-        logger.info(f"📋 Запрашиваем цены для {len(skus)} товаров")
-        
-        # Отправляем POST запрос
-        response = requests.post(
-            PRICE_SERVICE_URL,
-            json=payload,
-            headers=headers,
-            timeout=30  # Таймаут 30 секунд
-        )
-        
-        # Проверяем статус ответа
-        response.raise_for_status()
-        
-        # Парсим JSON ответ
-        data = response.json()
-        
-        # Проверяем формат ответа
-        if 'prices' in data:
-            prices_dict = data['prices']
-            logger.info(f"✅ Получено {len(prices_dict)} цен из сервиса")
-            return prices_dict
-        else:
-            logger.error(f"❌ Неожиданный формат ответа: отсутствует поле 'prices'")
-            logger.error(f"Ответ: {data}")
-            return None
-            
-    except requests.exceptions.ConnectionError as e:
-        logger.warning(f"⚠️  Сервис недоступен: {PRICE_SERVICE_URL}. Оставляем цены без изменений.")
-        logger.debug(f"Детали ошибки подключения: {e}")
-        return None
-    except requests.exceptions.Timeout as e:
-        logger.warning(f"⚠️  Таймаут при запросе к сервису: {PRICE_SERVICE_URL}. Оставляем цены без изменений.")
-        logger.debug(f"Детали ошибки таймаута: {e}")
-        return None
-    except requests.exceptions.RequestException as e:
-        logger.warning(f"⚠️  Ошибка при запросе к сервису: {e}. Оставляем цены без изменений.")
-        return None
-    except ValueError as e:
-        logger.error(f"❌ Ошибка при парсинге JSON ответа: {e}")
-        return None
-    except Exception as e:
-        logger.error(f"❌ Неожиданная ошибка: {e}")
-        return None
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="price-fetch") as executor:
+            futures = {
+                executor.submit(_fetch_chunk, session, chunk, number, len(chunks)): (number, chunk)
+                for number, chunk in enumerate(chunks, 1)
+            }
+            for future in as_completed(futures):
+                number, chunk = futures[future]
+                try:
+                    prices_dict.update(future.result())
+                except requests.exceptions.ConnectionError as e:
+                    failed_skus += len(chunk)
+                    logger.warning(f"⚠️  Пачка {number}/{len(chunks)}: сервис недоступен ({PRICE_SERVICE_URL})")
+                    logger.debug(f"Детали ошибки подключения: {e}")
+                except requests.exceptions.Timeout as e:
+                    failed_skus += len(chunk)
+                    logger.warning(f"⚠️  Пачка {number}/{len(chunks)}: таймаут при запросе к сервису")
+                    logger.debug(f"Детали ошибки таймаута: {e}")
+                except requests.exceptions.RequestException as e:
+                    failed_skus += len(chunk)
+                    logger.warning(f"⚠️  Пачка {number}/{len(chunks)}: ошибка при запросе к сервису: {e}")
+                except ValueError as e:
+                    failed_skus += len(chunk)
+                    logger.error(f"❌ Пачка {number}/{len(chunks)}: ошибка разбора ответа: {e}")
+                except Exception as e:
+                    failed_skus += len(chunk)
+                    logger.error(f"❌ Пачка {number}/{len(chunks)}: неожиданная ошибка: {e}")
+    finally:
+        session.close()
+    
+    if failed_skus:
+        logger.warning(f"⚠️  Не получены цены {failed_skus} SKU - для них цены остаются без изменений")
+    if prices_dict:
+        logger.info(f"✅ Получено {len(prices_dict)} цен из сервиса")
+    return prices_dict, failed_skus
 
 
 def update_prices_in_json(prices_dict: Dict) -> Dict[str, int]:
@@ -131,23 +251,24 @@ def update_prices_in_json(prices_dict: Dict) -> Dict[str, int]:
         prices_dict: Словарь с ценами в формате {sku: {price: float, name: str}}
         
     Returns:
-        Dict с статистикой обновлений
+        Dict с статистикой обновлений (saved - изменения записаны или записывать нечего)
     """
     stats = {
         'updated': 0,
         'created': 0,
         'not_found': 0,
-        'errors': 0
+        'errors': 0,
+        'saved': False
     }
     
     if not prices_dict:
         logger.warning("⚠️  Словарь цен пуст, нет данных для обновления")
+        stats['saved'] = True
         return stats
     
     try:
-        # Получаем все существующие цены для сохранения is_parse
-        from price_storage import get_all_prices
-        all_prices = get_all_prices()
+        # Существующие цены этих SKU (для сохранения is_parse) - из одного снимка
+        all_prices = get_prices(prices_dict)
         
         # Формируем словарь для обновления
         update_dict = {}
@@ -205,8 +326,10 @@ def update_prices_in_json(prices_dict: Dict) -> Dict[str, int]:
         
         # Обновляем цены в JSON файле
         if update_dict:
-            update_prices(update_dict)
+            if not update_prices(update_dict):
+                raise RuntimeError("не удалось записать цены")
             logger.info("💾 Изменения сохранены в JSON файл")
+        stats['saved'] = True
         
     except Exception as e:
         logger.error(f"❌ Ошибка при обновлении цен в JSON файле: {e}")
@@ -215,50 +338,215 @@ def update_prices_in_json(prices_dict: Dict) -> Dict[str, int]:
     return stats
 
 
-def main():
+def _get_state_file_path() -> str:
+    """Файл состояния синхронизации; относительный путь - от директории проекта, а не от cwd"""
+    if os.path.isabs(PRICE_SYNC_STATE_FILE):
+        return PRICE_SYNC_STATE_FILE
+    # API, cron и systemd запускаются из разных директорий, а курсор у них должен быть общий
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), PRICE_SYNC_STATE_FILE)
+
+
+def _load_sync_state() -> Dict:
+    """Курсор последней синхронизации; {} - если синхронизации еще не было"""
+    file_path = _get_state_file_path()
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"⚠️  Не удалось прочитать {file_path}: {e}. Выполняем полную синхронизацию")
+        return {}
+
+
+def _save_sync_state(state: Dict) -> None:
+    """Записать состояние атомарно (временный файл + rename)"""
+    file_path = _get_state_file_path()
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(file_path), prefix='.price_sync_', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(temp_path, file_path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _fetch_changes(session: requests.Session, cursor: Optional[str]) -> Tuple[Dict, str]:
+    """
+    Изменения цен после cursor (все страницы); возвращает (цены, новый курсор)
+    cursor=None - только текущий курсор сервиса, без цен
+    """
+    changes = {}
+    while True:
+        try:
+            data = _post_json(session, PRICE_SERVICE_CHANGES_URL,
+                              {"since": cursor, "limit": PRICE_SERVICE_CHUNK_SIZE}, "Изменения цен")
+        except requests.exceptions.HTTPError as e:
+            status = e.response.status_code if e.response is not None else None
+            if status == 410:
+                raise ResyncRequired("Сервис не принимает курсор (410)")
+            if status in (404, 405, 501):
+                raise ChangesUnsupported(f"Сервис не поддерживает изменения цен ({status})")
+            raise
+        if 'prices' not in data or 'cursor' not in data:
+            raise ValueError("Неожиданный формат ответа: нужны поля 'prices' и 'cursor'")
+        changes.update(data['prices'])
+        cursor = str(data['cursor'])
+        if not data.get('has_more'):
+            return changes, cursor
+
+
+def sync_due() -> bool:
+    """
+    Нужен ли запуск по расписанию
+    Если сервис не поддерживает изменения цен, каждый запуск - полная синхронизация,
+    поэтому она выполняется не чаще, чем раз в PRICE_SYNC_FALLBACK_MINUTES
+    """
+    if PRICE_SYNC_MODE != 'delta':
+        return True
+    state = _load_sync_state()
+    if not state.get('changes_unsupported') or state.get('changes_url') != PRICE_SERVICE_CHANGES_URL:
+        return True
+    try:
+        full_sync_at = datetime.fromisoformat(state['full_sync_at'])
+    except (KeyError, TypeError, ValueError):
+        return True
+    # Минута запаса - чтобы cron с тем же интервалом не пропускал запуски
+    return datetime.now() - full_sync_at >= timedelta(minutes=PRICE_SYNC_FALLBACK_MINUTES - 1)
+
+
+def _full_sync_due(state: Dict) -> bool:
+    if not state.get('cursor') or state.get('changes_url') != PRICE_SERVICE_CHANGES_URL:
+        return True
+    try:
+        full_sync_at = datetime.fromisoformat(state['full_sync_at'])
+    except (KeyError, TypeError, ValueError):
+        return True
+    return datetime.now() - full_sync_at > timedelta(hours=PRICE_SYNC_FULL_EVERY_HOURS)
+
+
+def _delta_sync(state: Dict) -> Dict[str, int]:
+    """Применить изменения после сохраненного курсора"""
+    session = _create_session(1)
+    try:
+        changes, cursor = _fetch_changes(session, state['cursor'])
+    finally:
+        session.close()
+    
+    # Сервис отдает изменения всех своих SKU - применяем только те, что обновляются из сервиса
+    current = get_prices(changes)
+    delta = {sku: price_info for sku, price_info in changes.items()
+             if sku in current and current[sku].get('is_parse', True)}
+    logger.info(f"📥 Изменений цен в сервисе: {len(changes)}, из них наших SKU: {len(delta)}")
+    
+    stats = update_prices_in_json(delta)
+    stats.update(mode='delta', failed=0)
+    if stats['saved']:
+        _save_sync_state(dict(state, cursor=cursor))
+    return stats
+
+
+def _full_sync() -> Optional[Dict[str, int]]:
+    """Запросить цены всех SKU с is_parse=True; курсор сервиса берется до запроса цен"""
+    skus = get_all_skus()
+    if not skus:
+        logger.warning("⚠️  Не найдено ни одного SKU в JSON файле")
+        return None
+    
+    cursor = None
+    if PRICE_SYNC_MODE == 'delta':
+        # Изменения во время полной синхронизации придут следующей инкрементальной
+        session = _create_session(1)
+        try:
+            _, cursor = _fetch_changes(session, None)
+        except ChangesUnsupported as e:
+            logger.info(f"ℹ️  {e}: полная синхронизация не чаще, чем раз в {PRICE_SYNC_FALLBACK_MINUTES:g} мин")
+            # Время запоминается до запроса цен: неудачная синхронизация тоже не повторяется каждую минуту
+            _save_sync_state({
+                'changes_url': PRICE_SERVICE_CHANGES_URL,
+                'changes_unsupported': True,
+                'full_sync_at': datetime.now().isoformat()
+            })
+        except ResyncRequired as e:
+            logger.info(f"ℹ️  {e}: каждый запуск будет полной синхронизацией")
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.warning(f"⚠️  Не удалось получить курсор изменений: {e}")
+        finally:
+            session.close()
+    
+    prices_dict, failed_skus = _fetch_prices(skus)
+    if not prices_dict:
+        logger.warning("⚠️  Не удалось получить цены из сервиса. Цены остаются без изменений.")
+        return None
+    
+    stats = update_prices_in_json(prices_dict)
+    stats.update(mode='full', failed=failed_skus)
+    if cursor is not None and not failed_skus and stats['saved']:
+        _save_sync_state({
+            'cursor': cursor,
+            'changes_url': PRICE_SERVICE_CHANGES_URL,
+            'full_sync_at': datetime.now().isoformat()
+        })
+    return stats
+
+
+def sync_prices(full: bool = False) -> Optional[Dict[str, int]]:
+    """
+    Синхронизировать цены с сервисом: изменения после курсора или полная синхронизация
+    Возвращает статистику обновлений (mode - delta/full, failed - SKU без ответа сервиса)
+    или None, если цены не получены
+    Без блокировки - для запуска по расписанию использовать price_sync_scheduler.run_once()
+    """
+    if not full and PRICE_SYNC_MODE == 'delta':
+        state = _load_sync_state()
+        if not _full_sync_due(state):
+            try:
+                logger.info("🔁 Инкрементальная синхронизация: изменения после последнего курсора")
+                return _delta_sync(state)
+            except ResyncRequired as e:
+                logger.warning(f"⚠️  {e}. Выполняем полную синхронизацию")
+            except (requests.exceptions.RequestException, ValueError) as e:
+                # Полная синхронизация при недоступном сервисе тоже не удастся - ждем следующего запуска
+                logger.warning(f"⚠️  Не удалось получить изменения цен: {e}. Цены остаются без изменений.")
+                return None
+    
+    logger.info("📦 Полная синхронизация цен")
+    return _full_sync()
+
+
+def main(full: bool = False):
     """
     Основная функция для обновления цен
+    full - полная синхронизация вместо изменений после курсора
+    Не запускается, если синхронизация уже идет в другом процессе (API, шедулер, cron)
     """
-    start_time = datetime.now()
-    logger.info(f"🔄 Начало обновления цен - {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
+    import price_sync_scheduler
+    
+    logger.info(f"🔄 Начало обновления цен - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     logger.info(f"📍 URL сервиса: {PRICE_SERVICE_URL}")
     
-    try:
-        # Получаем все SKU из JSON файла
-        skus = get_all_skus()
-        
-        if not skus:
-            logger.warning("⚠️  Не найдено ни одного SKU в JSON файле")
-            return
-        
-        # Получаем цены из внешнего сервиса
-        prices_dict = get_prices_from_service(skus)
-        
-        if not prices_dict:
-            logger.warning("⚠️  Не удалось получить цены из сервиса. Цены остаются без изменений.")
-            return
-        
-        # Обновляем цены в JSON файле
-        stats = update_prices_in_json(prices_dict)
-        
-        # Выводим статистику
-        end_time = datetime.now()
-        duration = (end_time - start_time).total_seconds()
-        
-        logger.info("📊 Итоги обновления:")
-        logger.info(f"   Обновлено: {stats['updated']}")
-        logger.info(f"   Создано: {stats['created']}")
-        logger.info(f"   Не найдено продуктов: {stats['not_found']}")
-        logger.info(f"   Ошибок: {stats['errors']}")
-        logger.info(f"⏱️  Время выполнения: {duration:.2f} секунд")
-        logger.info(f"✅ Обновление цен завершено успешно")
-        
-    except Exception as e:
-        logger.error(f"❌ Критическая ошибка: {e}", exc_info=True)
+    if not full and not sync_due():
+        logger.info(f"⏭️  Сервис не поддерживает изменения цен: полная синхронизация "
+                    f"не чаще, чем раз в {PRICE_SYNC_FALLBACK_MINUTES:g} мин - запуск пропущен")
+        return
+    
+    run = price_sync_scheduler.run_once(full=full)
+    if run is None or not run['ok']:
         # Не завершаем процесс с ошибкой, чтобы шедулер мог продолжить работу
         return
+    
+    # Выводим статистику
+    logger.info("📊 Итоги обновления:")
+    logger.info(f"   Обновлено: {run['updated']}")
+    logger.info(f"   Создано: {run['created']}")
+    logger.info(f"   Не найдено продуктов: {run['not_found']}")
+    logger.info(f"   Ошибок: {run['errors']}")
+    logger.info(f"⏱️  Время выполнения: {run['duration_seconds']:.2f} секунд")
+    logger.info("✅ Обновление цен завершено успешно")
 
 
 if __name__ == "__main__":
-    main()
-
+    setup_logging()
+    main(full='--full' in sys.argv[1:])